@@ -1,22 +1,93 @@
 """A command-line calculator with REPL functionality for basic arithmetic, plugin support, and interaction logging."""
+import collections
+import configparser
+import contextlib
+import copy
+import itertools
 import logging
 import logging.config
 import os
+import re
 import sys
-from dotenv import load_dotenv  # Third-party import
-from calculator.calculator import Calculator  # First-party import
-from commands import CommandHandlerFactory  # First-party import
+import time
+import numpy as np  # Third-party import
+from calculator.calculator import OPERATORS, Calculator  # First-party import
+from calculator.history import HistoryFacade  # First-party import
+from calculator import metrics  # First-party import
+from calculator.query import parse_query  # First-party import
+from calculator.records import parse_number  # First-party import
+from commands import CommandError, CommandHandlerFactory, CommandSpec, UnknownCommandError  # First-party import
+from commands.executor import DEFAULT_WORKERS, DONE, PluginExecutor  # First-party import
+
+ERROR_POLICIES = ("skip", "stop", "collect")
+INDEX_SELECTOR = re.compile(r"(\d+)(?:-(\d+))?")  # An index or an inclusive range such as 10-500
+
+
+class BufferedWriter:
+    """Collects written text and passes it on to a stream in large chunks."""
+    def __init__(self, stream, buffer_size=1 << 16):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self._parts = []
+        self._size = 0
+
+    def write(self, text):
+        """Buffer text, flushing once the buffer is full."""
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.buffer_size:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        """Write the buffered text to the stream."""
+        if self._parts:
+            self.stream.write("".join(self._parts))
+            self._parts, self._size = [], 0
+        self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
 
 class App:
     """Main application class for the command-line calculator with REPL functionality."""
     def __init__(self):
+        self.startup_timings = {}
         os.makedirs('logs', exist_ok=True)
-        self.configure_logging()
-        load_dotenv()
+        with self.startup_phase("logging config"):
+            self.configure_logging()
+        with self.startup_phase("dotenv"):
+            from dotenv import load_dotenv  # pylint: disable=import-outside-toplevel
+            load_dotenv()
         self.settings = self.load_environment_variables()
         self.settings.setdefault('ENVIRONMENT', 'PRODUCTION')
-        self.calculator = Calculator()
+        with self.startup_phase("logging pipeline"):
+            self.configure_log_pipeline()
+        self.profiler = None  # CommandProfiler for the next commands, set by the profile command
+        self.configure_metrics()
+        self.configure_plugin_executor()
+        with self.startup_phase("history load"):
+            self.calculator = Calculator()
         self.command_handler = CommandHandlerFactory()
+        self.build_dispatch_table()
+
+    @contextlib.contextmanager
+    def startup_phase(self, name):
+        """Time a startup phase and record it in ``startup_timings``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_timings[name] = time.perf_counter() - start
+
+    def startup_report(self):
+        """Return the startup phase timings as text, one phase per line."""
+        lines = [f"{name:>20}: {seconds * 1000:8.2f} ms" for name, seconds in self.startup_timings.items()]
+        lines.append(f"{'total':>20}: {sum(self.startup_timings.values()) * 1000:8.2f} ms")
+        return "\n".join(lines)
 
     def configure_logging(self):
         """Configure logging settings from a file or set basic configuration."""
@@ -27,9 +98,71 @@ class App:
             logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
         logging.info("Logging configured.")
 
+    def configure_log_pipeline(self):
+        """Start queue-based logging when enabled in ``logging.conf`` or ``.env``.
+
+        The ``[pipeline]`` section of ``logging.conf`` may set ``queue``,
+        ``sample_rate``, ``rate_limit``, ``batch_size`` and ``flush_interval``;
+        the ``log_queue``, ``log_sample_rate``, ``log_rate_limit``,
+        ``log_batch_size`` and ``log_flush_interval`` settings override them."""
+        options = {}
+        if os.path.exists('logging.conf'):
+            parser = configparser.ConfigParser()
+            parser.read('logging.conf')
+            if parser.has_section('pipeline'):
+                options.update(parser['pipeline'])
+        for key in ('queue', 'sample_rate', 'rate_limit', 'batch_size', 'flush_interval'):
+            value = self.get_environment_variable(f'log_{key}')
+            if value:
+                options[key] = value
+        if options.get('queue', 'off').lower() not in ('on', 'true', '1'):
+            return
+        from logging_pipeline import start_queue_logging  # pylint: disable=import-outside-toplevel
+        start_queue_logging(sample_rate=int(options.get('sample_rate', 1)),
+                            rate_limit=int(options.get('rate_limit', 0)),
+                            batch_size=int(options.get('batch_size', 256)),
+                            flush_interval=float(options.get('flush_interval', 1.0)))
+
+    def configure_metrics(self):
+        """Turn command metrics off, or start exporting them, as the settings say.
+
+        ``metrics=off`` turns recording off. ``metrics_file`` is written every
+        ``metrics_interval`` seconds (default 60) and at exit, in the
+        Prometheus text format for ``.prom`` and ``.txt`` files and as JSON
+        otherwise."""
+        metrics.registry.enabled = (self.get_environment_variable('metrics') or 'on').lower() not in ('off', 'false', '0')
+        metrics_file = self.get_environment_variable('metrics_file')
+        if metrics_file and metrics.registry.enabled:
+            metrics.start_exporter(metrics_file, float(self.get_environment_variable('metrics_interval') or 60))
+
+    def configure_plugin_executor(self):
+        """Set up where plugin commands run, as the ``plugin_executor`` setting says.
+
+        ``inline`` (the default) runs them in the REPL's thread. ``thread`` and
+        ``process`` run each call as a job on at most ``plugin_workers``
+        (default 4) threads or child processes and wait for it, so a call can
+        time out or be interrupted with Ctrl-C. Background jobs (``bg``), and
+        calls of a plugin with a timeout, run on threads when plugins run inline."""
+        mode = (self.get_environment_variable('plugin_executor') or 'inline').lower()
+        self.plugins_inline = mode == 'inline'
+        self.plugin_executor = PluginExecutor('thread' if self.plugins_inline else mode,
+                                              int(self.get_environment_variable('plugin_workers') or DEFAULT_WORKERS))
+        self.jobs = {}  # Background jobs not waited for yet, by number
+        self.job_numbers = itertools.count(1)
+
+    def plugin_timeout(self, name):
+        """Return the timeout in seconds for a plugin command, or None for no timeout.
+
+        ``plugin_timeout_<command>`` overrides ``plugin_timeout``; 0 means no timeout."""
+        value = float(self.get_environment_variable(f'plugin_timeout_{name}')
+                      or self.get_environment_variable('plugin_timeout') or 0)
+        return value if value > 0 else None
+
     def load_environment_variables(self):
-        """Load and return environment variables as a dictionary."""
-        settings = {key: value for key, value in os.environ.items()}
+        """Return the settings: a mapping over the environment, without copying it.
+
+        Settings changed through the mapping stay local to this App."""
+        settings = collections.ChainMap({}, os.environ)
         logging.info("Environment variables loaded.")
         return settings
 
@@ -47,99 +180,472 @@ class App:
                     logging.info("Exiting the calculator.")
                     print("Exiting the calculator.")
                     sys.exit(0)
-
-                if cmd_input.lower() == 'history':
-                    logging.info("Calculation History:")
-                    print(self.calculator.show_history())
-                    break                
-                if cmd_input.lower() == 'load_history':
-                    logging.info("Loading history.")
-                    print(self.calculator.load_history())
-                    continue
-                if cmd_input.lower() == "save_history":
-                    logging.info("Saving history.")
-                    print(self.calculator.save_history())
-                    continue
-                if cmd_input.lower() == "clear_history":
-                 logging.info("Clearing history.")
-                 print(self.calculator.clear_history())
-                 continue
-                if cmd_input.startswith("delete_history_record"):
-                    cmd_parts = cmd_input.split()
-
-                    if len(cmd_parts) == 2 and cmd_parts[1].isdigit():
-                        index = int(cmd_parts[1])
-                        logging.info("Deleting history record at index: %d", index)
-                        print(self.calculator.delete_history_record(index))
-                    else:
-                        logging.warning("Invalid index provided for delete_history_record.")
-                        print("Error: Please provide a valid index to delete.")
-                    continue
-                if cmd_input.lower() == 'menu':
-                    logging.info("Available commands:")
-                    logging.info(self.command_handler.list_plugins()+['add', 'subtract', 'multiply', 'divide',"save_history","load_history","delete history_record <index>","clear_history"])
-                # Split the command and its arguments
-                cmd_parts = cmd_input.split()
-                if len(cmd_parts) == 0:
-                    logging.warning("No command entered.")
-                    continue  # Skip iteration if no input
-
-                operation = cmd_parts[0]
-                arguments = cmd_parts[1:]
-
-                # Handle built-in calculator operations
-                if operation in ['add', 'subtract', 'multiply', 'divide']:
-                    if len(arguments) != 2:
-                        logging.error("%s requires exactly 2 arguments.", operation)
-                        print(f"Error: {operation} requires exactly 2 arguments.")
-                        continue
-
-                    try:
-                        # Convert arguments to numbers
-                        arg1, arg2 = float(arguments[0]), float(arguments[1])
-                    except ValueError:
-                        logging.error("Invalid arguments. Arguments must be numbers.")
-                        print("Error: Invalid arguments. Arguments must be numbers.")
-                        continue
-
-                    # Perform the operation and log results
-                    if operation == "add":
-                        result = self.calculator.add(arg1, arg2)
-                    elif operation == "subtract":
-                        result = self.calculator.subtract(arg1, arg2)
-                    elif operation == "multiply":
-                        result = self.calculator.multiply(arg1, arg2)
-                    elif operation == "divide":
-                        try:
-                            result = self.calculator.divide(arg1, arg2)
-                        except ZeroDivisionError:
-                            logging.error("Division by zero error.")
-                            print("Error: Division by zero is not allowed.")
-                            continue
-
-                    logging.info("Result of %s: %s", operation, result)
-                    print(f"Result: {result}")
-
-                # Handle plugin commands
-                elif operation in self.command_handler.commands.keys():
-                    try:
-                        self.command_handler.commands[operation][0].execute(*arguments)
-                    except Exception as e:
-                        logging.error("Error executing command '%s': %s", operation, e)
-                        print(f"Error: Failed to execute '{operation}'. {e}")
-
-                if operation not in self.command_handler.list_plugins() +  ['add', 'subtract', 'multiply', 'divide',"menu"]:
-                    logging.error("No such command: unknown_command %s", cmd_input)
-                    sys.exit(1) 
+                self.execute(cmd_input)
+            except CommandError as e:
+                print(f"Error: {e}")
+            except UnknownCommandError:
+                logging.error("No such command: unknown_command %s", cmd_input)
+                sys.exit(1)
             except Exception as e:
                 logging.error("An unexpected error occurred: %s", e)
                 print(f"Error: An unexpected error occurred: {e}")
+
+    def build_dispatch_table(self):
+        """Build the table mapping each command name to its ``CommandSpec``.
+
+        Built-in commands take precedence over plugins with the same name. The
+        table and the menu are rebuilt only when the plugins change, so looking
+        up a command costs one dictionary access however many plugins exist."""
+        builtins = {operation: CommandSpec.from_function(operation, self.arithmetic_handler(operation))
+                    for operation in OPERATORS}
+        for name, handler, usage in (
+                ("history", self.show_history, "history [<offset> <limit> | tail <count>]"),
+                ("history_query", self.query_history, "history_query <filters>"),
+                ("expr", self.evaluate_expression, "expr <expression> [where name=value ...]"),
+                ("data_agg", self.aggregate_data, "data_agg <file> sum|mean|min|max|count <column> [group_by <column>]"),
+                ("data_calc", self.calculate_data, "data_calc <file> add|subtract|multiply|divide <column_a> <column_b> [out=<file>]"),
+                ("load_history", self.load_history, None),
+                ("save_history", self.save_history, None),
+                ("import_history", self.import_history, None),
+                ("export_history", self.export_history, None),
+                ("clear_history", self.clear_history, None),
+                ("delete_history_record", self.delete_history_record,
+                 "delete_history_record <index>|<first>-<last> [...] | <filters>"),
+                ("stats", self.show_stats, "stats [reset]"),
+                ("profile", self.start_profiling, "profile <count> [<file>]"),
+                ("bg", self.start_job, "bg <command> [<arguments> ...]"),
+                ("jobs", self.show_jobs, None),
+                ("wait", self.wait_job, "wait <job> [<seconds>]"),
+                ("cancel", self.cancel_job, None),
+                ("reload_plugins", self.reload_plugins, None),
+                ("menu", self.show_menu, None)):
+            builtins[name] = CommandSpec.from_function(name, handler, usage)
+        self.plugin_generation = self.command_handler.generation
+        self.dispatch_table = {**self.command_handler.specs, **builtins}
+        self.menu = self.command_handler.list_plugins() + [spec.usage for spec in builtins.values()]
+
+    def new_session(self, calculator=None):
+        """Return a copy of the app with its own calculator, for one server client.
+
+        The session shares the settings and plugins but has its own history,
+        kept in memory unless a calculator is given."""
+        session = copy.copy(self)
+        session.calculator = calculator or Calculator(HistoryFacade(backend="memory"))
+        session.jobs, session.job_numbers = {}, itertools.count(1)
+        session.build_dispatch_table()
+        return session
+
+    def execute(self, cmd_input):
+        """Run one command line, printing its output.
+
+        Raises CommandError when the command cannot be run and
+        UnknownCommandError when there is no such command."""
+        cmd_parts = cmd_input.split()
+        if not cmd_parts:
+            logging.warning("No command entered.")
+            return  # Nothing to do for empty input
+        operation = cmd_parts[0]
+        if operation.lower() != "reload_plugins" and self.command_handler.poll_plugins() != self.plugin_generation:
+            self.build_dispatch_table()  # reload_plugins reloads, and reports, the changes itself
+        spec = self.dispatch_table.get(operation) or self.dispatch_table.get(operation.lower())
+        if spec is None:
+            raise UnknownCommandError(operation)
+        if self.profiler is None:
+            self.run_command(spec, operation, cmd_parts[1:])
+        else:
+            self.profile_command(spec, operation, cmd_parts[1:])
+
+    def run_command(self, spec, operation, arguments):
+        """Check the arguments and run a command, recording its latency under ``command.<name>``."""
+        start = time.perf_counter()
+        try:
+            arguments = spec.bind(arguments)
+            if not spec.plugin:
+                spec.handler(*arguments)
+            elif not self.plugins_inline or self.plugin_timeout(spec.name) is not None:
+                self.run_plugin_job(spec, operation, arguments)  # Inline plugins with a timeout run on a thread
+            else:
+                try:
+                    spec.handler(*arguments)
+                except Exception as e:
+                    logging.error("Error executing command '%s': %s", operation, e)
+                    raise CommandError(f"Failed to execute '{operation}'. {e}") from e
+        except Exception:
+            metrics.registry.record(f"command.{spec.name}", time.perf_counter() - start, error=True)
+            raise
+        metrics.registry.record(f"command.{spec.name}", time.perf_counter() - start)
+
+    def run_plugin_job(self, spec, operation, arguments):
+        """Run a plugin as a job and wait for it, cancelling it on timeout or Ctrl-C."""
+        job = self.plugin_executor.submit(spec, arguments, operation, self.plugin_timeout(spec.name))
+        try:
+            job.wait()
+        except KeyboardInterrupt:
+            job.cancel()
+        self.report_job(job, operation)
+
+    @staticmethod
+    def report_job(job, command):
+        """Print a finished job's output, raising CommandError if it did not complete."""
+        sys.stdout.write(job.output)
+        if job.state != DONE:
+            logging.error("Error executing command '%s': %s", command, job.error)
+            raise CommandError(f"Failed to execute '{command}'. {job.error}")
+
+    def start_job(self, operation, *arguments):
+        """Run a plugin command in the background and print its job number."""
+        spec = self.dispatch_table.get(operation) or self.dispatch_table.get(operation.lower())
+        if spec is None or not spec.plugin:
+            raise CommandError(f"Only plugin commands can run in the background, not '{operation}'.")
+        command = " ".join((operation,) + arguments)
+        job = self.plugin_executor.submit(spec, spec.bind(arguments), command, self.plugin_timeout(spec.name),
+                                          next(self.job_numbers))
+        self.jobs[job.number] = job
+        logging.info("Started job %d: %s", job.number, command)
+        print(f"[{job.number}] {command}")
+
+    def show_jobs(self):
+        """Print every background job not waited for yet."""
+        if not self.jobs:
+            print("No background jobs.")
+        for job in self.jobs.values():
+            print(job.describe())
+
+    def find_job(self, number):
+        """Return the background job with this number, raising CommandError if there is none."""
+        job = self.jobs.get(number)
+        if job is None:
+            raise CommandError(f"No such job: {number}.")
+        return job
+
+    def wait_job(self, number: int, timeout: float = None):
+        """Wait for a background job, at most ``timeout`` seconds, then print its output.
+
+        Ctrl-C stops waiting but leaves the job running."""
+        job = self.find_job(number)
+        try:
+            finished = job.wait(timeout)
+        except KeyboardInterrupt:
+            finished = False
+        if not finished:
+            print(job.describe())
+            return
+        del self.jobs[number]
+        self.report_job(job, job.command)
+
+    def cancel_job(self, number: int):
+        """Cancel a background job; it stays listed until it is waited for."""
+        job = self.find_job(number)
+        if job.cancel():
+            logging.info("Cancelled job %d: %s", number, job.command)
+        print(job.describe())
+
+    def profile_command(self, spec, operation, arguments):
+        """Run a command under the active profiler, printing the profile after the last one."""
+        profiler = self.profiler
+        try:
+            profiler.run(self.run_command, spec, operation, arguments)
+        finally:
+            if profiler.remaining <= 0:
+                self.profiler = None
+                print(profiler.finish())
+
+    def show_stats(self, *arguments):
+        """Print the latency of every command and history operation so far, or ``reset`` them."""
+        if arguments == ("reset",):
+            metrics.registry.reset()
+            print("Statistics reset.")
+        elif arguments:
+            raise CommandError("Usage: stats [reset]")
+        else:
+            print(metrics.registry.report())
+
+    def start_profiling(self, count: int, path="logs/profile.prof"):
+        """Profile the next ``count`` commands with cProfile, writing the statistics to ``path``."""
+        if count < 1:
+            raise CommandError("profile needs a positive number of commands.")
+        self.profiler = metrics.CommandProfiler(count, path)
+        print(f"Profiling the next {count} command{'' if count == 1 else 's'}.")
+
+    def arithmetic_handler(self, operation):
+        """Return the command handler for a basic operation."""
+        method = getattr(self.calculator, operation)
+
+        def calculate(a: float, b: float):
+            try:
+                result = method(a, b)
+            except ValueError as e:
+                raise CommandError(str(e)) from e
+            logging.info("Result of %s: %s", operation, result)
+            print(f"Result: {result}")
+        return calculate
+
+    def query_history(self, *filters):
+        """Print a summary of the history entries matching the filters."""
+        try:
+            parsed = parse_query(filters)
+        except ValueError as e:
+            logging.warning("Invalid history query: %s", e)
+            raise CommandError(f"{e} Filters are op=<operation>, result|a|b with =, <, <=, >, >=, since=<time>, until=<time>.") from e
+        logging.info("Querying history: %s", " ".join(filters))
+        print(self.calculator.query_history(**parsed))
+
+    def load_history(self):
+        """Reload the history from disk and print it."""
+        logging.info("Loading history.")
+        self.write_pages(self.calculator.load_history_pages(), "No history found.")
+
+    def save_history(self):
+        """Save the history."""
+        logging.info("Saving history.")
+        print(self.calculator.save_history())
+
+    def import_history(self, csv_file):
+        """Append the entries of a CSV file to the history."""
+        logging.info("Importing history from %s.", csv_file)
+        print(self.calculator.import_history(csv_file))
+
+    def export_history(self, csv_file):
+        """Export the history to a CSV file."""
+        logging.info("Exporting history to %s.", csv_file)
+        print(self.calculator.export_history(csv_file))
+
+    def clear_history(self):
+        """Clear the history."""
+        logging.info("Clearing history.")
+        print(self.calculator.clear_history())
+
+    def delete_history_record(self, *selectors):
+        """Delete history records by index (``5``), inclusive range (``10-500``), several of these, or by filters.
+
+        Filters are those of ``history_query``, e.g. ``op=divide result<0``."""
+        if not selectors:
+            raise CommandError("Usage: delete_history_record <index>|<first>-<last> [...] | <filters>")
+        matches = [INDEX_SELECTOR.fullmatch(selector) for selector in selectors]
+        if len(selectors) == 1 and selectors[0].isdigit():
+            logging.info("Deleting history record at index: %s", selectors[0])
+            print(self.calculator.delete_history_record(int(selectors[0])))
+            return
+        try:
+            if all(matches):
+                ranges = [(int(match[1]), int(match[2] or match[1])) for match in matches]
+                if any(first > last for first, last in ranges):
+                    raise ValueError("A range must not end before it starts.")
+                count, last = len(self.calculator.history_facade), max(last for _, last in ranges)
+                if last >= count:  # Before the row numbers are built, as a range can be huge
+                    raise ValueError(f"Invalid index {last}. The history has {count} entries.")
+                logging.info("Deleting history records: %s", " ".join(selectors))
+                print(self.calculator.delete_history_records(
+                    np.concatenate([np.arange(first, last + 1) for first, last in ranges])))
+                return
+            filters = parse_query(selectors)
+        except ValueError as e:
+            logging.warning("Invalid history deletion: %s", e)
+            if any(matches):
+                raise CommandError(str(e)) from e
+            raise CommandError("Invalid arguments. Arguments must be integers, ranges such as 10-500 "
+                               "or filters such as op=divide result<0.") from e
+        logging.info("Deleting history records matching: %s", " ".join(selectors))
+        print(self.calculator.delete_history_where(**filters))
+
+    def reload_plugins(self):
+        """Pick up changed, added and removed plugin files now and print which commands changed."""
+        added, changed, removed = self.command_handler.reload_plugins(os.getenv("plugin_file_path"))
+        self.build_dispatch_table()
+        lines = [f"{label}: {', '.join(names)}"
+                 for label, names in (("Added", added), ("Changed", changed), ("Removed", removed)) if names]
+        print("\n".join(lines) or "Plugins are up to date.")
+
+    def show_menu(self):
+        """Log the available commands."""
+        logging.info("Available commands:")
+        logging.info(self.menu)
+
+    def run_script(self, lines, error_policy="skip", save_every=0):
+        """Run commands from an iterable of lines without prompting and return the number of errors.
+
+        Lines are streamed one at a time through ``execute`` and all output
+        goes through one buffered writer, so arbitrarily long inputs run in
+        constant memory (apart from the history itself; with ``save_every``
+        and the journal save mode and binary backend, saved history is
+        memory-mapped instead of held in memory). Per-line INFO logging is
+        suppressed while the script runs. When the ``parallel_workers``
+        setting is above 1, basic operations are evaluated in a process pool
+        in chunks of ``parallel_chunk_size`` lines (see ``parallel``).
+
+        ``error_policy`` decides what happens when a line fails: ``skip``
+        reports it and carries on, ``stop`` reports it and stops, ``collect``
+        carries on and lists every error at the end. A summary with the
+        lines/second rate is written to stderr."""
+        if error_policy not in ERROR_POLICIES:
+            raise ValueError(f"Unknown error policy: {error_policy}")
+        root_logger = logging.getLogger()
+        log_level = root_logger.level
+        root_logger.setLevel(max(log_level, logging.WARNING))
+        errors, error_count, line_number = [], 0, 0
+        start = time.perf_counter()
+        with BufferedWriter(sys.stdout) as output, contextlib.redirect_stdout(output):
+            results = self.script_results(lines)
+            try:
+                for line_number, result, error in results:
+                    if result is not None:
+                        print(result)
+                    if error is not None:
+                        error_count += 1
+                        if error_policy == "collect":
+                            errors.append(f"line {line_number}: {error}")
+                        else:
+                            print(f"Error on line {line_number}: {error}")
+                        if error_policy == "stop":
+                            break
+                    if save_every and line_number % save_every == 0:
+                        self.calculator.save_history()
+            finally:
+                results.close()
+                root_logger.setLevel(log_level)
+        elapsed = time.perf_counter() - start
+        for error in errors:
+            sys.stderr.write(f"Error on {error}\n")
+        sys.stderr.write(f"Processed {line_number} lines in {elapsed:.3f}s "
+                         f"({line_number / elapsed if elapsed else 0:,.0f} lines/s), {error_count} errors.\n")
+        logging.info("Script finished: %d lines, %d errors.", line_number, error_count)
+        return error_count
+
+    def script_results(self, lines):
+        """Run script lines and yield (line_number, output, error) for each, stopping at ``exit``.
+
+        ``output`` is text still to be written (commands run in this process
+        write their own); ``error`` is the error message of a failed line."""
+        numbered_lines = enumerate(lines, 1)
+        workers = int(self.get_environment_variable('parallel_workers') or 1)
+        if workers > 1:
+            chunk_size = int(self.get_environment_variable('parallel_chunk_size') or 10000)
+            from parallel import ParallelRunner  # pylint: disable=import-outside-toplevel
+            yield from ParallelRunner(workers, chunk_size).run(
+                numbered_lines, self.run_line, self.calculator.history_facade)
+            return
+        for line_number, line in numbered_lines:
+            cmd_input = line.strip()
+            if cmd_input.lower() == 'exit':
+                return
+            yield line_number, None, self.run_line(cmd_input)
+
+    def run_line(self, cmd_input):
+        """Run one command and return its error message, or None if it succeeded."""
+        try:
+            self.execute(cmd_input)
+        except UnknownCommandError as e:
+            return f"No such command: {e}"
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            return str(e)
+        return None
+
+    def show_history(self, *arguments):
+        """Write the history page by page: all of it, ``<offset> <limit>`` or ``tail <count>``."""
+        if not arguments:
+            pages = self.calculator.history_pages()
+        elif len(arguments) == 2 and arguments[0] == 'tail' and arguments[1].isdigit():
+            pages = self.calculator.history_tail_pages(int(arguments[1]))
+        elif len(arguments) == 2 and arguments[0].isdigit() and arguments[1].isdigit():
+            pages = self.calculator.history_pages(int(arguments[0]), int(arguments[1]))
+        else:
+            logging.warning("Invalid arguments for history: %s", arguments)
+            raise CommandError("Usage is 'history', 'history <offset> <limit>' or 'history tail <count>'.")
+        logging.info("Calculation History:")
+        self.write_pages(pages, "No history available.")
+
+    def evaluate_expression(self, *terms):
+        """Evaluate ``<expression> [where name=value ...]``; a value may be a comma-separated list."""
+        text = " ".join(terms)
+        expression, _, assignments = text.partition(" where ")
+        bindings = {}
+        try:
+            for assignment in assignments.split():
+                name, _, value = assignment.partition("=")
+                if not name or not value:
+                    raise ValueError(f"Invalid binding '{assignment}', use name=value.")
+                values = [parse_number(item)[0] for item in value.split(",")]
+                bindings[name] = values if "," in value else values[0]
+            result = self.calculator.evaluate(expression.strip(), bindings)
+        except ValueError as e:
+            logging.warning("Could not evaluate expression %s: %s", text.strip(), e)
+            raise CommandError(str(e)) from e
+        if isinstance(result, np.ndarray):
+            result = ", ".join(str(value) for value in result.tolist())
+        logging.info("Result of %s: %s", expression.strip(), result)
+        print(f"Result: {result}")
+
+    def aggregate_data(self, csv_file, function, column, *group_by):
+        """Print an aggregation of a CSV column, optionally per group."""
+        if group_by and (len(group_by) != 2 or group_by[0] != "group_by"):
+            raise CommandError("Usage: data_agg <file> sum|mean|min|max|count <column> [group_by <column>]")
+        try:
+            result = self.calculator.aggregate_file(csv_file, function, column, group_by[1] if group_by else None)
+        except FileNotFoundError as e:
+            raise CommandError(f"The file '{csv_file}' was not found.") from e
+        except ValueError as e:
+            logging.warning("Could not aggregate %s: %s", csv_file, e)
+            raise CommandError(str(e)) from e
+        if group_by:
+            self.write_pages(("\n".join(f"{key} | {value}" for key, value in result.items()),) if len(result) else (),
+                             "No rows.")
+        else:
+            print(f"Result: {result}")
+
+    def calculate_data(self, csv_file, operation, column_a, column_b, *options):
+        """Print or write ``column_a <operation> column_b`` for every row of a CSV file."""
+        out = options[0][len("out="):] if len(options) == 1 and options[0].startswith("out=") else None
+        if options and not out:
+            raise CommandError("Usage: data_calc <file> add|subtract|multiply|divide <column_a> <column_b> [out=<file>]")
+        rows = 0
+        try:
+            with contextlib.ExitStack() as stack:
+                output = stack.enter_context(open(out, "w", encoding="utf-8", buffering=1 << 20)) if out else sys.stdout
+                output.write(f"{column_a} {operation} {column_b}\n")
+                for result in self.calculator.calculate_file(csv_file, operation, column_a, column_b):
+                    if len(result):
+                        output.write("\n".join(map(str, result.tolist())) + "\n")
+                    rows += len(result)
+        except FileNotFoundError as e:
+            raise CommandError(f"The file '{csv_file}' was not found.") from e
+        except ValueError as e:
+            logging.warning("Could not calculate over %s: %s", csv_file, e)
+            raise CommandError(str(e)) from e
+        print(f"Calculated {rows} rows" + (f" into {out}." if out else "."))
+
+    @staticmethod
+    def write_pages(pages, empty_message):
+        """Write rendered pages to stdout one at a time."""
+        written = False
+        for page in pages:
+            sys.stdout.write(page + "\n")
+            written = True
+        if not written:
+            print(empty_message)
+        sys.stdout.flush()
+
+    def load_plugins(self):
+        """Load the plugins from the configured plugin directory and keep watching it.
+
+        Changed, added and removed plugin files are picked up before the next
+        command, checking at most every ``plugin_reload_interval`` seconds
+        (default 2; 0 turns this off)."""
+        with self.startup_phase("plugin discovery"):
+            self.command_handler.poll_interval = float(self.get_environment_variable('plugin_reload_interval') or 2)
+            self.command_handler.load_plugins(os.getenv("plugin_file_path"))
+            self.build_dispatch_table()
+        logging.info("Plugins available: %s", self.command_handler.list_plugins())
+
+    def start_script(self, lines, error_policy="skip", save_every=0):
+        """Load plugins and run commands from ``lines`` non-interactively; return the number of errors."""
+        self.load_plugins()
+        return self.run_script(lines, error_policy, save_every)
+
     def start(self):   
         """Initialize the calculator, load plugins, and start the REPL.""" 
-        self.command_handler.load_plugins(os.getenv("plugin_file_path"))
-        logging.info(self.command_handler.commands)
+        self.load_plugins()
         logging.info("Calculator REPL started.")
         logging.info("Type 'exit' to exit.")
         logging.info("Type 'menu' to get available commands.")
-        logging.info("Available history commands: load_history, save_history, clear_history, delete_history_record <index>.")
+        logging.info("Available history commands: history [<offset> <limit> | tail <count>], history_query <filters>, load_history, save_history, import_history <file>, export_history <file>, clear_history, delete_history_record <index>|<first>-<last>|<filters>.")
         self.repl()
\ No newline at end of file
@@ -0,0 +1,36 @@
+"""Benchmark comparing scalar Calculator calls with the batch API.
+
+Run with: python -m benchmarks.calculator_batch
+"""
+import os
+import tempfile
+import time
+import numpy as np
+from calculator.calculator import Calculator
+
+SIZE = 1_000_000
+
+
+def main():
+    """Print the throughput of the scalar loop and of Calculator.apply on SIZE operand pairs."""
+    rng = np.random.default_rng(0)
+    a, b = rng.random(SIZE), rng.random(SIZE) + 1
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ["history_file_path"] = os.path.join(tmpdir, "history.csv")
+        calculator = Calculator()
+        start = time.perf_counter()
+        for x, y in zip(a.tolist(), b.tolist()):
+            calculator.multiply(x, y)
+        scalar = time.perf_counter() - start
+        batch = float("inf")
+        for _ in range(3):  # Best of three on a fresh history, as the buffer growth is amortized
+            calculator.clear_history()
+            start = time.perf_counter()
+            calculator.multiply_many(a, b)
+            batch = min(batch, time.perf_counter() - start)
+    print(f"scalar loop: {SIZE / scalar:14,.0f} ops/s")
+    print(f"multiply_many: {SIZE / batch:12,.0f} ops/s ({scalar / batch:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Benchmark for App.execute command dispatch.
+
+Registers increasing numbers of generated plugins and times dispatching a
+no-op plugin command and a basic operation, to show that the per-command
+overhead does not grow with the number of plugins.
+
+Run with: python -m benchmarks.dispatch
+"""
+import contextlib
+import inspect
+import io
+import logging
+import time
+from app import App
+from calculator.calculator import Calculator
+from calculator.history import HistoryFacade
+from commands import Command
+
+COMMANDS = 20_000
+
+
+def make_plugin(index):
+    """Create a plugin class whose command does nothing."""
+    def execute(value):  # pylint: disable=unused-argument
+        """Do nothing."""
+    return type(f"Plugin{index}", (Command,), {"command_name": f"plugin{index}", "execute": staticmethod(execute)})
+
+
+def main():
+    """Print the dispatch time per command for growing plugin counts."""
+    app = App()
+    logging.getLogger().setLevel(logging.WARNING)
+    app.calculator = Calculator(HistoryFacade(backend="memory"))
+    registered = 0
+    for plugins in (10, 100, 1000):
+        while registered < plugins:
+            cls = make_plugin(registered)
+            app.command_handler.register_plugin(
+                cls.command_name, cls(), list(inspect.signature(cls.execute).parameters.values()))
+            registered += 1
+        app.build_dispatch_table()
+        for label, line in (("plugin", f"plugin{plugins - 1} x"), ("add", "add 1 2")):
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                for _ in range(COMMANDS):
+                    app.execute(line)
+                elapsed = time.perf_counter() - start
+            print(f"{plugins:>5} plugins, {label:>6}: {elapsed / COMMANDS * 1e6:6.2f} us/command")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""Benchmark for HistoryFacade.add_record.
+
+Measures the average cost of one append at growing history sizes. With the
+buffered history the per-append cost should stay flat from 1k to 1M entries.
+
+Run with: python -m benchmarks.history_append
+"""
+import os
+import tempfile
+import time
+from calculator.history import HistoryFacade
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+
+
+def time_appends(size):
+    """Return the average seconds per add_record call for a history of the given size."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        facade = HistoryFacade(os.path.join(tmpdir, "history.csv"))
+        start = time.perf_counter()
+        for i in range(size):
+            facade.add_record("add", i, 1, i + 1)
+        elapsed = time.perf_counter() - start
+    return elapsed / size
+
+
+def main():
+    """Print the per-append cost for each history size."""
+    for size in SIZES:
+        per_append = time_appends(size)
+        print(f"{size:>9} entries: {per_append * 1e9:8.1f} ns/append")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Benchmark for opening a stored history.
+
+Measures how long it takes to create a HistoryFacade over a stored history
+and render its last ten entries. With the memory-mapped binary backend
+this should stay near-constant as the history grows.
+
+Run with: python -m benchmarks.history_open
+"""
+import os
+import tempfile
+import time
+import numpy as np
+from calculator.history import HistoryFacade
+from calculator.records import OPERATION_CODES, RECORD_DTYPE
+from calculator.storage import BinaryBackend
+
+SIZES = (1_000, 100_000, 1_000_000)
+
+
+def time_open(size):
+    """Return the seconds taken to open a binary history of the given size and show its tail."""
+    records = np.zeros(size, dtype=RECORD_DTYPE)
+    records["op"] = OPERATION_CODES["add"]
+    records["a"] = np.arange(size)
+    records["result"] = records["a"]
+    records["note"] = -1
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "history")
+        BinaryBackend(path).rewrite(records, [])
+        start = time.perf_counter()
+        HistoryFacade(path).rendered_entries(-10)
+        return time.perf_counter() - start
+
+
+def main():
+    """Print the open time for each history size."""
+    for size in SIZES:
+        print(f"{size:>9} entries: {time_open(size) * 1e3:8.3f} ms to open and show the tail")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Benchmark for HistoryFacade.query.
+
+Builds a history of a few million records and times selective queries
+once the index is built, and after a small batch of new rows.
+
+Run with: python -m benchmarks.history_query
+"""
+import os
+import tempfile
+import time
+import numpy as np
+from calculator.history import HistoryFacade
+from calculator.query import Range
+from calculator.records import RECORD_DTYPE
+from calculator.storage import BinaryBackend
+
+SIZE = 2_000_000
+
+
+def main():
+    """Print query timings over a large memory-mapped history."""
+    rng = np.random.default_rng(0)
+    records = np.zeros(SIZE, dtype=RECORD_DTYPE)
+    records["op"] = rng.integers(1, 5, SIZE)
+    records["a"] = rng.normal(size=SIZE)
+    records["b"] = rng.normal(size=SIZE)
+    records["result"] = rng.normal(size=SIZE) * 100
+    records["timestamp"] = np.arange(SIZE)
+    records["note"] = -1
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "history")
+        BinaryBackend(path).rewrite(records, [])
+        facade = HistoryFacade(path)
+        start = time.perf_counter()
+        facade.query(result=Range(0, 0))
+        print(f"Index build over {SIZE} rows: {(time.perf_counter() - start) * 1e3:8.1f} ms")
+        for label, filters in (
+                ("op=divide result>299", {"operation": "divide", "result": Range().restrict(">", 299)}),
+                ("result in [10, 10.5]", {"result": Range(10, 10.5)}),
+                ("last 1000 rows by time", {"timestamp": Range().restrict(">=", SIZE - 1000)})):
+            start = time.perf_counter()
+            summary = facade.query(**filters)
+            print(f"{label:>24}: {(time.perf_counter() - start) * 1e3:8.2f} ms ({summary['count']} rows)")
+        for i in range(1000):
+            facade.add_record("add", i, i, i + i)
+        start = time.perf_counter()
+        facade.query(result=Range(10, 10.5))
+        print(f"{'after 1000 appends':>24}: {(time.perf_counter() - start) * 1e3:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
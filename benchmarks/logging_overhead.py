@@ -0,0 +1,51 @@
+"""Benchmark for the logging cost of Calculator operations.
+
+Times ``Calculator.add`` with console and file handlers like those in
+``logging.conf``, logging synchronously and through the queue pipeline
+with and without sampling. The console goes to /dev/null.
+
+Run with: python -m benchmarks.logging_overhead
+"""
+import logging
+import os
+import tempfile
+import time
+from calculator.calculator import Calculator
+from calculator.history import HistoryFacade
+from logging_pipeline import start_queue_logging, stop_queue_logging
+
+CALLS = 50_000
+
+
+def timed_calls(calculator):
+    """Return the seconds taken by CALLS additions."""
+    start = time.perf_counter()
+    for i in range(CALLS):
+        calculator.add(i, 1)
+    return time.perf_counter() - start
+
+
+def main():
+    """Print the time per operation for each logging mode."""
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    with tempfile.TemporaryDirectory() as tmpdir, open(os.devnull, "w", encoding="utf-8") as devnull:
+        for label, options in (("synchronous", None), ("queue", {}), ("queue, sample 1/100", {"sample_rate": 100})):
+            calculator = Calculator(HistoryFacade(backend="memory"))
+            root.handlers = [logging.StreamHandler(devnull), logging.FileHandler(os.path.join(tmpdir, "app.log"))]
+            for handler in root.handlers:
+                handler.setFormatter(formatter)
+            if options is not None:
+                start_queue_logging(**options)
+            elapsed = timed_calls(calculator)
+            start = time.perf_counter()
+            stop_queue_logging()
+            drained = time.perf_counter() - start
+            for handler in root.handlers:
+                handler.close()
+            print(f"{label:>20}: {elapsed / CALLS * 1e6:6.2f} us/op on the caller, {drained * 1e3:7.1f} ms to drain")
+
+
+if __name__ == "__main__":
+    main()
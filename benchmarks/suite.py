@@ -0,0 +1,310 @@
+"""Benchmark suite for the calculator, history, plugin loading and the REPL.
+
+Every benchmark reports the best-of-``repeat`` seconds per operation:
+
+- ``calculator.<operation>``: one scalar ``Calculator`` operation,
+- ``history.add_entry[<rows>]``: one ``add_entry`` on a history of that size,
+- ``history.save_history[<backend>,<rows>]``, ``history.load_history[...]``:
+  saving or loading a whole history,
+- ``history.delete_entry[<rows>]``: deleting one entry from the middle,
+- ``plugins.load_plugins[cold|warm]``: registering a directory of generated
+  plugins without and with a cached manifest,
+- ``repl.command``: one line of scripted input through ``App.repl``.
+
+INFO logging is turned off while timing. Results are written as JSON and
+compared against a baseline (``benchmarks/baseline.json`` by default): a
+benchmark regresses when it is slower than its baseline by more than the
+threshold (25% by default), and the command then exits with status 1.
+Benchmarks missing on either side are listed but not compared.
+
+Run with: python -m benchmarks.suite [--sizes 1000,100000] [--repeat 3]
+    [--output results.json] [--baseline benchmarks/baseline.json]
+    [--threshold 0.25] [--update-baseline]
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+from calculator.calculator import Calculator
+from calculator.history import HistoryFacade
+from calculator.records import OPERATION_CODES, RECORD_DTYPE
+
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.25
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SCALAR_OPERATIONS = 100_000
+ENTRY_ADDS = 10_000
+DELETES = 100
+PLUGINS = 200
+REPL_LINES = 20_000
+PLUGIN_SOURCE = '''from commands import Command
+
+
+class Plugin{index}(Command):
+    command_name = "plugin{index}"
+
+    @staticmethod
+    def execute(text, times: int = 1):
+        print(text * times)
+'''
+
+
+def best_of(repeat, run):
+    """Return the smallest of ``repeat`` timings returned by ``run()``."""
+    return min(run() for _ in range(repeat))
+
+
+def make_records(size):
+    """Return ``size`` addition records."""
+    records = np.zeros(size, dtype=RECORD_DTYPE)
+    records["op"] = OPERATION_CODES["add"]
+    records["a"] = np.arange(size)
+    records["b"] = 1
+    records["result"] = records["a"] + 1
+    records["timestamp"] = time.time_ns()
+    records["note"] = -1
+    return records
+
+
+def memory_history(size):
+    """Return an in-memory history holding ``size`` records."""
+    history = HistoryFacade(backend="memory")
+    history.append_records(make_records(size))
+    return history
+
+
+def bench_calculator(operation, repeat):
+    """Return the seconds per scalar Calculator operation."""
+    def run():
+        calculator = Calculator(HistoryFacade(backend="memory"))
+        method = getattr(calculator, operation)
+        start = time.perf_counter()
+        for i in range(SCALAR_OPERATIONS):
+            method(i, 3)
+        return (time.perf_counter() - start) / SCALAR_OPERATIONS
+    return best_of(repeat, run)
+
+
+def bench_add_entry(size, repeat):
+    """Return the seconds per add_entry on a history of ``size`` rows."""
+    def run():
+        history = memory_history(size)
+        start = time.perf_counter()
+        for i in range(ENTRY_ADDS):
+            history.add_entry(f"Added {i} + 1 = {i + 1}")
+        return (time.perf_counter() - start) / ENTRY_ADDS
+    return best_of(repeat, run)
+
+
+def bench_delete_entry(size, repeat):
+    """Return the seconds per delete_entry from the middle of a history of ``size`` rows."""
+    deletes = min(DELETES, size // 2)
+
+    def run():
+        history = memory_history(size)
+        start = time.perf_counter()
+        for _ in range(deletes):
+            history.delete_entry(size // 4)
+        return (time.perf_counter() - start) / deletes
+    return best_of(repeat, run)
+
+
+def bench_save_load(backend, size, repeat):
+    """Return the seconds to save and to load a whole history of ``size`` rows."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "history.csv" if backend == "csv" else "history")
+        history = HistoryFacade(path, backend=backend)
+        history.append_records(make_records(size))
+
+        def save():
+            start = time.perf_counter()
+            history.save_history()
+            return time.perf_counter() - start
+
+        def load():
+            start = time.perf_counter()
+            HistoryFacade(path, backend=backend).load_history()
+            return time.perf_counter() - start
+        return best_of(repeat, save), best_of(repeat, load)
+
+
+def bench_load_plugins(repeat):
+    """Return the seconds to register a directory of generated plugins, without and with a cached manifest."""
+    from commands import CommandHandlerFactory  # pylint: disable=import-outside-toplevel
+    factory = CommandHandlerFactory()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        directory = os.path.join(tmpdir, "bench_plugins")
+        os.mkdir(directory)
+        for index in range(PLUGINS):
+            with open(os.path.join(directory, f"plugin{index}.py"), "w", encoding="utf-8") as plugin_file:
+                plugin_file.write(PLUGIN_SOURCE.format(index=index))
+
+        def load(cold):
+            if cold:
+                shutil.rmtree(os.path.join(directory, "__pycache__"), ignore_errors=True)
+            start = time.perf_counter()
+            factory.load_plugins(directory)
+            return time.perf_counter() - start
+        try:
+            cold = best_of(repeat, lambda: load(True))
+            warm = best_of(repeat, lambda: load(False))
+        finally:
+            factory.plugin_files.pop(directory, None)  # Otherwise the singleton keeps polling a deleted directory
+            for index in range(PLUGINS):
+                factory.commands.pop(f"plugin{index}", None)
+                factory.specs.pop(f"plugin{index}", None)
+    return cold, warm
+
+
+def bench_repl(repeat):
+    """Return the seconds per line of scripted input run through App.repl."""
+    from app import App  # pylint: disable=import-outside-toplevel
+    session = App().new_session()
+    commands = ["add 1 2", "subtract 5 3", "multiply 2.5 4", "divide 9 3", "expr (1 + 2) * 3 / 4"]
+    script = "\n".join(commands[i % len(commands)] for i in range(REPL_LINES)) + "\nexit\n"
+
+    def run():
+        stdin = sys.stdin
+        sys.stdin = io.StringIO(script)
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.suppress(SystemExit):
+                session.repl()
+        finally:
+            sys.stdin = stdin
+        return (time.perf_counter() - start) / REPL_LINES
+    return best_of(repeat, run)
+
+
+def run_suite(sizes=DEFAULT_SIZES, repeat=DEFAULT_REPEAT, report=print):
+    """Run every benchmark and return a dict of benchmark name -> seconds per operation."""
+    # Imported up front so the first history load is not charged for it
+    import pandas  # pylint: disable=import-outside-toplevel,unused-import
+    results = {}
+
+    def record(name, seconds):
+        results[name] = seconds
+        report(f"{name:<40} {format_seconds(seconds)}")
+
+    for operation in ("add", "subtract", "multiply", "divide"):
+        record(f"calculator.{operation}", bench_calculator(operation, repeat))
+    for size in sizes:
+        record(f"history.add_entry[{size}]", bench_add_entry(size, repeat))
+        record(f"history.delete_entry[{size}]", bench_delete_entry(size, repeat))
+        for backend in ("csv", "binary"):
+            save, load = bench_save_load(backend, size, repeat)
+            record(f"history.save_history[{backend},{size}]", save)
+            record(f"history.load_history[{backend},{size}]", load)
+    cold, warm = bench_load_plugins(repeat)
+    record("plugins.load_plugins[cold]", cold)
+    record("plugins.load_plugins[warm]", warm)
+    record("repl.command", bench_repl(repeat))
+    return results
+
+
+def format_seconds(seconds):
+    """Format a duration with a unit that suits its size."""
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:9.2f} {unit}"
+    return f"{seconds / 1e-9:9.2f} ns"
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Compare results with baseline timings.
+
+    Returns ``(name, baseline, current, ratio, regressed)`` for every
+    benchmark present in both, where ``ratio`` is current / baseline."""
+    rows = []
+    for name, current in results.items():
+        if name in baseline:
+            ratio = current / baseline[name] if baseline[name] else float("inf")
+            rows.append((name, baseline[name], current, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def read_results(path):
+    """Return the timings stored in a results file, or None if it does not exist."""
+    try:
+        with open(path, encoding="utf-8") as results_file:
+            return json.load(results_file)["results"]
+    except FileNotFoundError:
+        return None
+
+
+def write_results(path, results):
+    """Write timings to a JSON file along with the environment they were measured in."""
+    document = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "unit": "seconds per operation",
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as results_file:
+        json.dump(document, results_file, indent=2, sort_keys=True)
+        results_file.write("\n")
+
+
+def parse_arguments(argv):
+    """Parse the command line."""
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and compare it with a baseline.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated history sizes (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="runs per benchmark; the best is kept")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline JSON file (default: %(default)s)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown before a benchmark counts as a regression (default: %(default)s)")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the suite, write and compare the results; return 1 if anything regressed."""
+    arguments = parse_arguments(argv)
+    sizes = [int(size) for size in arguments.sizes.split(",") if size]
+    logging.disable(logging.INFO)
+    try:
+        results = run_suite(sizes, arguments.repeat)
+    finally:
+        logging.disable(logging.NOTSET)
+    if arguments.output:
+        write_results(arguments.output, results)
+    if arguments.update_baseline:
+        write_results(arguments.baseline, results)
+        print(f"Baseline written to {arguments.baseline}.")
+        return 0
+    baseline = read_results(arguments.baseline)
+    if baseline is None:
+        print(f"No baseline at {arguments.baseline}; run with --update-baseline to create one.")
+        return 0
+    rows = compare(results, baseline, arguments.threshold)
+    print(f"\n{'benchmark':<40} {'baseline':>12} {'current':>12}  change")
+    for name, before, after, ratio, regressed in rows:
+        print(f"{name:<40} {format_seconds(before)} {format_seconds(after)}  {ratio - 1:+7.1%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    unmatched = sorted(set(results) ^ set(baseline))
+    if unmatched:
+        print(f"Not compared (missing from the results or the baseline): {', '.join(unmatched)}")
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than the baseline by more than {arguments.threshold:.0%}.")
+        return 1
+    print(f"No regressions beyond {arguments.threshold:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,34 +1,41 @@
 """Module for the Calculator class, handling arithmetic operations and history management."""
 import logging
-from calculator.history import HistoryFacade
+import os
+import numpy as np
+from calculator import tabular
+from calculator.expression import compile_expression
+from calculator.history import HistoryFacade, ThreadSafeHistoryFacade
+
+OPERATORS = {"add": np.add, "subtract": np.subtract, "multiply": np.multiply, "divide": np.true_divide}
+ZERO_DIVISION_POLICIES = ("raise", "nan", "skip")
 
 
 class Calculator:
     """The main calculator class that performs basic arithmetic operations and manages plugins."""    
-    def __init__(self):
-        self.history_facade = HistoryFacade()
+    def __init__(self, history_facade=None):
+        if history_facade is None:
+            thread_safe = os.getenv("history_thread_safe", "off").lower() in ("on", "true", "1")
+            history_facade = ThreadSafeHistoryFacade() if thread_safe else HistoryFacade()
+        self.history_facade = history_facade
     def add(self, a, b):
         """Return the sum of a and b."""
         result = a + b
-        entry = f"Added {a} + {b} = {result}"
-        self.history_facade.add_entry(entry)
-        logging.info(entry)
+        self.history_facade.add_record("add", a, b, result)
+        logging.info("Added %s + %s = %s", a, b, result)
         return result
 
     def subtract(self, a, b):
         """Return the result of a minus b."""
         result = a - b
-        entry = f"Subtracted {a} - {b} = {result}"
-        self.history_facade.add_entry(entry)
-        logging.info(entry)
+        self.history_facade.add_record("subtract", a, b, result)
+        logging.info("Subtracted %s - %s = %s", a, b, result)
         return result
 
     def multiply(self, a, b):
         """Return the product of a and b."""
         result = a * b
-        entry = f"Multiplied {a} * {b} = {result}"
-        self.history_facade.add_entry(entry)
-        logging.info(entry)
+        self.history_facade.add_record("multiply", a, b, result)
+        logging.info("Multiplied %s * %s = %s", a, b, result)
         return result
 
     def divide(self, a, b):
@@ -37,15 +44,147 @@ class Calculator:
             logging.error("Division by zero attempted.")
             raise ValueError("Cannot divide by zero.")
         result = a / b
-        entry = f"Divided {a} / {b} = {result}"
-        self.history_facade.add_entry(entry)
-        logging.info(entry)
+        self.history_facade.add_record("divide", a, b, result)
+        logging.info("Divided %s / %s = %s", a, b, result)
+        return result
+
+    def calculate(self, operation, arguments):
+        """Perform a basic operation on two string arguments and return the result.
+
+        Raises ValueError with a message for the user when the arguments are
+        not two numbers or when dividing by zero."""
+        if len(arguments) != 2:
+            logging.error("%s requires exactly 2 arguments.", operation)
+            raise ValueError(f"{operation} requires exactly 2 arguments.")
+        try:
+            # Convert arguments to numbers
+            a, b = float(arguments[0]), float(arguments[1])
+        except ValueError as e:
+            logging.error("Invalid arguments. Arguments must be numbers.")
+            raise ValueError("Invalid arguments. Arguments must be numbers.") from e
+        return getattr(self, operation)(a, b)
+
+    def apply(self, operation, a, b, zero_division="raise"):
+        """Apply an operation element-wise to two operand arrays and return the results.
+
+        The whole batch is computed with NumPy, recorded in the history with
+        one bulk insert and logged with one summary line. ``zero_division``
+        decides what happens to divisions by zero: ``raise`` raises ValueError
+        before anything is recorded, ``nan`` returns NaN for those elements
+        and ``skip`` leaves them out of the returned results. Elements divided
+        by zero are never recorded in the history."""
+        if operation not in OPERATORS:
+            raise ValueError(f"Unknown operation: {operation}")
+        if zero_division not in ZERO_DIVISION_POLICIES:
+            raise ValueError(f"Unknown zero division policy: {zero_division}")
+        a, b = np.broadcast_arrays(np.atleast_1d(a), np.atleast_1d(b))
+        if operation != "divide":
+            result = OPERATORS[operation](a, b)
+            self.history_facade.add_records(operation, a, b, result)
+            logging.info("Applied %s to %d operand pairs.", operation, len(result))
+            return result
+        valid = b != 0
+        skipped = len(valid) - int(np.count_nonzero(valid))
+        if skipped and zero_division == "raise":
+            logging.error("Division by zero attempted in %d of %d operand pairs.", skipped, len(valid))
+            raise ValueError("Cannot divide by zero.")
+        result = np.divide(a, b, out=np.full(len(valid), np.nan), where=valid)
+        self.history_facade.add_records(operation, a[valid], b[valid], result[valid])
+        logging.info("Applied divide to %d operand pairs (%d divisions by zero, policy '%s').",
+                     len(valid), skipped, zero_division)
+        return result[valid] if zero_division == "skip" else result
+
+    def add_many(self, a, b):
+        """Return the element-wise sums of two operand arrays."""
+        return self.apply("add", a, b)
+
+    def subtract_many(self, a, b):
+        """Return the element-wise differences of two operand arrays."""
+        return self.apply("subtract", a, b)
+
+    def multiply_many(self, a, b):
+        """Return the element-wise products of two operand arrays."""
+        return self.apply("multiply", a, b)
+
+    def divide_many(self, a, b, zero_division="raise"):
+        """Return the element-wise quotients of two operand arrays."""
+        return self.apply("divide", a, b, zero_division)
+
+    def evaluate(self, expression, bindings=None):
+        """Evaluate an expression such as ``(3 + 4) * 2 / x`` and return the result.
+
+        The expression is compiled once and cached by its text. Binding
+        variables to arrays evaluates the expression for every element in one
+        vectorized pass. Each binary operation is recorded in the history (in
+        bulk for arrays) once the whole expression has been evaluated, so a
+        failing expression records nothing. Raises ValueError for invalid
+        expressions, unbound variables and division by zero."""
+        bindings = {name: np.asarray(value) if isinstance(value, (list, tuple)) else value
+                    for name, value in (bindings or {}).items()}
+        operations = []
+        result = compile_expression(expression).evaluate(bindings, lambda *operation: operations.append(operation))
+        for operation, a, b, value in operations:
+            if isinstance(value, np.ndarray):
+                a, b = np.broadcast_arrays(a, b)
+                self.history_facade.add_records(operation, a, b, value)
+            else:
+                self.history_facade.add_record(operation, a, b, value)
+        logging.info("Evaluated %s with %d recorded operations.", expression, len(operations))
         return result
 
+    def aggregate_file(self, csv_file, function, column, group_by=None):
+        """Aggregate a column of a CSV file, recording one history entry for the result.
+
+        Returns a number, or a pandas Series per group with ``group_by``."""
+        result = tabular.aggregate(csv_file, function, column, group_by)
+        name = os.path.basename(csv_file)
+        if group_by:
+            self.history_facade.add_entry(f"{function} of {column} by {group_by} in {name}: {len(result)} groups")
+        else:
+            self.history_facade.add_entry(f"{function} of {column} in {name} = {result}")
+        logging.info("Aggregated %s of %s in %s.", function, column, csv_file)
+        return result
+
+    def calculate_file(self, csv_file, operation, column_a, column_b):
+        """Yield arrays of ``column_a <operation> column_b`` over a CSV file, chunk by chunk.
+
+        One history entry summarising the whole pass (row count and sum of the
+        results) is recorded once the file has been read."""
+        rows, total = 0, 0.0
+        for result in tabular.calculate(csv_file, operation, column_a, column_b):
+            rows += len(result)
+            total += float(np.nansum(result))
+            yield result
+        self.history_facade.add_entry(
+            f"{operation} {column_a} and {column_b} in {os.path.basename(csv_file)}: {rows} rows, sum {total}")
+        logging.info("Applied %s to %d rows of %s.", operation, rows, csv_file)
+
     def show_history(self):
         """Show the current calculation history."""
         return self.history_facade.show_history()
 
+    def history_pages(self, offset=0, limit=None):
+        """Yield the history from ``offset`` as rendered pages, up to ``limit`` entries."""
+        stop = None if limit is None else offset + limit
+        return self.history_facade.history_pages(offset, stop)
+
+    def history_tail_pages(self, count):
+        """Yield the last ``count`` history entries as rendered pages."""
+        return self.history_facade.history_pages(max(len(self.history_facade) - count, 0))
+
+    def load_history_pages(self):
+        """Reload the history from disk, yielding rendered pages as rows are read."""
+        return self.history_facade.load_history_pages()
+
+    def query_history(self, **filters):
+        """Return a summary of the history entries matching the filters."""
+        summary = self.history_facade.query(**filters)
+        if not summary["count"]:
+            return "No matching history entries."
+        by_operation = ", ".join(f"{name}: {count}" for name, count in summary["by_operation"].items())
+        return (f"Count: {summary['count']} ({by_operation})\n"
+                f"Sum: {summary['sum']}, Mean: {summary['mean']}, Min: {summary['min']}, Max: {summary['max']}")
+
     def save_history(self):
         """Save the current history to a CSV file."""
         self.history_facade.save_history()
@@ -55,9 +194,19 @@ class Calculator:
         """Load history from a CSV file and return it as a string."""
         loaded_history = self.history_facade.load_history()
         if not loaded_history.empty:
-            return loaded_history.to_string(index=False)
+            return self.history_facade.show_history()
         return "No history found."
 
+    def import_history(self, csv_file):
+        """Append the entries of a CSV history file to the current history."""
+        count = self.history_facade.import_csv(csv_file)
+        return f"Imported {count} entries."
+
+    def export_history(self, csv_file):
+        """Export the current history to a CSV file."""
+        self.history_facade.export_csv(csv_file)
+        return f"History exported to {csv_file}."
+
     def clear_history(self):
         """Clear the current calculation history."""
         self.history_facade.clear_history()
@@ -66,3 +215,13 @@ class Calculator:
     def delete_history_record(self, index):
         """Delete a specific record from the history."""
         return self.history_facade.delete_entry(index)
+
+    def delete_history_records(self, rows):
+        """Delete the history records at the given indexes; raise ValueError for an invalid index."""
+        count = self.history_facade.delete_entries(rows)
+        return f"Deleted {count} record{'' if count == 1 else 's'}."
+
+    def delete_history_where(self, **filters):
+        """Delete the calculations matching the filters (as for ``query_history``)."""
+        count = self.history_facade.delete_where(**filters)
+        return f"Deleted {count} record{'' if count == 1 else 's'}."
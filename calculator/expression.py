@@ -0,0 +1,99 @@
+"""Compiled arithmetic expressions such as ``(3 + 4) * 2 / x``.
+
+``compile_expression`` parses an expression once with Python's ``ast``
+module, accepting only numbers, variable names, ``+ - * /`` and unary
+``+``/``-``, and turns it into a flat list of stack-machine instructions.
+Compiled expressions are kept in an LRU cache keyed by the expression
+text, so evaluating the same expression again skips parsing.
+
+Variables may be bound to numbers or to NumPy arrays; with arrays the whole
+expression is evaluated for every binding in one vectorized pass.
+"""
+import ast
+import functools
+import operator
+import numpy as np
+
+CACHE_SIZE = 256
+
+LOAD_CONST = "const"
+LOAD_NAME = "name"
+NEGATE = "negate"
+BINARY_OPERATIONS = {ast.Add: "add", ast.Sub: "subtract", ast.Mult: "multiply", ast.Div: "divide"}
+SCALAR_OPERATORS = {"add": operator.add, "subtract": operator.sub, "multiply": operator.mul, "divide": operator.truediv}
+ARRAY_OPERATORS = {"add": np.add, "subtract": np.subtract, "multiply": np.multiply, "divide": np.true_divide}
+
+
+class CompiledExpression:
+    """An expression compiled to a list of (instruction, argument) pairs."""
+    def __init__(self, text, instructions):
+        self.text = text
+        self.instructions = instructions
+        self.variables = sorted({argument for instruction, argument in instructions if instruction == LOAD_NAME})
+
+    def evaluate(self, bindings=None, on_operation=None):
+        """Evaluate the expression with variables taken from ``bindings``.
+
+        ``on_operation(operation, a, b, result)`` is called after every
+        binary operation, e.g. to record it in the history. Raises ValueError
+        for unbound variables and for division by zero."""
+        bindings = bindings or {}
+        missing = [name for name in self.variables if name not in bindings]
+        if missing:
+            raise ValueError(f"No value given for {', '.join(missing)}.")
+        stack = []
+        for instruction, argument in self.instructions:
+            if instruction == LOAD_CONST:
+                stack.append(argument)
+            elif instruction == LOAD_NAME:
+                stack.append(bindings[argument])
+            elif instruction == NEGATE:
+                stack.append(-stack.pop())
+            else:
+                b, a = stack.pop(), stack.pop()
+                stack.append(_binary(argument, a, b))
+                if on_operation:
+                    on_operation(argument, a, b, stack[-1])
+        return stack[0]
+
+
+def _binary(operation, a, b):
+    """Apply a binary operation to two numbers or arrays."""
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        if operation == "divide" and np.any(np.asarray(b) == 0):
+            raise ValueError("Cannot divide by zero.")
+        return ARRAY_OPERATORS[operation](a, b)
+    try:
+        return SCALAR_OPERATORS[operation](a, b)
+    except ZeroDivisionError as e:
+        raise ValueError("Cannot divide by zero.") from e
+
+
+def _compile(node, instructions):
+    """Append the instructions for an AST node, rejecting anything but arithmetic."""
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        instructions.append((LOAD_CONST, node.value))
+    elif isinstance(node, ast.Name):
+        instructions.append((LOAD_NAME, node.id))
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+        _compile(node.operand, instructions)
+        if isinstance(node.op, ast.USub):
+            instructions.append((NEGATE, None))
+    elif isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATIONS:
+        _compile(node.left, instructions)
+        _compile(node.right, instructions)
+        instructions.append(("binary", BINARY_OPERATIONS[type(node.op)]))
+    else:
+        raise ValueError(f"Unsupported expression element: {ast.dump(node)[:40]}")
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def compile_expression(text):
+    """Parse and compile an expression, reusing the cached result for text seen before."""
+    try:
+        tree = ast.parse(text.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression: {text}") from e
+    instructions = []
+    _compile(tree.body, instructions)
+    return CompiledExpression(text, tuple(instructions))
@@ -1,59 +1,652 @@
-"""Module for managing calculation history using Pandas DataFrame.
+"""Module for managing calculation history.
 
 This module provides the HistoryFacade class, which allows
 adding, saving, loading, clearing, and deleting history entries
-from a CSV file."""
+through a storage backend (see ``calculator.storage``), and
+ThreadSafeHistoryFacade, which may be shared between threads."""
+import functools  # Standard library import
 import os  # Standard library import
 import logging  # Standard library import
-import pandas as pd  # Third-party import
+import threading  # Standard library import
+import time  # Standard library import
+import numpy as np  # Third-party import
+from calculator.records import (  # Local application imports
+    CSV_COLUMNS, OP_NOTE, OPERATION_CODES, OPERATIONS, RECORD_DTYPE, RecordBuffer,
+    array_int_mask, int_mask, parse_entry, render_record)
+from calculator.metrics import timed  # Local application imports
+from calculator.query import HistoryIndex  # Local application imports
+from calculator.spill import SpillDirectory, SpillingRecordBuffer  # Local application imports
+from calculator.storage import CsvBackend, make_backend  # Local application imports
+
+PAGE_SIZE = 1000
+CHUNK_ROWS = 65536  # Rows read at a time by saves, exports, queries and deletes
+SAVE_MODES = ("rewrite", "journal")
+FSYNC_POLICIES = ("off", "always", "batch")
+EMPTY_RECORDS = np.zeros(0, dtype=RECORD_DTYPE)
+
+
+def fill_records(records, operation, a, b, result):
+    """Fill allocated records in place (avoiding a second copy) from equal-length arrays."""
+    records["op"] = OPERATION_CODES[operation]
+    records["int_mask"] = array_int_mask(a, b, result)
+    records["a"], records["b"], records["result"] = a, b, result
+    records["timestamp"] = time.time_ns()
+    records["note"] = -1
+
 
 class HistoryFacade:
-    """Facade class for managing history using Pandas DataFrame."""    
-    def __init__(self, history_file="calculation_history.csv"):
-        self.history_file = history_file
-        self.history_df = pd.DataFrame(columns=["Calculation"])  # Initialize an empty DataFrame
-        if os.path.exists(self.history_file):
-            self.history_df = pd.read_csv(self.history_file)
-        else:
+    """Facade class for managing history stored as typed records.
+
+    The logical history is the stored records (``_base``, read-only and
+    memory-mapped for the binary backend) followed by the records added
+    since (``_records``, a growable NumPy buffer). Adding an entry is
+    amortized O(1) and a DataFrame is only built when one is asked for.
+    Nothing is read from the backend until the history is first used.
+
+    In the ``rewrite`` save mode every save rewrites the stored history; in
+    ``journal`` mode a save only appends the new entries (fsynced as the
+    ``fsync`` policy says) until deletes or an outdated file layout call for
+    a compaction. With ``memory_limit`` set, older added entries are spilled
+    to disk (see ``calculator.spill``) and saves, exports, queries and
+    deletes read the history a chunk at a time; tombstones and the
+    ``records`` and ``history_df`` properties still grow with the history."""
+    def __init__(self, history_file=None, save_mode=None, fsync=None, fsync_batch_size=None, backend=None,
+                 memory_limit=None, spill_dir=None):
+        self.history_file = history_file or os.getenv("history_file_path", "calculation_history.csv")
+        self.backend = make_backend(self.history_file, backend or os.getenv("history_backend"))
+        self.save_mode = save_mode or os.getenv("history_save_mode", "rewrite")
+        self.fsync = fsync or os.getenv("history_fsync", "off")
+        self.fsync_batch_size = fsync_batch_size or int(os.getenv("history_fsync_batch_size", "100"))
+        self.memory_limit = memory_limit or int(os.getenv("history_memory_limit") or 0)
+        self.spill_dir = spill_dir or os.getenv("history_spill_dir") or None
+        self.chunk_rows = min(CHUNK_ROWS, self.memory_limit) if self.memory_limit else CHUNK_ROWS
+        if self.save_mode not in SAVE_MODES:
+            raise ValueError(f"Unknown history save mode: {self.save_mode}")
+        if self.fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown history fsync policy: {self.fsync}")
+        self._reset()
+        if not self.backend.exists():
+            self._loaded = True
             self.save_history()  # Create an empty history file if it doesn't exist
 
+    def _reset(self):
+        """Drop the in-memory history so the stored one is read again on next use."""
+        self._base = EMPTY_RECORDS  # Records read from the backend
+        self._records = self._new_buffer()  # Records added after _base
+        self._notes = []  # Text of free-form entries, referenced by the records' note column
+        self._note_codes = {}
+        self._loaded = False
+        self._saved_count = 0  # Number of leading _records already written to the backend
+        self._needs_compaction = False  # True once the backend holds entries that were deleted
+        self._unsynced_saves = 0
+        self._index = None  # HistoryIndex over the rows, built on the first query
+        self._clear_tombstones()
+
+    def _clear_tombstones(self):
+        """Forget every tombstone, once the deleted rows are gone."""
+        self._deleted = None  # Tombstone bitmap over the physical rows (_base, then _records) up to the last delete
+        self._deleted_count = 0
+        self._live = None  # Physical row numbers of the rows the bitmap keeps
+
+    def _new_buffer(self):
+        """Return an empty buffer for added records, bounded in memory when ``memory_limit`` is set."""
+        if self.memory_limit:
+            return SpillingRecordBuffer(self.memory_limit, self.spill_dir)
+        return RecordBuffer()
+
+    def _ensure_loaded(self):
+        """Open the stored history the first time it is needed."""
+        if not self._loaded:
+            if self.memory_limit and not self.backend.memory_mapped and not len(self._records):
+                for records, self._notes in self.backend.iter_read(self.chunk_rows):
+                    self._records.extend(records)  # Spilled as it is read; the rows count as saved
+                self._saved_count = len(self._records)
+            else:
+                self._base, self._notes = self.backend.read()
+            if self.memory_limit and len(self._base) > self.memory_limit and not self.backend.memory_mapped:
+                self._base_spill = SpillDirectory(self.spill_dir)  # Replaced, and so removed, on the next load
+                self._base = self._base_spill.write(self._base)
+            self._note_codes = {text: code for code, text in enumerate(self._notes)}
+            self._needs_compaction = self._needs_compaction or self.backend.outdated()  # Rewrite before appending
+            self._loaded = True
+
+    @property
+    def records(self):
+        """Return the history records as a NumPy structured array, built in memory."""
+        self._ensure_loaded()
+        records = self._records.view() if not len(self._base) else np.concatenate([self._base, self._records.view()])
+        if self._deleted_count:
+            keep = np.ones(len(records), dtype=bool)
+            keep[:len(self._deleted)] = ~self._deleted
+            records = records[keep]
+        return records
+
+    @property
+    def history_df(self):
+        """Return the history as a typed DataFrame."""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        records = self.records
+        return pd.DataFrame({
+            "operation": pd.Categorical.from_codes(records["op"], categories=OPERATIONS),
+            "a": records["a"],
+            "b": records["b"],
+            "result": records["result"],
+            "timestamp": records["timestamp"],
+            "note": pd.Categorical.from_codes(records["note"], categories=self._notes),
+        })
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._base) + len(self._records) - self._deleted_count
+
+    def _physical_count(self):
+        """Return the number of stored and added rows, tombstoned ones included."""
+        self._ensure_loaded()
+        return len(self._base) + len(self._records)
+
+    def _replace_records(self, records):
+        """Make ``records`` the added records, removing the spilled segments of the old buffer."""
+        old, self._records = self._records, records
+        old.clear()
+
+    def _physical_rows(self, rows):
+        """Map sorted row numbers of the history to physical row numbers, skipping tombstoned rows."""
+        if not self._deleted_count:
+            return rows
+        live = self._live
+        if not len(live):
+            return rows + len(self._deleted)
+        return np.where(rows < len(live), live[np.minimum(rows, len(live) - 1)], rows - len(live) + len(self._deleted))
+
+    @timed("history.add_record")
+    def add_record(self, operation, a, b, result):
+        """Add a calculation to the history as a typed record."""
+        self._records.append(OPERATION_CODES[operation], a, b, result, time.time_ns(), int_mask(a, b, result))
+
+    @timed("history.add_records")
+    def add_records(self, operation, a, b, result):
+        """Add many calculations of one operation from equal-length arrays in one bulk insert."""
+        a, b, result = np.asarray(a), np.asarray(b), np.asarray(result)
+        fill_records(self._records.allocate(len(result)), operation, a, b, result)
+
+    @timed("history.append_records")
+    def append_records(self, records):
+        """Append a structured array of calculation records (not notes), such as another history's ``records``."""
+        self._records.extend(records)
+
+    @timed("history.add_entry")
     def add_entry(self, entry):
-        """Add a new entry to the history DataFrame."""
-        new_entry = {"Calculation": entry}
-        self.history_df = pd.concat([self.history_df, pd.DataFrame([new_entry])], ignore_index=True)
+        """Add a text entry to the history.
+
+        Text in the calculator's own format ("Added 1 + 2 = 3") is stored as a
+        typed record; anything else is kept as a free-form note."""
+        parsed = parse_entry(entry)
+        if parsed:
+            self._records.append(*parsed[:4], time.time_ns(), parsed[4])
+        else:
+            self._records.append(OP_NOTE, 0.0, 0.0, 0.0, time.time_ns(), note=self._note_code(entry))
+
+    def _note_code(self, text):
+        """Return the note table index for ``text``, adding it if needed."""
+        self._ensure_loaded()  # Stored notes must keep their codes
+        code = self._note_codes.get(text)
+        if code is None:
+            code = self._note_codes[text] = len(self._notes)
+            self._notes.append(text)
+        return code
+
+    def _slice(self, start=0, stop=None):
+        """Return the records in ``[start, stop)``, reading only that part of the stored history."""
+        if not self._deleted_count:
+            return self._physical_slice(start, stop)
+        rows = range(len(self))[start:stop]
+        if rows.start >= len(self._live):  # Past the last tombstone rows are only shifted
+            offset = len(self._deleted) - len(self._live)
+            return self._physical_slice(rows.start + offset, max(rows.stop, rows.start) + offset)
+        return self._physical_take(self._physical_rows(np.arange(rows.start, max(rows.stop, rows.start))))
+
+    def _take(self, rows):
+        """Return the records at the given sorted row numbers."""
+        return self._physical_take(self._physical_rows(rows))
+
+    def _physical_slice(self, start=0, stop=None):
+        """Return the physical rows in ``[start, stop)``, tombstoned ones included."""
+        rows = range(self._physical_count())[start:stop]
+        base_count = len(self._base)
+        stored = self._base[min(rows.start, base_count):min(rows.stop, base_count)]
+        added = self._records.slice(max(rows.start - base_count, 0), max(rows.stop - base_count, 0))
+        if not len(stored):
+            return added
+        return np.concatenate([stored, added]) if len(added) else stored
+
+    def _physical_chunks(self, start=0, stop=None):
+        """Yield ``(physical row, records)`` for the physical rows in ``[start, stop)``, ``chunk_rows`` at a time.
+
+        Stored, spilled and in-memory rows are read as views where they can be."""
+        rows = range(self._physical_count())[start:stop]
+        for chunk_start in range(rows.start, rows.stop, self.chunk_rows):
+            yield chunk_start, self._physical_slice(chunk_start, min(chunk_start + self.chunk_rows, rows.stop))
+
+    def _chunks(self, start=0, stop=None):
+        """Yield ``(row, records)`` for the history rows from ``start`` on, a chunk at a time.
+
+        Tombstoned rows are skipped; ``stop`` bounds the physical rows read."""
+        physical_start = self._physical_rows(np.array([start]))[0] if start else 0
+        row = start
+        for chunk_start, records in self._physical_chunks(physical_start, stop):
+            if self._deleted_count and chunk_start < len(self._deleted):
+                keep = np.ones(len(records), dtype=bool)
+                deleted = self._deleted[chunk_start:chunk_start + len(records)]
+                keep[:len(deleted)] = ~deleted
+                records = records[keep]
+            if len(records):
+                yield row, records
+                row += len(records)
+
+    def _live_chunks(self):
+        """Yield the records of the whole history a chunk at a time, for the backends to write."""
+        return (records for _, records in self._chunks())
+
+    def _physical_take(self, rows):
+        """Return the physical rows at the given sorted row numbers."""
+        base_count = len(self._base)
+        split = np.searchsorted(rows, base_count)
+        stored = self._base[rows[:split]]
+        added = self._records.take(rows[split:] - base_count)
+        return np.concatenate([stored, added]) if len(stored) and len(added) else stored if len(stored) else added
+
+    @timed("history.query")
+    def query(self, operation=None, result=None, a=None, b=None, timestamp=None):
+        """Return the count and result aggregates of the calculations matching all filters.
+
+        ``operation`` is an operation name; ``result``, ``a``, ``b`` and
+        ``timestamp`` are ``calculator.query.Range`` objects. The indexes are
+        brought up to date first and the most selective one picks the rows
+        to read, so only those rows are scanned. Under a memory limit there
+        is no index and the history is scanned a chunk at a time."""
+        count, total, low, high = 0, 0.0, None, None
+        counts = np.zeros(len(OPERATIONS), dtype=np.int64)
+        for _, matched in self._match(operation, result, a, b, timestamp):
+            results = matched["result"]
+            count += len(matched)
+            total += float(results.sum())
+            low = float(results.min()) if low is None else min(low, float(results.min()))
+            high = float(results.max()) if high is None else max(high, float(results.max()))
+            counts += np.bincount(matched["op"], minlength=len(OPERATIONS))
+        return {
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else None,
+            "min": low,
+            "max": high,
+            "by_operation": {name: int(counts[code]) for code, name in enumerate(OPERATIONS) if counts[code]},
+        }
+
+    def _match(self, operation=None, result=None, a=None, b=None, timestamp=None):
+        """Yield the row numbers and the records of the calculations matching all filters, a chunk at a time."""
+        code = None if operation is None else OPERATION_CODES[operation]
+        rows = None
+        if not self.memory_limit:  # The index grows with the history, so a bounded history goes without
+            if self._index is None:
+                self._index = HistoryIndex()
+            for _, records in self._chunks(self._index.indexed):
+                self._index.update(records)
+            rows = self._index.candidates(code, result, timestamp)
+        if rows is None:
+            chunks = ((np.arange(start, start + len(records)), records) for start, records in self._chunks())
+        else:
+            chunks = ((rows[start:start + self.chunk_rows], self._take(rows[start:start + self.chunk_rows]))
+                      for start in range(0, len(rows), self.chunk_rows))
+        for chunk_rows, records in chunks:
+            mask = records["op"] != OP_NOTE
+            if code is not None:
+                mask &= records["op"] == code
+            for field, value_range in (("result", result), ("a", a), ("b", b), ("timestamp", timestamp)):
+                if value_range is not None:
+                    mask &= value_range.mask(records[field])
+            if mask.any():
+                yield chunk_rows[mask], records[mask]
 
+    def rendered_entries(self, start=0, stop=None):
+        """Return the display text of the entries in ``[start, stop)``."""
+        return [render_record(record, self._notes) for record in self._slice(start, stop)]
+
+    def history_pages(self, start=0, stop=None, page_size=PAGE_SIZE):
+        """Yield the entries in ``[start, stop)`` as rendered pages of up to ``page_size`` lines.
+
+        Only one page is rendered at a time, so large histories can be written
+        out without building one huge string."""
+        rows = range(len(self))[start:stop]
+        for page_start in range(rows.start, rows.stop, page_size):
+            page_stop = min(page_start + page_size, rows.stop)
+            yield self._render_page(page_start, self._slice(page_start, page_stop))
+
+    def _render_page(self, start, records):
+        """Render records as numbered lines, the first one having index ``start``."""
+        return "\n".join(f"{index:>6}  {render_record(record, self._notes)}"
+                         for index, record in enumerate(records, start))
+
+    @timed("history.save_history")
     def save_history(self):
-        """Save the DataFrame to a CSV file."""
-        self.history_df.to_csv(self.history_file, index=False)
+        """Save the history, appending only new entries in journal mode."""
+        if (self.save_mode == "rewrite" or self._needs_compaction or not self.backend.exists()
+                or self.backend.outdated()):
+            self.compact_history()
+            return
+        self._ensure_loaded()  # The stored rows come before the new ones
+        self._apply_tombstones()  # Only unsaved rows can have tombstones here
+        start = len(self._base) + self._saved_count
+        stop = self._physical_count()
+        if stop > start:
+            chunks = (records for _, records in self._physical_chunks(start, stop))
+            self.backend.append(chunks, self._notes, sync=self._should_sync())
+            self._saved_count += stop - start
+            self._absorb_saved()
+        logging.info("History journaled to '%s' (%d new entries).", self.history_file, stop - start)
+
+    @timed("history.compact_history")
+    def compact_history(self):
+        """Rewrite the whole stored history from the in-memory history, a chunk at a time."""
+        self._ensure_loaded()
+        if not self.backend.memory_mapped:
+            self._apply_tombstones()  # The live rows stay in memory (or spilled) as the saved history
+        self.backend.rewrite(self._live_chunks(), self._notes, sync=self.fsync != "off")
+        if self._deleted_count:  # Memory-mapped: the rewritten file is mapped back in below
+            self._base = EMPTY_RECORDS
+            self._records.clear()
+            self._clear_tombstones()
+            self._index = None
+        self._saved_count = len(self._records)
+        self._needs_compaction = False
+        self._unsynced_saves = 0
+        self._absorb_saved()
         logging.info("History saved to '%s'.", self.history_file)
 
+    def _absorb_saved(self):
+        """Swap saved records for a memory map of the backend, freeing their memory."""
+        if self.backend.memory_mapped and self._saved_count == len(self._records):
+            self._base = self.backend.read()[0]
+            self._records.clear()
+            self._saved_count = 0
 
+    def _should_sync(self):
+        """Return True if this journal write must be fsynced under the fsync policy."""
+        if self.fsync == "off":
+            return False
+        self._unsynced_saves += 1
+        if self.fsync == "always" or self._unsynced_saves >= self.fsync_batch_size:
+            self._unsynced_saves = 0
+            return True
+        return False
+
+    @timed("history.load_history")
     def load_history(self):
-        """Load the history from a CSV file."""
-        if os.path.exists(self.history_file):
-            self.history_df = pd.read_csv(self.history_file)
+        """Load the history from the stored file."""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        if self.backend.exists():
+            self._reset()
+            self._ensure_loaded()
             logging.info("History loaded from '%s'.", self.history_file)
-            return self.history_df        
+            return self.history_df
         logging.warning("No history file found.")
-        return pd.DataFrame(columns=["Calculation"])  # Return empty DataFrame if file not found
+        return pd.DataFrame(columns=CSV_COLUMNS)  # Return empty DataFrame if file not found
+
+    def load_history_pages(self, page_size=PAGE_SIZE):
+        """Reload the stored history, yielding rendered pages as rows are read from disk.
+
+        The CSV backend is read in chunks, so no full DataFrame is built. If the
+        pages are not consumed to the end the history is left unloaded."""
+        if not self.backend.exists():
+            logging.warning("No history file found.")
+            return
+        self._reset()
+        if self.backend.memory_mapped:
+            yield from self.history_pages(page_size=page_size)
+            return
+        completed = False
+        try:
+            for records, notes in self.backend.iter_read(page_size):
+                start = len(self._records)
+                self._records.extend(records)
+                self._notes = notes
+                yield self._render_page(start, records)
+            completed = True
+        finally:
+            if completed:
+                self._note_codes = {text: code for code, text in enumerate(self._notes)}
+                self._saved_count = len(self._records)
+                self._needs_compaction = self.backend.outdated()
+                self._loaded = True
+                logging.info("History loaded from '%s'.", self.history_file)
+            else:
+                self._reset()
+
+    @timed("history.import_csv")
+    def import_csv(self, csv_file):
+        """Append the entries of a CSV history file and return how many were added."""
+        records, notes = CsvBackend(csv_file).read()
+        note_rows = np.flatnonzero(records["op"] == OP_NOTE)
+        records["note"][note_rows] = [self._note_code(notes[code]) for code in records["note"][note_rows]]
+        self._records.extend(records)
+        logging.info("Imported %d entries from '%s'.", len(records), csv_file)
+        return len(records)
 
+    @timed("history.export_csv")
+    def export_csv(self, csv_file):
+        """Write the whole history to a CSV file, a chunk at a time."""
+        self._ensure_loaded()
+        CsvBackend(csv_file).rewrite(self._live_chunks(), self._notes)
+        logging.info("History exported to '%s'.", csv_file)
+
+    @timed("history.clear_history")
     def clear_history(self):
-        """Clear the history DataFrame."""
-        self.history_df = pd.DataFrame(columns=["Calculation"])
+        """Clear the history."""
+        self._reset()
+        self._loaded = True
+        self._needs_compaction = True
         logging.info("History cleared.")
 
+    @timed("history.delete_entry")
     def delete_entry(self, index):
         """Delete a specific entry by index."""
-        if 0 <= index < len(self.history_df):
-            deleted_record = self.history_df.iloc[index]
-            self.history_df = self.history_df.drop(index).reset_index(drop=True)
-            logging.info("Deleted record: %s", deleted_record['Calculation'])
-            return f"Deleted record: {deleted_record['Calculation']}"
+        if 0 <= index < len(self):
+            deleted_record = render_record(self._slice(index, index + 1)[0], self._notes)
+            self.delete_entries([index])
+            logging.info("Deleted record: %s", deleted_record)
+            return f"Deleted record: {deleted_record}"
         logging.error("Invalid index provided for deletion.")
         return "Invalid index. No record deleted."
 
+    @timed("history.delete_entries")
+    def delete_entries(self, rows):
+        """Delete the entries at the given row numbers and return how many were deleted.
+
+        The rows are only marked in a tombstone bitmap, in one pass over it
+        however many rows are deleted; they are dropped when the history is
+        saved, or once more than half of the rows are tombstoned. Raises
+        ValueError if a row number is outside the history."""
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        if not len(rows):
+            return 0
+        count = len(self)
+        if rows[0] < 0 or rows[-1] >= count:
+            raise ValueError(f"Invalid index {rows[0] if rows[0] < 0 else rows[-1]}. "
+                             f"The history has {count} entries.")
+        physical = self._physical_rows(rows)
+        size = self._physical_count()
+        deleted = np.zeros(size, dtype=bool)
+        if self._deleted is not None:
+            deleted[:len(self._deleted)] = self._deleted
+        deleted[physical] = True
+        self._deleted, self._deleted_count = deleted, self._deleted_count + len(rows)
+        self._live = np.flatnonzero(~deleted)
+        self._index = None  # Later rows moved up; rebuild on the next query
+        if physical[0] < len(self._base) + self._saved_count:
+            self._needs_compaction = True  # The backend holds some of the deleted rows
+        if self._deleted_count * 2 > size:
+            self._apply_tombstones()
+        logging.info("Deleted %d records.", len(rows))
+        return len(rows)
+
+    @timed("history.delete_where")
+    def delete_where(self, operation=None, result=None, a=None, b=None, timestamp=None):
+        """Delete the calculations matching all filters (as for ``query``) and return how many were deleted."""
+        rows = [rows for rows, _ in self._match(operation, result, a, b, timestamp)]
+        return self.delete_entries(np.concatenate(rows) if rows else [])
+
+    def _apply_tombstones(self):
+        """Drop the tombstoned rows from memory in one linear pass, a chunk at a time.
+
+        Stored rows stay where they are unless some of them were deleted;
+        then the whole history is brought into memory (or spilled) until the
+        next save rewrites the backend."""
+        if not self._deleted_count:
+            return
+        start = 0 if self._needs_compaction else len(self._base)  # Otherwise the stored rows lead the live rows
+        stop = self._physical_count()
+        live = self._new_buffer()
+        for _, records in self._chunks(start, stop):
+            live.extend(records)
+        live.extend(self._physical_slice(stop))  # Rows merged from other threads meanwhile
+        if self._needs_compaction:
+            self._base = EMPTY_RECORDS
+            self._saved_count = 0
+        self._replace_records(live)
+        self._clear_tombstones()
+        self._index = None
+
     def show_history(self):
         """Return a string representation of the current history."""
-        if not self.history_df.empty:
-            return self.history_df.to_string(index=False)
-        return "No history available."
\ No newline at end of file
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        if len(self):
+            return pd.DataFrame({"Calculation": self.rendered_entries()}).to_string(index=False)
+        return "No history available."
+
+
+class _PendingRecords:
+    """The records one thread has added that are not merged into the history yet."""
+    def __init__(self):
+        self.lock = threading.Lock()  # Only taken by the owning thread and by merges
+        self.buffer = RecordBuffer(capacity=64)
+        self.thread = threading.current_thread()
+
+
+def _locked(method):
+    """Run a facade method while holding the facade lock."""
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return locked
+
+
+class ThreadSafeHistoryFacade(HistoryFacade):
+    """A history facade that may be shared between threads.
+
+    Adds go to a per-thread buffer, so concurrent writers do not wait on
+    each other. Reading ``_records`` merges every thread's pending records
+    first, under the facade lock, so all reads see every completed add.
+    Every other operation is serialized on that lock; a
+    ``load_history_pages`` generator must be consumed by one thread."""
+    def __init__(self, *args, **kwargs):
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._pending = []  # _PendingRecords of every thread that has added records
+        self._merged = RecordBuffer()
+        super().__init__(*args, **kwargs)
+
+    @property
+    def _records(self):
+        """Return the added records, merging the records pending in every thread first."""
+        with self._lock:
+            self._merge_pending()
+            return self._merged
+
+    @_records.setter
+    def _records(self, records):
+        with self._lock:
+            for pending in self._pending:
+                with pending.lock:
+                    pending.buffer.clear()
+            self._merged = records
+
+    def _replace_records(self, records):
+        """Make ``records`` the added records, keeping the records still pending in other threads."""
+        with self._lock:
+            old, self._merged = self._merged, records
+        old.clear()
+
+    def _merge_pending(self):
+        """Move the pending records of all threads into the history, ordered by timestamp."""
+        batches = []
+        for pending in self._pending:
+            if len(pending.buffer):
+                with pending.lock:
+                    batches.append(pending.buffer.view().copy())
+                    pending.buffer.clear()
+        if batches:
+            records = np.concatenate(batches) if len(batches) > 1 else batches[0]
+            self._merged.extend(records[np.argsort(records["timestamp"], kind="stable")])
+        self._pending = [pending for pending in self._pending if len(pending.buffer) or pending.thread.is_alive()]
+
+    def _pending_records(self):
+        """Return the calling thread's pending records, registering them on first use."""
+        pending = getattr(self._local, "pending", None)
+        if pending is None:
+            pending = self._local.pending = _PendingRecords()
+            with self._lock:
+                self._pending.append(pending)
+        return pending
+
+    @timed("history.add_record")
+    def add_record(self, operation, a, b, result):
+        """Add a calculation to the calling thread's pending records."""
+        pending = self._pending_records()
+        with pending.lock:
+            pending.buffer.append(OPERATION_CODES[operation], a, b, result, time.time_ns(), int_mask(a, b, result))
+
+    @timed("history.add_records")
+    def add_records(self, operation, a, b, result):
+        """Add many calculations of one operation to the calling thread's pending records."""
+        a, b, result = np.asarray(a), np.asarray(b), np.asarray(result)
+        pending = self._pending_records()
+        with pending.lock:
+            fill_records(pending.buffer.allocate(len(result)), operation, a, b, result)
+
+    @timed("history.append_records")
+    def append_records(self, records):
+        """Append calculation records to the calling thread's pending records."""
+        pending = self._pending_records()
+        with pending.lock:
+            pending.buffer.extend(records)
+
+    @timed("history.add_entry")
+    def add_entry(self, entry):
+        """Add a text entry to the calling thread's pending records.
+
+        Free-form notes also take the facade lock to get their note code."""
+        parsed = parse_entry(entry)
+        if parsed:
+            record = (*parsed[:4], time.time_ns(), parsed[4])
+        else:
+            record = (OP_NOTE, 0.0, 0.0, 0.0, time.time_ns(), 0, self._note_code(entry))
+        pending = self._pending_records()
+        with pending.lock:
+            pending.buffer.append(*record)
+
+    _ensure_loaded = _locked(HistoryFacade._ensure_loaded)
+    _note_code = _locked(HistoryFacade._note_code)
+    records = property(_locked(HistoryFacade.records.fget))
+    __len__ = _locked(HistoryFacade.__len__)
+    query = _locked(HistoryFacade.query)
+    rendered_entries = _locked(HistoryFacade.rendered_entries)
+    save_history = _locked(HistoryFacade.save_history)
+    compact_history = _locked(HistoryFacade.compact_history)
+    load_history = _locked(HistoryFacade.load_history)
+    import_csv = _locked(HistoryFacade.import_csv)
+    delete_entries = _locked(HistoryFacade.delete_entries)
+    delete_where = _locked(HistoryFacade.delete_where)
+    export_csv = _locked(HistoryFacade.export_csv)
+    clear_history = _locked(HistoryFacade.clear_history)
+    delete_entry = _locked(HistoryFacade.delete_entry)
+    show_history = _locked(HistoryFacade.show_history)
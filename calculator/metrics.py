@@ -0,0 +1,273 @@
+"""Latency metrics for commands and history operations.
+
+``registry`` keeps one ``LatencyHistogram`` per operation name, such as
+``command.add`` or ``history.save_history``. A histogram counts calls and
+failed calls and sorts latencies into fixed log-scale buckets, 19% apart
+from 1 us to about 134 s. Recording a call appends to a list, and the
+bucket counts are brought up to date in vectorized batches, so metrics can
+stay on in production. Percentiles are read from the buckets and are
+therefore accurate to within one bucket.
+
+Methods are instrumented with the ``timed`` decorator. The registry can be
+written as JSON or in the Prometheus text format. ``start_exporter`` writes
+it to a file periodically. ``CommandProfiler`` runs the next few commands
+under cProfile.
+"""
+import atexit
+import functools
+import io
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+BUCKET_BOUNDS = tuple(1e-6 * 2 ** (step / 4) for step in range(109))  # Upper bounds in seconds
+FOLD_SIZE = 1024
+PERCENTILES = (50, 95, 99)
+PROMETHEUS_METRIC = "calculator_latency_seconds"
+
+_BOUNDS = np.array(BUCKET_BOUNDS)
+_exporter = None  # pylint: disable=invalid-name
+
+
+class LatencyHistogram:
+    """Call count, error count, total time and a latency histogram for one operation.
+
+    Recording only appends the latency to a list, which needs no lock; the
+    list is folded into the bucket counts once it holds ``FOLD_SIZE``
+    samples and whenever the histogram is read."""
+    def __init__(self):
+        self._lock = threading.Lock()  # Taken to fold and to count errors, never to record
+        self._samples = []
+        self.reset()
+
+    def reset(self):
+        """Forget every recorded call."""
+        with self._lock:
+            del self._samples[:]
+            self.count = 0
+            self.errors = 0
+            self.total = 0.0
+            self.counts = np.zeros(len(BUCKET_BOUNDS) + 1, dtype=np.int64)  # The last bucket holds everything slower
+
+    def record(self, seconds, error=False):
+        """Record one call that took ``seconds``."""
+        self._samples.append(seconds)
+        if error:
+            with self._lock:
+                self.errors += 1
+        if len(self._samples) >= FOLD_SIZE:
+            self.fold()
+
+    def fold(self):
+        """Move the recorded samples into the counts and buckets."""
+        with self._lock:
+            samples = self._samples
+            size = len(samples)
+            if not size:
+                return
+            latencies = np.array(samples[:size])
+            del samples[:size]  # Samples appended meanwhile stay for the next fold
+            self.counts += np.bincount(np.searchsorted(_BOUNDS, latencies), minlength=len(self.counts))
+            self.count += size
+            self.total += float(latencies.sum())
+
+    def percentile(self, percent):
+        """Return the upper bound of the bucket holding the given percentile, or None if nothing was recorded."""
+        self.fold()
+        if not self.count:
+            return None
+        rank = percent / 100 * self.count
+        cumulative = 0
+        for bucket, count in enumerate(self.counts.tolist()):
+            cumulative += count
+            if cumulative >= rank:
+                return BUCKET_BOUNDS[bucket] if bucket < len(BUCKET_BOUNDS) else float("inf")
+        return float("inf")
+
+    def summary(self):
+        """Return the count, errors, mean and percentiles (in seconds) as a dict."""
+        self.fold()
+        summary = {"count": self.count, "errors": self.errors,
+                   "mean": self.total / self.count if self.count else None}
+        for percent in PERCENTILES:
+            summary[f"p{percent}"] = self.percentile(percent)
+        return summary
+
+
+class MetricsRegistry:
+    """The histograms of every instrumented operation, by name."""
+    def __init__(self):
+        self.enabled = True
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        """Return the histogram for ``name``, creating it on first use."""
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def record(self, name, seconds, error=False):
+        """Record one call of ``name``, unless metrics are turned off."""
+        if self.enabled:
+            (self._histograms.get(name) or self.histogram(name)).record(seconds, error)
+
+    def reset(self):
+        """Forget every recorded call."""
+        for histogram in list(self._histograms.values()):
+            histogram.reset()
+
+    def snapshot(self):
+        """Return the summaries of every operation called so far, by name."""
+        summaries = {name: histogram.summary() for name, histogram in sorted(self._histograms.items())}
+        return {name: summary for name, summary in summaries.items() if summary["count"]}
+
+    def report(self):
+        """Return the summaries as a text table, with times in milliseconds."""
+        snapshot = self.snapshot()
+        if not snapshot:
+            return "No commands recorded yet."
+        lines = [f"{'operation':<32} {'count':>8} {'errors':>7} {'mean ms':>9} "
+                 + " ".join(f"{f'p{percent} ms':>9}" for percent in PERCENTILES)]
+        for name, summary in snapshot.items():
+            times = [summary["mean"]] + [summary[f"p{percent}"] for percent in PERCENTILES]
+            lines.append(f"{name:<32} {summary['count']:>8} {summary['errors']:>7} "
+                         + " ".join(f"{seconds * 1000:>9.3f}" for seconds in times))
+        return "\n".join(lines)
+
+    def to_json(self):
+        """Return the summaries as a JSON document."""
+        return json.dumps({"timestamp": time.time(), "unit": "seconds", "operations": self.snapshot()}, indent=2)
+
+    def to_prometheus(self):
+        """Return the histograms in the Prometheus text exposition format.
+
+        Buckets are listed at every power of two microseconds, which keeps
+        the output short while the cumulative counts stay exact."""
+        lines = [f"# HELP {PROMETHEUS_METRIC} Latency of calculator commands and history operations.",
+                 f"# TYPE {PROMETHEUS_METRIC} histogram"]
+        errors = ["# HELP calculator_errors_total Failed calls of calculator commands and history operations.",
+                  "# TYPE calculator_errors_total counter"]
+        for name, histogram in sorted(self._histograms.items()):
+            histogram.fold()
+            if not histogram.count:
+                continue
+            label = f'operation="{name}"'
+            cumulative = 0
+            for bucket, count in enumerate(histogram.counts[:-1].tolist()):
+                cumulative += count
+                if bucket % 4 == 0:
+                    lines.append(f'{PROMETHEUS_METRIC}_bucket{{{label},le="{BUCKET_BOUNDS[bucket]:.6g}"}} {cumulative}')
+            lines.append(f'{PROMETHEUS_METRIC}_bucket{{{label},le="+Inf"}} {histogram.count}')
+            lines.append(f"{PROMETHEUS_METRIC}_sum{{{label}}} {histogram.total:.9g}")
+            lines.append(f"{PROMETHEUS_METRIC}_count{{{label}}} {histogram.count}")
+            errors.append(f"calculator_errors_total{{{label}}} {histogram.errors}")
+        return "\n".join(lines + errors) + "\n"
+
+    def write(self, path):
+        """Atomically write the metrics to ``path``: Prometheus text for ``.prom`` or ``.txt`` files, else JSON."""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as metrics_file:
+            metrics_file.write(text)
+        os.replace(temporary, path)
+
+
+registry = MetricsRegistry()
+
+
+def timed(name):
+    """Decorate a function to record its latency, and its failures, under ``name``."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except Exception:
+                registry.record(name, time.perf_counter() - start, error=True)
+                raise
+            registry.record(name, time.perf_counter() - start)
+            return result
+        return wrapper
+    return decorate
+
+
+class MetricsExporter(threading.Thread):
+    """A daemon thread writing the registry to a file every ``interval`` seconds."""
+    def __init__(self, path, interval=60.0):
+        super().__init__(name="metrics-exporter", daemon=True)
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.export()
+
+    def export(self):
+        """Write the metrics now, logging instead of failing when the file cannot be written."""
+        try:
+            registry.write(self.path)
+        except OSError as e:
+            logging.warning("Could not write metrics to %s: %s", self.path, e)
+
+    def stop(self):
+        """Stop the thread and write the metrics one last time."""
+        self._stopped.set()
+        self.join()
+        self.export()
+
+
+def start_exporter(path, interval=60.0):
+    """Start writing the metrics to ``path`` periodically, and once more at exit."""
+    stop_exporter()
+    global _exporter  # pylint: disable=global-statement
+    _exporter = MetricsExporter(path, interval)
+    _exporter.start()
+    logging.info("Writing metrics to %s every %s seconds.", path, interval)
+
+
+def stop_exporter():
+    """Stop the running exporter, if any, after a final write."""
+    global _exporter  # pylint: disable=global-statement
+    if _exporter is not None:
+        _exporter.stop()
+        _exporter = None
+
+
+atexit.register(stop_exporter)
+
+
+class CommandProfiler:
+    """Runs the next ``count`` commands under cProfile and writes their statistics to ``path``."""
+    def __init__(self, count, path):
+        import cProfile  # pylint: disable=import-outside-toplevel
+        self.remaining = count
+        self.path = path
+        self.profile = cProfile.Profile()
+
+    def run(self, function, *args):
+        """Call ``function(*args)`` under the profiler, counting it as one command."""
+        self.remaining -= 1
+        self.profile.enable()
+        try:
+            return function(*args)
+        finally:
+            self.profile.disable()
+
+    def finish(self, top=15):
+        """Write the collected statistics to ``path`` and return the ``top`` functions by cumulative time."""
+        import pstats  # pylint: disable=import-outside-toplevel
+        self.profile.dump_stats(self.path)
+        output = io.StringIO()
+        pstats.Stats(self.profile, stream=output).sort_stats("cumulative").print_stats(top)
+        logging.info("Profile written to %s.", self.path)
+        return f"Profile written to {self.path}.\n{output.getvalue().strip()}"
@@ -0,0 +1,166 @@
+"""Indexed queries over the calculation history.
+
+``HistoryIndex`` keeps, for every history row, the row number in:
+
+- a per-operation row list, and
+- sorted indexes on ``result`` and ``timestamp``.
+
+The index is brought up to date incrementally: each query only indexes the
+rows added since the previous one. Deleting a row shifts the rows after it,
+so the history drops its index and rebuilds it on the next query.
+A query starts from the most selective indexed predicate, so only the
+matching rows are read from the history before the remaining predicates
+are applied as vectorized filters. The index grows with the history, so a
+history with a memory limit goes without one and scans its rows instead
+(see ``calculator.history``).
+"""
+from datetime import datetime
+import numpy as np
+from calculator.records import OP_NOTE, OPERATION_CODES
+
+COMPARATORS = (">=", "<=", ">", "<", "=")
+QUERY_FIELDS = ("op", "result", "a", "b", "since", "until")
+
+
+class Range:
+    """A numeric range with optional, possibly exclusive, bounds."""
+    def __init__(self, low=None, high=None, low_inclusive=True, high_inclusive=True):
+        self.low = low
+        self.high = high
+        self.low_inclusive = low_inclusive
+        self.high_inclusive = high_inclusive
+
+    def restrict(self, comparator, value):
+        """Narrow the range with one comparison such as ``>= value``."""
+        if comparator in (">", ">=", "="):
+            self.low, self.low_inclusive = value, comparator != ">"
+        if comparator in ("<", "<=", "="):
+            self.high, self.high_inclusive = value, comparator != "<"
+        return self
+
+    def mask(self, values):
+        """Return a boolean mask of the values inside the range."""
+        mask = np.ones(len(values), dtype=bool)
+        if self.low is not None:
+            mask &= values >= self.low if self.low_inclusive else values > self.low
+        if self.high is not None:
+            mask &= values <= self.high if self.high_inclusive else values < self.high
+        return mask
+
+
+class SortedIndex:
+    """Values kept in sorted order together with the row each came from.
+
+    New pairs go to a small unsorted delta that is scanned directly and only
+    merged into the sorted arrays once it grows past ``MERGE_FRACTION`` of
+    the index, so frequent small updates do not copy the whole index."""
+    MERGE_MINIMUM = 4096
+    MERGE_FRACTION = 16
+
+    def __init__(self, dtype):
+        self.values = np.zeros(0, dtype=dtype)
+        self.rows = np.zeros(0, dtype=np.int64)
+        self.delta_values = self.values
+        self.delta_rows = self.rows
+
+    def add(self, values, rows):
+        """Add new (value, row) pairs to the index."""
+        self.delta_values = np.concatenate([self.delta_values, values])
+        self.delta_rows = np.concatenate([self.delta_rows, rows])
+        if len(self.delta_values) > max(self.MERGE_MINIMUM, len(self.values) // self.MERGE_FRACTION):
+            order = np.argsort(self.delta_values, kind="stable")
+            positions = np.searchsorted(self.values, self.delta_values[order], side="right")
+            self.values = np.insert(self.values, positions, self.delta_values[order])
+            self.rows = np.insert(self.rows, positions, self.delta_rows[order])
+            self.delta_values = self.delta_values[:0]
+            self.delta_rows = self.delta_rows[:0]
+
+    def lookup(self, value_range):
+        """Return (match count, function returning the matching rows) for ``value_range``."""
+        start, stop = 0, len(self.values)
+        if value_range.low is not None:
+            start = np.searchsorted(self.values, value_range.low, side="left" if value_range.low_inclusive else "right")
+        if value_range.high is not None:
+            stop = np.searchsorted(self.values, value_range.high, side="right" if value_range.high_inclusive else "left")
+        stop = max(start, stop)
+        delta_rows = self.delta_rows[value_range.mask(self.delta_values)]
+        return stop - start + len(delta_rows), lambda: np.sort(np.concatenate([self.rows[start:stop], delta_rows]))
+
+
+class HistoryIndex:
+    """Per-operation row lists and sorted result/timestamp indexes over the history rows."""
+    def __init__(self):
+        self.indexed = 0  # Number of leading history rows covered by the index
+        self._op_chunks = {code: [] for code in OPERATION_CODES.values()}
+        self._op_rows = {}
+        self.result = SortedIndex(np.float64)
+        self.timestamp = SortedIndex(np.int64)
+
+    def update(self, records):
+        """Index ``records``, the history rows starting at row ``self.indexed``."""
+        if not len(records):
+            return
+        rows = np.arange(self.indexed, self.indexed + len(records), dtype=np.int64)
+        ops = np.asarray(records["op"])
+        for code in np.unique(ops):
+            self._op_chunks[int(code)].append(rows[ops == code])
+            self._op_rows.pop(int(code), None)
+        calculations = ops != OP_NOTE
+        self.result.add(np.asarray(records["result"])[calculations], rows[calculations])
+        self.timestamp.add(np.asarray(records["timestamp"]), rows)
+        self.indexed += len(records)
+
+    def operation_rows(self, code):
+        """Return the sorted rows holding operation ``code``."""
+        if code not in self._op_rows:
+            chunks = self._op_chunks[code]
+            self._op_rows[code] = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+            self._op_chunks[code] = [self._op_rows[code]]
+        return self._op_rows[code]
+
+    def candidates(self, operation=None, result=None, timestamp=None):
+        """Return the rows matching the most selective indexed predicate, or None for all rows."""
+        options = []
+        if operation is not None:
+            rows = self.operation_rows(operation)
+            options.append((len(rows), lambda rows=rows: rows))
+        for index, value_range in ((self.result, result), (self.timestamp, timestamp)):
+            if value_range is not None:
+                options.append(index.lookup(value_range))
+        if not options:
+            return None
+        return min(options, key=lambda option: option[0])[1]()
+
+
+def parse_time(text):
+    """Parse epoch seconds or an ISO date/time into nanoseconds since the epoch."""
+    try:
+        seconds = float(text)
+    except ValueError:
+        seconds = datetime.fromisoformat(text).timestamp()
+    return int(seconds * 1_000_000_000)
+
+
+def parse_query(arguments):
+    """Parse ``history_query`` arguments such as ``op=divide result<0 since=2024-01-01``.
+
+    Returns keyword arguments for ``HistoryFacade.query``; raises ValueError
+    for malformed filters."""
+    filters = {}
+    for argument in arguments:
+        comparator = next((symbol for symbol in COMPARATORS if symbol in argument), None)
+        field, _, value = argument.partition(comparator) if comparator else (argument, "", "")
+        if comparator is None or field not in QUERY_FIELDS or not value:
+            raise ValueError(f"Invalid filter '{argument}'.")
+        if field == "op":
+            if comparator != "=" or value not in OPERATION_CODES or value == "note":
+                raise ValueError(f"Invalid operation filter '{argument}'.")
+            filters["operation"] = value
+        elif field in ("since", "until"):
+            if comparator != "=":
+                raise ValueError(f"Use {field}=<time> in '{argument}'.")
+            bound = ">=" if field == "since" else "<"
+            filters["timestamp"] = filters.get("timestamp", Range()).restrict(bound, parse_time(value))
+        else:
+            filters[field] = filters.get(field, Range()).restrict(comparator, float(value))
+    return filters
@@ -0,0 +1,178 @@
+"""Typed storage for calculation history records.
+
+Each history entry is one row of a NumPy structured array instead of a
+formatted string:
+
+- ``op``: operation code (index into ``OPERATIONS``), int8.
+- ``int_mask``: bit flags telling which of a, b and result were Python ints,
+  so they can be rendered exactly as the calculator printed them.
+- ``a``, ``b``, ``result``: operands and result, float64.
+- ``timestamp``: nanoseconds since the epoch, int64 (0 when unknown).
+- ``note``: index into the note table for free-text entries, -1 otherwise.
+
+The human-readable text ("Added 1 + 2 = 3") is only rendered on display.
+"""
+import re
+import numpy as np
+
+OPERATIONS = ("note", "add", "subtract", "multiply", "divide")
+OPERATION_CODES = {name: code for code, name in enumerate(OPERATIONS)}
+OP_NOTE = OPERATION_CODES["note"]
+VERBS = ("", "Added", "Subtracted", "Multiplied", "Divided")
+SYMBOLS = ("", "+", "-", "*", "/")
+
+INT_A = 1
+INT_B = 2
+INT_RESULT = 4
+
+RECORD_DTYPE = np.dtype([
+    ("op", "i1"),
+    ("int_mask", "u1"),
+    ("a", "f8"),
+    ("b", "f8"),
+    ("result", "f8"),
+    ("timestamp", "i8"),
+    ("note", "i4"),
+])
+
+CSV_COLUMNS = ["operation", "a", "b", "result", "timestamp", "note"]
+LEGACY_PATTERN = re.compile(r"^(Added|Subtracted|Multiplied|Divided) (\S+) [-+*/] (\S+) = (\S+)$")
+
+
+def int_mask(a, b, result):
+    """Return the int_mask flags for a calculation's operands and result."""
+    mask = 0
+    if isinstance(a, int):
+        mask |= INT_A
+    if isinstance(b, int):
+        mask |= INT_B
+    if isinstance(result, int):
+        mask |= INT_RESULT
+    return mask
+
+
+def array_int_mask(a, b, result):
+    """Return the int_mask flags for arrays of operands and results, based on their dtypes."""
+    flags = (INT_A, INT_B, INT_RESULT)
+    return sum(flag for flag, array in zip(flags, (a, b, result)) if np.issubdtype(array.dtype, np.integer))
+
+
+def format_number(value, is_int):
+    """Format a stored float the way the calculator originally printed it."""
+    if is_int:
+        return str(int(value))
+    return repr(float(value))
+
+
+def parse_number(text):
+    """Parse a rendered number, returning the value and whether it was an int."""
+    try:
+        return int(text), True
+    except ValueError:
+        return float(text), False
+
+
+def parse_entry(text):
+    """Parse text in the calculator's format into (op, a, b, result, int_mask).
+
+    Returns None when the text is not a calculation."""
+    match = LEGACY_PATTERN.match(text)
+    if not match:
+        return None
+    try:
+        (a, a_int), (b, b_int), (result, result_int) = (parse_number(part) for part in match.groups()[1:])
+    except ValueError:
+        return None
+    mask = (INT_A if a_int else 0) | (INT_B if b_int else 0) | (INT_RESULT if result_int else 0)
+    return VERBS.index(match.group(1)), a, b, result, mask
+
+
+def render_record(record, notes):
+    """Return the human-readable text of one record."""
+    op = int(record["op"])
+    if op == OP_NOTE:
+        return notes[int(record["note"])]
+    mask = int(record["int_mask"])
+    a = format_number(record["a"], mask & INT_A)
+    b = format_number(record["b"], mask & INT_B)
+    result = format_number(record["result"], mask & INT_RESULT)
+    return f"{VERBS[op]} {a} {SYMBOLS[op]} {b} = {result}"
+
+
+def csv_row(record, notes):
+    """Return one record as a row of CSV fields (see ``CSV_COLUMNS``)."""
+    op = int(record["op"])
+    if op == OP_NOTE:
+        return ["note", "", "", "", int(record["timestamp"]), notes[int(record["note"])]]
+    mask = int(record["int_mask"])
+    return [
+        OPERATIONS[op],
+        format_number(record["a"], mask & INT_A),
+        format_number(record["b"], mask & INT_B),
+        format_number(record["result"], mask & INT_RESULT),
+        int(record["timestamp"]),
+        "",
+    ]
+
+
+class RecordBuffer:
+    """Growable array of history records with amortized O(1) appends."""
+    def __init__(self, capacity=1024):
+        self._data = np.zeros(capacity, dtype=RECORD_DTYPE)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, size):
+        """Make room for at least ``size`` records, doubling the capacity as needed."""
+        if size > len(self._data):
+            capacity = max(size, 2 * len(self._data))
+            data = np.zeros(capacity, dtype=RECORD_DTYPE)
+            data[:self._size] = self._data[:self._size]
+            self._data = data
+
+    def append(self, op, a, b, result, timestamp, mask=0, note=-1):
+        """Append one record."""
+        self._reserve(self._size + 1)
+        self._data[self._size] = (op, mask, a, b, result, timestamp, note)
+        self._size += 1
+
+    def extend(self, records):
+        """Append a structured array of records in one copy."""
+        count = len(records)
+        self._reserve(self._size + count)
+        self._data[self._size:self._size + count] = records
+        self._size += count
+
+    def allocate(self, count):
+        """Append ``count`` records and return a view of them to be filled in place."""
+        self._reserve(self._size + count)
+        self._size += count
+        return self._data[self._size - count:self._size]
+
+    def view(self):
+        """Return the stored records as a structured array view (no copy)."""
+        return self._data[:self._size]
+
+    def slice(self, start=0, stop=None):
+        """Return the records in ``[start, stop)`` as a view."""
+        return self._data[:self._size][start:stop]
+
+    def take(self, rows):
+        """Return the records at the given row numbers."""
+        return self._data[:self._size][rows]
+
+    def discard_head(self, count):
+        """Remove the first ``count`` records, shifting the rest down in place."""
+        self._data[:self._size - count] = self._data[count:self._size]
+        self._size -= count
+
+    def clear(self):
+        """Remove all records."""
+        self._size = 0
+
+    @property
+    def nbytes(self):
+        """Return the bytes used by the stored records."""
+        return self._size * RECORD_DTYPE.itemsize
@@ -0,0 +1,148 @@
+"""A record buffer that keeps a bounded number of records in memory.
+
+``SpillingRecordBuffer`` has the interface of ``RecordBuffer`` (see
+``calculator.records``) but holds at most ``limit`` records in memory (plus
+the last bulk insert, until the next add). Whenever the limit is reached,
+the oldest records are written to a new segment file, keeping the newest
+``limit // 2`` in memory, and the segment is memory-mapped read-only. The
+records stay addressable by one logical index: ``slice`` and ``take`` read
+across the segments and the in-memory part, so callers do not need to know
+where a record lives.
+
+Segments are raw ``RECORD_DTYPE`` files in a private temporary directory
+(a ``SpillDirectory``, under ``directory`` when given). The directory is removed when the buffer
+is cleared or garbage collected, so spilled records only last as long as
+the process; saving the history is still what makes them persistent.
+"""
+import os
+import shutil
+import tempfile
+import weakref
+import numpy as np
+from calculator.records import RECORD_DTYPE, RecordBuffer
+
+EMPTY_RECORDS = np.zeros(0, dtype=RECORD_DTYPE)
+
+
+class SpillDirectory:
+    """A private temporary directory of segment files, removed when cleared or garbage collected."""
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.path = None
+        self._finalizer = None
+        self._count = 0
+
+    def write(self, records):
+        """Write records to a new segment file and return them memory-mapped read-only."""
+        if self.path is None:
+            if self.parent:
+                os.makedirs(self.parent, exist_ok=True)
+            self.path = tempfile.mkdtemp(prefix="history-spill-", dir=self.parent)
+            self._finalizer = weakref.finalize(self, shutil.rmtree, self.path, True)
+        self._count += 1
+        path = os.path.join(self.path, f"segment-{self._count:06d}.bin")
+        with open(path, "wb") as segment_file:
+            records.tofile(segment_file)
+        return np.memmap(path, dtype=RECORD_DTYPE, mode="r")
+
+    def clear(self):
+        """Remove the directory and every segment in it."""
+        if self._finalizer is not None:
+            self._finalizer()
+            self.path = self._finalizer = None
+
+
+class SpillingRecordBuffer:
+    """Growable array of history records with a bounded in-memory part."""
+    def __init__(self, limit, directory=None):
+        if limit < 2:
+            raise ValueError("The in-memory history limit must be at least 2 entries.")
+        self.limit = limit
+        self._directory = SpillDirectory(directory)
+        self._memory = RecordBuffer(capacity=min(limit, 1024))
+        self._segments = []  # Memory-mapped spilled records, oldest first
+        self._starts = [0]  # Logical index of the first record of each segment, then the spilled count
+
+    def __len__(self):
+        return self._starts[-1] + len(self._memory)
+
+    @property
+    def spilled(self):
+        """Return the number of records held in segment files."""
+        return self._starts[-1]
+
+    @property
+    def nbytes(self):
+        """Return the bytes used by the in-memory records."""
+        return self._memory.nbytes
+
+    def _spill(self, records):
+        """Append records (the oldest not yet spilled) as a new segment."""
+        if len(records):
+            self._segments.append(self._directory.write(records))
+            self._starts.append(self._starts[-1] + len(records))
+
+    def _spill_oldest(self):
+        """Spill all but the newest ``limit // 2`` in-memory records once the limit is reached."""
+        count = len(self._memory) - self.limit // 2
+        if len(self._memory) >= self.limit and count > 0:
+            self._spill(self._memory.view()[:count])
+            self._memory.discard_head(count)
+
+    def append(self, op, a, b, result, timestamp, mask=0, note=-1):
+        """Append one record."""
+        if len(self._memory) >= self.limit:
+            self._spill_oldest()
+        self._memory.append(op, a, b, result, timestamp, mask, note)
+
+    def extend(self, records):
+        """Append a structured array of records, spilling straight to disk what would not fit."""
+        self._spill_oldest()
+        keep = self.limit // 2
+        if len(self._memory) + len(records) > self.limit and len(records) > keep:
+            self._spill(self._memory.view())
+            self._memory.clear()
+            self._spill(np.ascontiguousarray(records[:len(records) - keep]))
+            records = records[len(records) - keep:]
+        self._memory.extend(records)
+
+    def allocate(self, count):
+        """Append ``count`` records and return a view of them to be filled in place.
+
+        The view is in memory, so the in-memory part may exceed the limit by
+        this batch until the next add."""
+        self._spill_oldest()
+        return self._memory.allocate(count)
+
+    def view(self):
+        """Return every record as one array; this reads the spilled records back into memory."""
+        return self.slice(0, None)
+
+    def slice(self, start=0, stop=None):
+        """Return the records in ``[start, stop)``, reading only the segments that overlap it."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        parts = []
+        for segment, first, end in zip(self._segments, self._starts, self._starts[1:]):
+            if first < stop and start < end:
+                parts.append(segment[max(start - first, 0):stop - first])
+        spilled = self.spilled
+        if stop > spilled:
+            parts.append(self._memory.view()[max(start - spilled, 0):stop - spilled])
+        if not parts:
+            return EMPTY_RECORDS
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def take(self, rows):
+        """Return the records at the given sorted logical row numbers."""
+        rows = np.asarray(rows, dtype=np.int64)
+        bounds = np.searchsorted(rows, self._starts)
+        parts = [segment[rows[bounds[number]:bounds[number + 1]] - self._starts[number]]
+                 for number, segment in enumerate(self._segments) if bounds[number] < bounds[number + 1]]
+        parts.append(self._memory.view()[rows[bounds[-1]:] - self.spilled])
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def clear(self):
+        """Remove all records and the segment files."""
+        self._memory.clear()
+        self._segments, self._starts = [], [0]
+        self._directory.clear()
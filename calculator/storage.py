@@ -0,0 +1,276 @@
+"""Storage backends for the calculation history.
+
+A backend persists history records (see ``calculator.records``) and the
+note table they reference. Three backends are provided:
+
+- ``CsvBackend``: one human-readable CSV file. Reading parses the whole
+  file; it is the import/export format.
+- ``MemoryBackend``: stores nothing; for calculators whose history only
+  lives for the life of the process.
+- ``BinaryBackend``: a directory holding ``records.bin`` (raw fixed-size
+  records) and ``notes.jsonl``. Reading memory-maps ``records.bin``, so
+  opening a history costs the same no matter how large it is and rows are
+  only paged in when they are shown or queried.
+
+Backends support appending new records (for journal saves) and
+rewriting everything atomically (for compaction). Both take either a
+record array or an iterable of record arrays, written one chunk at a time,
+so a history larger than memory can be saved chunk by chunk. Pandas is only imported
+when a CSV file is actually read, to keep it out of startup.
+"""
+import csv
+import json
+import os
+import numpy as np
+from calculator.records import CSV_COLUMNS, INT_A, INT_B, INT_RESULT, OP_NOTE, OPERATION_CODES, RECORD_DTYPE, csv_row, parse_entry
+
+BACKENDS = ("csv", "binary", "memory")
+
+
+class HistoryBackend:
+    """Base class for history storage backends."""
+    memory_mapped = False
+
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        """Return True if the history has been stored before."""
+        return os.path.exists(self.path)
+
+    def outdated(self):
+        """Return True if the stored history is in an older layout that appending would corrupt."""
+        return False
+
+    def read(self):
+        """Return the stored (records, notes)."""
+        raise NotImplementedError("Backend must implement read.")
+
+    def iter_read(self, chunk_size):
+        """Yield the stored history as (records, notes) chunks of up to ``chunk_size`` rows.
+
+        ``notes`` is the same list in every chunk and grows as notes are read."""
+        records, notes = self.read()
+        for start in range(0, len(records), chunk_size):
+            yield records[start:start + chunk_size], notes
+
+    def append(self, records, notes, sync=False):
+        """Append records (an array or an iterable of arrays), and any notes not stored yet, to the stored history."""
+        raise NotImplementedError("Backend must implement append.")
+
+    def rewrite(self, records, notes, sync=False):
+        """Atomically replace the stored history with records (an array or an iterable of arrays)."""
+        raise NotImplementedError("Backend must implement rewrite.")
+
+
+def record_chunks(records):
+    """Yield the chunks of ``records``, given as one record array or an iterable of them."""
+    if isinstance(records, np.ndarray):
+        yield records
+    else:
+        yield from records
+
+
+def _sync(handle, sync):
+    """Flush a file and fsync it when requested."""
+    if sync:
+        handle.flush()
+        os.fsync(handle.fileno())
+
+
+class CsvBackend(HistoryBackend):
+    """Stores the history as a CSV file with one typed column per field."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._outdated = None  # Whether the file's header differs from CSV_COLUMNS, once looked at
+
+    def outdated(self):
+        """Return True if the file is empty or its header is not ``CSV_COLUMNS`` (e.g. a legacy ``Calculation`` file)."""
+        if self._outdated is None:
+            with open(self.path, newline='', encoding='utf-8') as history_file:
+                self._outdated = next(csv.reader(history_file), None) != CSV_COLUMNS
+        return self._outdated
+
+    def read(self):
+        records, notes = np.zeros(0, dtype=RECORD_DTYPE), []
+        if os.path.getsize(self.path):
+            import pandas as pd  # pylint: disable=import-outside-toplevel
+            records = _records_from_csv(pd.read_csv(self.path, dtype=str, keep_default_na=False), notes)
+        return records, notes
+
+    def iter_read(self, chunk_size):
+        notes = []
+        if os.path.getsize(self.path):
+            import pandas as pd  # pylint: disable=import-outside-toplevel
+            with pd.read_csv(self.path, dtype=str, keep_default_na=False, chunksize=chunk_size) as reader:
+                for frame in reader:
+                    yield _records_from_csv(frame, notes), notes
+
+    def append(self, records, notes, sync=False):
+        with open(self.path, mode='a', newline='', encoding='utf-8') as history_file:
+            writer = csv.writer(history_file, lineterminator="\n")
+            for chunk in record_chunks(records):
+                writer.writerows(csv_row(record, notes) for record in chunk)
+            _sync(history_file, sync)
+
+    def rewrite(self, records, notes, sync=False):
+        temp_file = f"{self.path}.tmp"
+        with open(temp_file, mode='w', newline='', encoding='utf-8') as history_file:
+            writer = csv.writer(history_file, lineterminator="\n")
+            writer.writerow(CSV_COLUMNS)
+            for chunk in record_chunks(records):
+                writer.writerows(csv_row(record, notes) for record in chunk)
+            _sync(history_file, sync)
+        os.replace(temp_file, self.path)
+        self._outdated = False
+
+
+class MemoryBackend(HistoryBackend):
+    """Keeps nothing on disk; the history only exists in memory."""
+
+    def exists(self):
+        return True
+
+    def read(self):
+        return np.zeros(0, dtype=RECORD_DTYPE), []
+
+    def append(self, records, notes, sync=False):
+        pass
+
+    def rewrite(self, records, notes, sync=False):
+        pass
+
+
+class BinaryBackend(HistoryBackend):
+    """Stores the history as raw records in a directory and memory-maps it on read."""
+    memory_mapped = True
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.records_file = os.path.join(path, "records.bin")
+        self.notes_file = os.path.join(path, "notes.jsonl")
+        self._stored_notes = 0
+
+    def exists(self):
+        return os.path.exists(self.records_file)
+
+    def read(self):
+        count = os.path.getsize(self.records_file) // RECORD_DTYPE.itemsize  # Ignore a torn trailing write
+        if count:
+            records = np.memmap(self.records_file, dtype=RECORD_DTYPE, mode="r", shape=(count,))
+        else:
+            records = np.zeros(0, dtype=RECORD_DTYPE)
+        notes = []
+        if os.path.exists(self.notes_file):
+            with open(self.notes_file, encoding='utf-8') as notes_file:
+                notes = [json.loads(line) for line in notes_file]
+        self._stored_notes = len(notes)
+        return records, notes
+
+    def append(self, records, notes, sync=False):
+        os.makedirs(self.path, exist_ok=True)
+        if len(notes) > self._stored_notes:
+            with open(self.notes_file, mode='a', encoding='utf-8') as notes_file:
+                notes_file.writelines(json.dumps(note) + "\n" for note in notes[self._stored_notes:])
+                _sync(notes_file, sync)
+            self._stored_notes = len(notes)
+        with open(self.records_file, mode='ab') as records_file:
+            _write_records(records_file, records)
+            _sync(records_file, sync)
+
+    def rewrite(self, records, notes, sync=False):
+        os.makedirs(self.path, exist_ok=True)
+        temp_notes, temp_records = f"{self.notes_file}.tmp", f"{self.records_file}.tmp"
+        with open(temp_notes, mode='w', encoding='utf-8') as notes_file:
+            notes_file.writelines(json.dumps(note) + "\n" for note in notes)
+            _sync(notes_file, sync)
+        with open(temp_records, mode='wb') as records_file:
+            _write_records(records_file, records)
+            _sync(records_file, sync)
+        os.replace(temp_notes, self.notes_file)
+        os.replace(temp_records, self.records_file)
+        self._stored_notes = len(notes)
+
+
+def _write_records(handle, records):
+    """Write the raw bytes of records (an array or an iterable of arrays) one chunk at a time."""
+    for chunk in record_chunks(records):
+        np.ascontiguousarray(chunk, dtype=RECORD_DTYPE).tofile(handle)
+
+
+def make_backend(path, backend=None):
+    """Return a backend for ``path``.
+
+    ``backend`` may be a backend instance, a name from ``BACKENDS`` or None,
+    in which case ``.csv`` paths use the CSV backend and anything else the
+    binary backend."""
+    if isinstance(backend, HistoryBackend):
+        return backend
+    if backend is None:
+        backend = "csv" if path.endswith(".csv") else "binary"
+    if backend == "csv":
+        return CsvBackend(path)
+    if backend == "binary":
+        return BinaryBackend(path)
+    if backend == "memory":
+        return MemoryBackend(path)
+    raise ValueError(f"Unknown history backend: {backend}")
+
+
+def _note_coder(notes):
+    """Return a function mapping note text to its index in ``notes``, appending new text."""
+    codes = {text: code for code, text in enumerate(notes)}
+
+    def note_code(text):
+        code = codes.get(text)
+        if code is None:
+            code = codes[text] = len(notes)
+            notes.append(text)
+        return code
+    return note_code
+
+
+def _records_from_csv(frame, notes):
+    """Convert a frame read from a history CSV file into a structured record array."""
+    if "Calculation" in frame.columns:  # Older files hold one formatted string per row
+        return _records_from_text(frame["Calculation"], notes)
+    return _records_from_frame(frame, notes)
+
+
+def _records_from_text(entries, notes):
+    """Convert formatted calculation strings into a structured record array."""
+    note_code = _note_coder(notes)
+    records = np.zeros(len(entries), dtype=RECORD_DTYPE)
+    for row, entry in enumerate(entries):
+        parsed = parse_entry(entry)
+        if parsed:
+            op, a, b, result, mask = parsed
+            records[row] = (op, mask, a, b, result, 0, -1)
+        else:
+            records[row] = (OP_NOTE, 0, 0.0, 0.0, 0.0, 0, note_code(entry))
+    return records
+
+
+def _records_from_frame(frame, notes):
+    """Convert a frame of CSV text columns into a structured record array.
+
+    Raises ValueError for an operation the history does not know."""
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    note_code = _note_coder(notes)
+    records = np.zeros(len(frame), dtype=RECORD_DTYPE)
+    codes = frame["operation"].map(OPERATION_CODES)
+    unknown = codes.isna().to_numpy()
+    if unknown.any():
+        row = np.flatnonzero(unknown)[0]
+        raise ValueError(f"Unknown operation '{frame['operation'].iloc[row]}' in history row {frame.index[row]}.")
+    records["op"] = codes.to_numpy()
+    for column, flag in (("a", INT_A), ("b", INT_B), ("result", INT_RESULT)):
+        text = frame[column]
+        records[column] = pd.to_numeric(text, errors="coerce").fillna(0.0).to_numpy(dtype="f8")
+        records["int_mask"] |= np.where(text.str.fullmatch(r"-?\d+").to_numpy(dtype=bool), flag, 0).astype("u1")
+    records["timestamp"] = pd.to_numeric(frame["timestamp"], errors="coerce").fillna(0).to_numpy(dtype="i8")
+    records["note"] = -1
+    note_rows = np.flatnonzero(records["op"] == OP_NOTE)
+    records["note"][note_rows] = [note_code(text) for text in frame["note"].to_numpy()[note_rows]]
+    return records
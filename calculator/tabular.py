@@ -0,0 +1,71 @@
+"""Vectorized aggregations and operations over columns of CSV files.
+
+The files are read with pandas in chunks of ``CHUNK_SIZE`` rows, so they
+may be larger than memory: ``aggregate`` keeps only running partial sums,
+counts, minimums and maximums (one set per group), and ``calculate``
+yields its results a chunk at a time. Cells that are not numbers are
+treated as missing and skipped.
+"""
+import csv
+import numpy as np
+
+AGGREGATIONS = ("sum", "mean", "min", "max", "count")
+CHUNK_SIZE = 100_000
+PARTIALS = {"sum": "sum", "count": "sum", "min": "min", "max": "max"}
+
+
+def check_columns(csv_file, columns):
+    """Raise ValueError unless the file's header has every column."""
+    with open(csv_file, newline='', encoding='utf-8') as header_file:
+        headers = next(csv.reader(header_file), [])
+    missing = [column for column in columns if column not in headers]
+    if missing:
+        raise ValueError(f"Unknown column '{missing[0]}'. Columns are {', '.join(headers)}.")
+
+
+def read_chunks(csv_file, columns, chunk_size=CHUNK_SIZE):
+    """Yield chunks of the given columns as text DataFrames."""
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    check_columns(csv_file, columns)
+    with pd.read_csv(csv_file, usecols=list(dict.fromkeys(columns)), dtype=str,
+                     keep_default_na=False, chunksize=chunk_size) as reader:
+        yield from reader
+
+
+def aggregate(csv_file, function, column, group_by=None, chunk_size=CHUNK_SIZE):
+    """Aggregate a numeric column, returning a number or, with ``group_by``, a Series per group."""
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    if function not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation '{function}'. Use one of {', '.join(AGGREGATIONS)}.")
+    totals = None
+    for chunk in read_chunks(csv_file, [column] + ([group_by] if group_by else []), chunk_size):
+        values = pd.to_numeric(chunk[column], errors="coerce").astype("f8")
+        keys = chunk[group_by] if group_by else np.zeros(len(chunk), dtype=np.int8)
+        partial = values.groupby(keys, sort=False).agg(list(PARTIALS))
+        totals = partial if totals is None else pd.concat([totals, partial]).groupby(level=0, sort=False).agg(PARTIALS)
+    if totals is None:
+        totals = pd.DataFrame({name: [] for name in PARTIALS})
+    if function == "mean":
+        result = totals["sum"] / totals["count"].where(totals["count"] > 0)
+    else:
+        result = totals[function]
+    if group_by:
+        return result
+    return result.iloc[0] if len(result) else (0 if function in ("sum", "count") else float("nan"))
+
+
+def calculate(csv_file, operation, column_a, column_b, chunk_size=CHUNK_SIZE):
+    """Yield arrays of ``column_a <operation> column_b``, one per chunk.
+
+    Rows dividing by zero or holding non-numbers give NaN."""
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    from calculator.calculator import OPERATORS  # pylint: disable=import-outside-toplevel
+    if operation not in OPERATORS:
+        raise ValueError(f"Unknown operation '{operation}'. Use one of {', '.join(OPERATORS)}.")
+    for chunk in read_chunks(csv_file, [column_a, column_b], chunk_size):
+        a = pd.to_numeric(chunk[column_a], errors="coerce").to_numpy(dtype="f8")
+        b = pd.to_numeric(chunk[column_b], errors="coerce").to_numpy(dtype="f8")
+        if operation == "divide":
+            yield np.divide(a, b, out=np.full(len(a), np.nan), where=b != 0)
+        else:
+            yield OPERATORS[operation](a, b)
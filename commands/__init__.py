@@ -7,17 +7,90 @@ these commands.
 
 Classes:
 - Command: Base class for all plugins.
+- CommandSpec: A dispatch table entry with argument checks compiled from a signature.
 - CommandHandlerFactory: Manages plugin loading and command execution.
+- PluginExecutor (in `commands.executor`): Runs plugin calls as jobs with timeouts.
+- CommandError: Raised when a command cannot be run.
+- UnknownCommandError: Raised for a command that does not exist.
 
 Usage:
 1. Define a plugin by subclassing `Command`.
 2. Implement the `execute` method in the plugin.
-3. Use `CommandHandlerFactory` to load and execute the plugin commands.
+3. Use `CommandHandlerFactory` to load and execute the plugin commands. Plugins are
+   listed from a cached manifest (see `commands.manifest`) and imported on first use.
+4. Edit, add or remove plugin files while the calculator runs; `reload_plugins`, or
+   `poll_plugins` every `poll_interval` seconds, brings the registry up to date.
 """
+import contextlib
 import importlib
+import importlib.util
 import logging
-import os
 import inspect
+import os
+import sys
+import threading
+import time
+from commands.manifest import load_manifest_files, plugin_file_stats, signature_parameters
+
+class CommandError(Exception):
+    """Raised when a command cannot be run; the message is shown to the user."""
+
+class UnknownCommandError(Exception):
+    """Raised for a command that is neither built in nor provided by a plugin."""
+
+COERCION_MESSAGES = {float: "numbers", int: "integers"}
+
+
+class CommandSpec:
+    """One entry of a dispatch table: a handler and its argument checks.
+
+    The checks are compiled once from the handler's parameters (as returned
+    by ``inspect.signature``): the allowed argument counts, and a coercer for
+    every parameter annotated with ``int`` or ``float``. Unannotated
+    parameters are passed through as strings. A plugin's ``source`` is the
+    ``(module, class)`` it comes from, so it can be run in another process."""
+    def __init__(self, name, handler, parameters, usage=None, plugin=False, source=None):
+        self.name = name
+        self.handler = handler
+        self.plugin = plugin
+        self.source = source
+        parameters = [parameter for parameter in parameters if parameter.name != "self"]
+        positional = [parameter for parameter in parameters
+                      if parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD)]
+        variadic = [parameter for parameter in parameters if parameter.kind == parameter.VAR_POSITIONAL]
+        self.min_args = sum(parameter.default is parameter.empty for parameter in positional)
+        self.max_args = None if variadic else len(positional)
+        self.coercers = [(index, parameter.annotation) for index, parameter in enumerate(positional)
+                         if parameter.annotation in COERCION_MESSAGES]
+        self.usage = usage or " ".join([name] + [f"<{parameter.name}>" for parameter in positional]
+                                        + [f"[<{parameter.name}> ...]" for parameter in variadic])
+
+    @classmethod
+    def from_function(cls, name, handler, usage=None):
+        """Build the entry for a handler from its signature."""
+        return cls(name, handler, inspect.signature(handler).parameters.values(), usage)
+
+    def bind(self, arguments):
+        """Check and coerce string arguments, raising CommandError when they do not fit."""
+        if len(arguments) < self.min_args or (self.max_args is not None and len(arguments) > self.max_args):
+            logging.warning("Wrong number of arguments for %s: %s", self.name, arguments)
+            if self.min_args == self.max_args:
+                raise CommandError(f"{self.name} requires exactly {self.min_args} "
+                                   f"argument{'' if self.min_args == 1 else 's'}.")
+            raise CommandError(f"Usage: {self.usage}")
+        if not self.coercers:
+            return arguments
+        arguments = list(arguments)
+        for index, coercer in self.coercers:
+            if index >= len(arguments):
+                break
+            try:
+                arguments[index] = coercer(arguments[index])
+            except ValueError as e:
+                logging.warning("Invalid arguments for %s: %s", self.name, arguments)
+                raise CommandError(f"Invalid arguments. Arguments must be {COERCION_MESSAGES[coercer]}.") from e
+        return arguments
+
 
 class Command:
     """Base class for all plugins. Each plugin must implement the execute method."""
@@ -26,19 +99,36 @@ class Command:
         raise NotImplementedError("Plugin must implement the execute method.")
 
 class CommandHandlerFactory: #factory
-    """Singleton class to manage loading plugins dynamically."""
+    """Singleton class to manage loading plugins dynamically.
+
+    Creating the instance is thread-safe: threads racing to create it all get
+    the same, fully initialized instance.
+
+    ``specs`` is never changed in place by a reload: a new dictionary is
+    built and swapped in, and ``generation`` is incremented, so a dispatch
+    table built from an older generation stays consistent until it is
+    rebuilt."""
     _instance = None
+    _lock = threading.Lock()
 
     def __new__(cls):
         """Override the __new__ method to ensure only one instance of the class."""
         if cls._instance is None:
-            cls._instance = super(CommandHandlerFactory, cls).__new__(cls)
+            with cls._lock:
+                if cls._instance is None:  # Another thread may have created it while we waited
+                    instance = super(CommandHandlerFactory, cls).__new__(cls)
+                    instance.commands = {}
+                    instance.specs = {}
+                    instance.plugin_files = {}  # Manifest entries of every loaded directory, by file name
+                    instance.generation = 0  # Incremented whenever a reload changes the registry
+                    instance.poll_interval = 0  # Seconds between checks in poll_plugins; 0 turns polling off
+                    instance.next_poll = 0.0
+                    instance.reload_lock = threading.Lock()
+                    cls._instance = instance
         return cls._instance
 
     def __init__(self):
-        """Initialize instance attributes."""
-        if not hasattr(self, 'commands'):
-            self.commands = {}
+        """Instance attributes are set once, in __new__, so repeated calls keep the registrations."""
 
     def register_command(self, command_name: str, command: Command):
         """Register a command with a given name.
@@ -57,28 +147,112 @@ class CommandHandlerFactory: #factory
             logging.error("No such command: %s", command_name)
 
     def load_plugins(self, plugins_directory):
-        """Dynamically load plugins from the specified directory."""
-        for filename in os.listdir(plugins_directory):
-            if filename.endswith(".py") and not filename.startswith("_"):
-                module_name = filename[:-3]  # removed .py which is of 3 characters
-                module = importlib.import_module(f"plugins.{module_name}")
-                # Register each class that inherits from Command
-                for _, cls in inspect.getmembers(module, inspect.isclass):
-                    if issubclass(cls, Command) and cls is not Command:
-                        # used to identify the arguments
-                        signature = inspect.signature(cls.execute)
-                        arguments = signature.parameters.values()                      
-                        self.register_plugin(cls.command_name, cls(), list(arguments))
+        """Register the plugins in the specified directory without importing them.
+
+        The commands come from the directory's cached manifest (see
+        ``commands.manifest``); a plugin module is imported the first time
+        one of its commands is run."""
+        self.reload_plugins(plugins_directory, full=True)
+
+    def reload_plugins(self, plugins_directory=None, full=False):
+        """Bring the registry up to date with the plugin files on disk.
+
+        Reloads ``plugins_directory``, or every directory loaded so far. Only
+        the commands of added, changed and removed files are replaced; the
+        modules of changed files are imported again on their next use
+        (``full`` re-registers the unchanged files too). Returns the
+        sorted (added, changed, removed) command names."""
+        directories = [plugins_directory] if plugins_directory else list(self.plugin_files)
+        added, changed, removed = set(), set(), set()
+        with self.reload_lock:
+            for directory in directories:
+                known = self.plugin_files.get(directory, {})
+                files = load_manifest_files(directory)
+                if not files and not os.path.isdir(directory):
+                    logging.warning("Plugin directory %s does not exist.", directory)
+                stale = [filename for filename, entry in known.items() if filename not in files
+                         or (entry["mtime"], entry["size"]) != (files[filename]["mtime"], files[filename]["size"])]
+                fresh = [filename for filename in files if full or filename in stale or filename not in known]
+                if not stale and not fresh:
+                    continue
+                specs, commands = dict(self.specs), dict(self.commands)
+                old_names, new_names = set(), set()
+                package = os.path.basename(os.path.normpath(directory))
+                for filename in stale:
+                    for entry in known[filename]["commands"]:
+                        old_names.add(entry["command_name"])
+                        specs.pop(entry["command_name"], None)
+                        commands.pop(entry["command_name"], None)
+                    forget_module(f"{package}.{filename[:-3]}", os.path.join(directory, filename))
+                for filename in fresh:
+                    for entry in files[filename]["commands"]:
+                        new_names.add(entry["command_name"])
+                        specs[entry["command_name"]] = self.lazy_spec(entry)
+                self.specs, self.commands = specs, commands  # Swapped, never changed in place
+                self.plugin_files[directory] = files
+                self.generation += 1
+                if known:
+                    importlib.invalidate_caches()  # The import system may have cached the old directory listing
+                added |= new_names - old_names
+                changed |= new_names & old_names
+                removed |= old_names - new_names
+        if not full and (added or changed or removed):
+            logging.info("Plugins reloaded: added %s, changed %s, removed %s.",
+                         sorted(added), sorted(changed), sorted(removed))
+        return sorted(added), sorted(changed), sorted(removed)
+
+    def poll_plugins(self):
+        """Reload the loaded plugin directories if one of their files changed; return ``generation``.
+
+        The files are looked at no more than once every ``poll_interval``
+        seconds, so this is cheap enough to call before every command."""
+        if self.poll_interval and time.monotonic() >= self.next_poll:
+            self.next_poll = time.monotonic() + self.poll_interval
+            for directory, files in list(self.plugin_files.items()):
+                if plugin_file_stats(directory) != {filename: (entry["mtime"], entry["size"])
+                                                    for filename, entry in files.items()}:
+                    self.reload_plugins(directory)
+        return self.generation
+
+    def lazy_spec(self, entry):
+        """Return the dispatch table entry for a manifest entry, deferring the import until it is run."""
+        command_name = entry["command_name"]
+        spec = CommandSpec(command_name, None, signature_parameters(entry["parameters"]), plugin=True,
+                           source=(entry["module"], entry["class"]))
+
+        def import_and_execute(*args):
+            module = importlib.import_module(entry["module"])
+            cls = getattr(module, entry["class"])
+            with self.reload_lock:
+                if self.specs.get(command_name) is spec:  # Not replaced by a reload since
+                    self.register_plugin(command_name, cls(), list(inspect.signature(cls.execute).parameters.values()))
+                    spec.handler = self.specs[command_name].handler
+                    self.specs[command_name] = spec  # Keep the entry already shared with dispatch tables
+                else:
+                    spec.handler = cls().execute
+            return spec.handler(*args)
+
+        spec.handler = import_and_execute
+        return spec
 
     def register_plugin(self, command_name, plugin, arguments):
-        """Register a new plugin and its commands."""
+        """Register a new plugin and its commands, compiling its dispatch table entry."""
         if isinstance(plugin, Command):
             logging.info("Plugin '%s' registered successfully.", plugin.__class__.__name__)
+            self.specs[command_name] = CommandSpec(command_name, plugin.execute, arguments, plugin=True,
+                                                   source=(type(plugin).__module__, type(plugin).__qualname__))
             if len(arguments) > 1:
                 self.commands[command_name] = [plugin, f"No of Arguments is {len(arguments)} & Arguments are {arguments[1:]}"]
             else:
                 self.commands[command_name] = [plugin, f"No of Arguments is {len(arguments)}"]
 
     def list_plugins(self):
-        """List all available plugin commands."""
-        return list(self.commands.keys())
+        """List all available plugin commands, including those not imported yet."""
+        return list(self.specs.keys())
+
+
+def forget_module(module, path):
+    """Drop the imported module of a changed or removed plugin file, and its bytecode, so it is imported afresh."""
+    sys.modules.pop(module, None)
+    with contextlib.suppress(OSError, ValueError):
+        os.remove(importlib.util.cache_from_source(path))
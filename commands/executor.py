@@ -0,0 +1,235 @@
+"""
+Running plugin commands as jobs, with timeouts and cancellation.
+
+A ``PluginExecutor`` runs every plugin call as a ``Job``. In ``thread`` mode
+the job runs on a daemon thread of this process. In ``process`` mode it runs
+in a child process, which imports the plugin from its module. At most
+``workers`` jobs run at a time and the others wait for a free slot. A job's
+printed output is captured and kept with its result, so a job running in the
+background does not write over the prompt.
+
+A job ends as ``done``, ``failed``, ``cancelled`` (by ``Job.cancel``) or
+``timed out`` (after running for longer than its timeout). A cancelled or
+timed-out child process is terminated at once. A thread cannot be stopped
+from the outside: the job is reported as cancelled straight away, and the
+thread stops the next time the plugin calls ``check_cancelled`` (the
+``data`` plugin calls it between blocks of rows). A plugin that never calls
+it runs to the end, and its result is discarded. Either way a job's slot is
+freed as soon as the job ends, so threads left running by abandoned jobs do
+not hold up the jobs queued behind them.
+"""
+import contextlib
+import importlib
+import io
+import itertools
+import sys
+import threading
+import time
+
+MODES = ("thread", "process")
+DEFAULT_WORKERS = 4
+POLL_INTERVAL = 0.05  # Seconds between checks for cancellation and timeouts while waiting
+QUEUED, RUNNING, DONE, FAILED, CANCELLED, TIMED_OUT = "queued", "running", "done", "failed", "cancelled", "timed out"
+FINISHED = (DONE, FAILED, CANCELLED, TIMED_OUT)
+
+_current = threading.local()  # The job run by this thread, and the buffer its output goes to
+_output_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Raised by ``check_cancelled`` in a job's thread once the job is cancelled or timed out."""
+
+
+def check_cancelled():
+    """Raise JobCancelled if the job run by this thread was cancelled or ran out of time.
+
+    Does nothing outside a job, and is cheap enough for a plugin's inner loops."""
+    job = getattr(_current, "job", None)
+    if job is not None and job.expired():
+        raise JobCancelled(job.error)
+
+
+class ThreadOutput:
+    """Stands in for ``sys.stdout``, sending what job threads print to their own buffers."""
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        """Write to the calling job's buffer, or to the real stream outside a job."""
+        output = getattr(_current, "output", None)
+        return (self.stream if output is None else output).write(text)
+
+    def flush(self):
+        """Flush the real stream."""
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def capture_thread_output(output):
+    """Send what this thread prints to ``output`` (None to stop), installing ``ThreadOutput`` if needed."""
+    if not isinstance(sys.stdout, ThreadOutput):
+        with _output_lock:
+            if not isinstance(sys.stdout, ThreadOutput):
+                sys.stdout = ThreadOutput(sys.stdout)
+    _current.output = output
+
+
+class Job:
+    """One plugin call: its command line, state, timing, captured output and error."""
+    def __init__(self, number, command, timeout=None):
+        self.number = number
+        self.command = command
+        self.timeout = timeout
+        self.state = QUEUED
+        self.output = ""
+        self.error = None
+        self.started = self.finished = None  # time.perf_counter() values
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def start(self):
+        """Mark the job as running; return False if it was cancelled while queued."""
+        with self._lock:
+            if self.state in FINISHED:
+                return False
+            self.state, self.started = RUNNING, time.perf_counter()
+            return True
+
+    def finish(self, state, output="", error=None):
+        """Record how the job ended; return False if it had already ended."""
+        with self._lock:
+            if self.state in FINISHED:
+                return False
+            self.state, self.output, self.error = state, output, error
+            self.finished = time.perf_counter()
+        self._done.set()
+        return True
+
+    def cancel(self):
+        """Cancel the job; return False if it had already ended."""
+        return self.finish(CANCELLED, error="Cancelled.")
+
+    def expired(self):
+        """End the job as timed out if it ran past its timeout; return whether it has ended."""
+        if (self.state == RUNNING and self.timeout is not None
+                and time.perf_counter() - self.started > self.timeout):
+            self.finish(TIMED_OUT, error=f"Timed out after {self.timeout:g} seconds.")
+        return self.state in FINISHED
+
+    def wait(self, timeout=None):
+        """Wait for the job to end, at most ``timeout`` seconds; return whether it ended."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while not self.expired():
+            remaining = POLL_INTERVAL if deadline is None else min(POLL_INTERVAL, deadline - time.perf_counter())
+            if remaining <= 0:
+                return False
+            self._done.wait(remaining)
+        return True
+
+    @property
+    def elapsed(self):
+        """Return the seconds the job has been running, or ran for."""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def describe(self):
+        """Return a one-line summary for the jobs list."""
+        self.expired()
+        return f"[{self.number}] {self.state:<9} {self.elapsed:8.2f}s  {self.command}"
+
+
+def run_plugin(source, arguments, connection):
+    """Import and run a plugin in a child process, sending back ``(output, error)``."""
+    module_name, class_name = source
+    output, error = io.StringIO(), None
+    try:
+        with contextlib.redirect_stdout(output):
+            plugin = getattr(importlib.import_module(module_name), class_name)()
+            plugin.execute(*arguments)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        error = str(e)
+    connection.send((output.getvalue(), error))
+    connection.close()
+
+
+class PluginExecutor:
+    """Runs plugin calls as jobs on at most ``workers`` threads or child processes at a time."""
+    def __init__(self, mode="thread", workers=DEFAULT_WORKERS):
+        if mode not in MODES:
+            raise ValueError(f"Unknown plugin executor mode '{mode}'. Modes are {', '.join(MODES)}.")
+        if workers < 1:
+            raise ValueError("The plugin executor needs at least one worker.")
+        self.mode = mode
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(workers)
+        self._numbers = itertools.count(1)
+
+    def submit(self, spec, arguments, command=None, timeout=None, number=None):
+        """Start running a plugin's ``CommandSpec`` with bound arguments and return its Job.
+
+        Jobs are numbered from 1 unless the caller numbers them."""
+        job = Job(next(self._numbers) if number is None else number, command or spec.name, timeout)
+        run = self._run_process if self.mode == "process" else self._run_thread
+        threading.Thread(target=self._run, args=(job, run, spec, arguments),
+                         name=f"plugin-job-{job.number}", daemon=True).start()
+        return job
+
+    def _run(self, job, run, spec, arguments):
+        """Wait for a free slot, then run the job unless it was cancelled meanwhile, holding the slot until it ends."""
+        with self._slots:
+            if not job.start():
+                return
+            if run is self._run_process:
+                run(job, spec, arguments)  # Returns once the job ends; the child is terminated on expiry
+                return
+            threading.Thread(target=run, args=(job, spec, arguments),
+                             name=f"plugin-thread-{job.number}", daemon=True).start()
+            job.wait()  # Also ends the job on timeout, while its thread may still be running
+
+    @staticmethod
+    def _run_thread(job, spec, arguments):
+        """Run the plugin in this thread, capturing what it prints."""
+        output = io.StringIO()
+        _current.job = job
+        capture_thread_output(output)
+        try:
+            spec.handler(*arguments)
+        except JobCancelled:
+            return  # The job already ended as cancelled or timed out
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            if not job.expired():
+                job.finish(FAILED, output.getvalue(), str(e))
+            return
+        finally:
+            _current.job = None
+            capture_thread_output(None)
+        if not job.expired():
+            job.finish(DONE, output.getvalue())
+
+    @staticmethod
+    def _run_process(job, spec, arguments):
+        """Run the plugin in a child process, terminating it if the job is cancelled or times out."""
+        import multiprocessing  # pylint: disable=import-outside-toplevel
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=run_plugin, args=(spec.source, arguments, sender),
+                                          name=f"plugin-job-{job.number}", daemon=True)
+        process.start()
+        sender.close()
+        try:
+            while not receiver.poll(POLL_INTERVAL):
+                if job.expired():
+                    process.terminate()
+                    return
+            try:
+                output, error = receiver.recv()
+            except EOFError:
+                process.join()
+                output, error = "", f"The worker process exited with code {process.exitcode}."
+            if not job.expired():
+                job.finish(DONE if error is None else FAILED, output, error)
+        finally:
+            receiver.close()
+            process.join()
@@ -0,0 +1,150 @@
+"""
+A cached manifest of the commands in a plugins directory.
+
+The manifest maps every ``command_name`` to its module, class and the
+parameters of its ``execute`` method. It is built by parsing the plugin
+sources with ``ast``, so nothing is imported. It is cached in the plugins
+directory's ``__pycache__`` and each file's entry is reused for as long as
+the file's mtime and size are unchanged.
+
+Only classes defined in the plugin module itself, whose bases include
+``Command``, and that set ``command_name`` to a string literal are listed.
+"""
+import ast
+import inspect
+import json
+import logging
+import os
+
+MANIFEST_VERSION = 1
+ANNOTATIONS = {"int": int, "float": float}
+
+
+def manifest_path(plugins_directory):
+    """Return where the manifest for a plugins directory is cached."""
+    return os.path.join(plugins_directory, "__pycache__", "plugin_manifest.json")
+
+
+def plugin_file_stats(plugins_directory):
+    """Return ``{filename: (mtime_ns, size)}`` for the plugin files in a directory.
+
+    A missing directory has no plugin files. This is all that polling for
+    changes costs: one directory listing and one ``stat`` per plugin file."""
+    stats = {}
+    try:
+        filenames = sorted(os.listdir(plugins_directory))
+    except FileNotFoundError:
+        return stats
+    for filename in filenames:
+        if filename.endswith(".py") and not filename.startswith("_"):
+            try:
+                stat = os.stat(os.path.join(plugins_directory, filename))
+            except FileNotFoundError:  # Removed since the listing
+                continue
+            stats[filename] = (stat.st_mtime_ns, stat.st_size)
+    return stats
+
+
+def load_manifest_files(plugins_directory):
+    """Return the up-to-date manifest entries of a plugins directory, by file name.
+
+    Each entry holds the file's ``mtime`` and ``size`` and its ``commands``.
+    Files whose mtime or size changed since the cached manifest was written
+    are parsed again; the manifest is rewritten only when something changed.
+    A file that cannot be parsed is logged and has no commands until it
+    changes again."""
+    path = manifest_path(plugins_directory)
+    try:
+        with open(path, encoding="utf-8") as manifest_file:
+            cached = json.load(manifest_file)
+        if cached.get("version") != MANIFEST_VERSION:
+            cached = {}
+    except (OSError, ValueError):
+        cached = {}
+    cached_files = cached.get("files", {})
+    package = os.path.basename(os.path.normpath(plugins_directory))
+    files, changed = {}, False
+    for filename, (mtime, size) in plugin_file_stats(plugins_directory).items():
+        entry = cached_files.get(filename)
+        if entry is None or entry["mtime"] != mtime or entry["size"] != size:
+            try:
+                commands = scan_plugin(os.path.join(plugins_directory, filename), f"{package}.{filename[:-3]}")
+            except (OSError, SyntaxError, ValueError) as e:
+                logging.warning("Could not read plugin %s: %s", filename, e)
+                commands = []
+            entry = {"mtime": mtime, "size": size, "commands": commands}
+            changed = True
+        files[filename] = entry
+    if changed or files.keys() != cached_files.keys():
+        save_manifest(path, {"version": MANIFEST_VERSION, "files": files})
+    return files
+
+
+def load_manifest(plugins_directory):
+    """Return the up-to-date list of command entries for a plugins directory."""
+    return [command for entry in load_manifest_files(plugins_directory).values() for command in entry["commands"]]
+
+
+def save_manifest(path, manifest):
+    """Write the manifest, logging instead of failing when the directory is read-only."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file)
+    except OSError as e:
+        logging.warning("Could not write the plugin manifest %s: %s", path, e)
+
+
+def scan_plugin(filename, module_name):
+    """Return the command entries for the ``Command`` subclasses defined in a plugin file."""
+    with open(filename, encoding="utf-8") as source:
+        tree = ast.parse(source.read(), filename)
+    commands = []
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef) or not any(_base_name(base) == "Command" for base in node.bases):
+            continue
+        command_name, parameters = None, []
+        for statement in node.body:
+            if (isinstance(statement, ast.Assign) and isinstance(statement.value, ast.Constant)
+                    and any(isinstance(target, ast.Name) and target.id == "command_name" for target in statement.targets)):
+                command_name = statement.value.value
+            elif isinstance(statement, ast.FunctionDef) and statement.name == "execute":
+                parameters = _parameters(statement.args)
+        if isinstance(command_name, str):
+            commands.append({"command_name": command_name, "module": module_name,
+                             "class": node.name, "parameters": parameters})
+    return commands
+
+
+def _base_name(base):
+    """Return the last name of a base class expression such as ``commands.Command``."""
+    if isinstance(base, ast.Attribute):
+        return base.attr
+    return base.id if isinstance(base, ast.Name) else None
+
+
+def _parameters(arguments):
+    """Describe a function's parameters as JSON-friendly dictionaries."""
+    positional = arguments.posonlyargs + arguments.args
+    first_default = len(positional) - len(arguments.defaults)
+    parameters = []
+    for index, argument in enumerate(positional):
+        kind = "POSITIONAL_ONLY" if index < len(arguments.posonlyargs) else "POSITIONAL_OR_KEYWORD"
+        parameters.append(_parameter(argument, kind, index >= first_default))
+    if arguments.vararg:
+        parameters.append(_parameter(arguments.vararg, "VAR_POSITIONAL", False))
+    return parameters
+
+
+def _parameter(argument, kind, has_default):
+    """Describe one parameter."""
+    annotation = ast.unparse(argument.annotation) if argument.annotation else None
+    return {"name": argument.arg, "kind": kind, "annotation": annotation, "has_default": has_default}
+
+
+def signature_parameters(parameters):
+    """Turn manifest parameter descriptions back into ``inspect.Parameter`` objects."""
+    return [inspect.Parameter(parameter["name"], getattr(inspect.Parameter, parameter["kind"]),
+                              default=None if parameter["has_default"] else inspect.Parameter.empty,
+                              annotation=ANNOTATIONS.get(parameter["annotation"], inspect.Parameter.empty))
+            for parameter in parameters]
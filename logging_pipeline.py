@@ -0,0 +1,157 @@
+"""Queue-based logging for hot paths.
+
+``start_queue_logging`` moves the root logger's handlers (as configured by
+``logging.conf`` or ``basicConfig``) behind a ``QueueHandler``. Calling
+``logging.info`` then only puts the record on a queue; a ``QueueListener``
+thread formats it and writes it out. ``FileHandler``s are replaced by
+``BatchingFileHandler``s, which write many records per write call.
+
+``SamplingFilter`` keeps the volume of INFO (and lower) records down: it
+keeps the first record from every logging call site and then one in
+``sample_rate``, and at most ``rate_limit`` records per second. Warnings
+and errors always pass.
+
+The listener is stopped, and every pending record written, by
+``stop_queue_logging``, which also runs at interpreter exit.
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import time
+
+_listener = None  # pylint: disable=invalid-name
+_filter = None  # pylint: disable=invalid-name
+
+
+class SamplingFilter(logging.Filter):
+    """Samples and rate-limits INFO and lower records; higher levels always pass."""
+    def __init__(self, sample_rate=1, rate_limit=0):
+        super().__init__()
+        self.sample_rate = max(int(sample_rate), 1)
+        self.rate_limit = int(rate_limit)
+        self.dropped = 0
+        self._seen = {}
+        self._window = 0
+        self._window_count = 0
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        if self.sample_rate > 1:
+            call_site = (record.pathname, record.lineno)
+            seen = self._seen.get(call_site, 0)
+            self._seen[call_site] = seen + 1
+            if seen % self.sample_rate:
+                self.dropped += 1
+                return False
+        if self.rate_limit:
+            window = int(record.created)
+            if window != self._window:
+                self._window, self._window_count = window, 0
+            if self._window_count >= self.rate_limit:
+                self.dropped += 1
+                return False
+            self._window_count += 1
+        return True
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler for a listener in the same process.
+
+    The record is queued as it is; formatting the message is left to the
+    listener thread instead of being done by the caller."""
+    def prepare(self, record):
+        return record
+
+
+class BatchingFileHandler(logging.FileHandler):
+    """A FileHandler that writes records in batches instead of one write per record.
+
+    A batch is written once it holds ``batch_size`` records, when a record is
+    at least ``flush_level``, after ``flush_interval`` seconds, or on flush."""
+    def __init__(self, filename, mode='a', encoding=None, batch_size=256, flush_interval=1.0,
+                 flush_level=logging.ERROR):
+        super().__init__(filename, mode, encoding)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        self._batch = []
+        self._last_write = time.monotonic()
+
+    def emit(self, record):
+        try:
+            self._batch.append(self.format(record) + self.terminator)
+        except Exception:  # pylint: disable=broad-exception-caught
+            self.handleError(record)
+            return
+        if (len(self._batch) >= self.batch_size or record.levelno >= self.flush_level
+                or time.monotonic() - self._last_write >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self._batch:
+                if self.stream is None:
+                    self.stream = self._open()
+                self.stream.write("".join(self._batch))
+                self._batch = []
+            self._last_write = time.monotonic()
+            super().flush()
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+def start_queue_logging(sample_rate=1, rate_limit=0, batch_size=256, flush_interval=1.0):
+    """Route the root logger's handlers through a queue and a listener thread."""
+    global _listener, _filter  # pylint: disable=global-statement
+    if _listener is not None:
+        return
+    root = logging.getLogger()
+    handlers = [_batching(handler, batch_size, flush_interval) for handler in root.handlers]
+    log_queue = queue.SimpleQueue()
+    queue_handler = LocalQueueHandler(log_queue)
+    _filter = SamplingFilter(sample_rate, rate_limit)
+    queue_handler.addFilter(_filter)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_queue_logging)
+    logging.info("Queue logging started (sample rate %d, rate limit %d/s, batch size %d).",
+                 _filter.sample_rate, _filter.rate_limit, batch_size)
+
+
+def stop_queue_logging():
+    """Write every queued record, stop the listener and restore the original handlers."""
+    global _listener, _filter  # pylint: disable=global-statement
+    if _listener is None:
+        return
+    listener, sampling, _listener, _filter = _listener, _filter, None, None
+    if sampling.dropped:
+        logging.warning("Dropped %d INFO log records by sampling or rate limiting.", sampling.dropped)
+    listener.stop()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, LocalQueueHandler):
+            root.removeHandler(handler)
+    for handler in listener.handlers:
+        handler.flush()
+        root.addHandler(handler)
+
+
+def _batching(handler, batch_size, flush_interval):
+    """Return a batching replacement for a plain FileHandler, or the handler itself."""
+    if type(handler) is not logging.FileHandler:  # pylint: disable=unidiomatic-typecheck
+        return handler
+    handler.close()
+    batching = BatchingFileHandler(handler.baseFilename, 'a', handler.encoding,
+                                   batch_size=batch_size, flush_interval=flush_interval)
+    batching.setLevel(handler.level)
+    batching.setFormatter(handler.formatter)
+    for log_filter in handler.filters:
+        batching.addFilter(log_filter)
+    return batching
@@ -1,8 +1,65 @@
 """Main module to start the application.
-This module initializes the App class and starts the application."""
-from app import App
+This module initializes the App class and starts the application.
 
+With ``--script <file>``, or when commands are piped in on stdin, the
+commands are run non-interactively instead of starting the REPL.
 
-app = App()
+``--serve <host:port>`` (or ``--serve unix:<path>``) shares the calculator
+with many clients over a local socket (see ``server``).
 
-app.start()
\ No newline at end of file
+``--profile-startup`` runs every startup step up to the first prompt and
+prints how long each phase took instead of starting the REPL."""
+import argparse
+import sys
+import time
+IMPORT_START = time.perf_counter()
+from app import App, ERROR_POLICIES  # pylint: disable=wrong-import-position
+IMPORT_TIME = time.perf_counter() - IMPORT_START
+
+
+def parse_arguments(argv=None):
+    """Parse the command-line arguments."""
+    parser = argparse.ArgumentParser(description="Command-line calculator.")
+    parser.add_argument("--script", help="run the commands in this file instead of starting the REPL")
+    parser.add_argument("--on-error", choices=ERROR_POLICIES, default="skip",
+                        help="what to do when a scripted command fails (default: skip)")
+    parser.add_argument("--save-every", type=int, default=0, metavar="N",
+                        help="save the history after every N scripted commands")
+    parser.add_argument("--serve", metavar="HOST:PORT|unix:PATH",
+                        help="serve calculator sessions on a local TCP or Unix socket")
+    parser.add_argument("--max-connections", type=int, default=None, metavar="N",
+                        help="with --serve, the most clients served at once (default: server_max_connections or 100)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print a per-phase breakdown of the startup time and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Start the REPL, or run a script of commands and exit with its status."""
+    arguments = parse_arguments(argv)
+    app = App()
+    if arguments.profile_startup:
+        app.startup_timings = {"imports": IMPORT_TIME, **app.startup_timings}
+        app.load_plugins()
+        print(app.startup_report())
+        sys.exit(0)
+    if arguments.serve:
+        from server import DEFAULT_MAX_CONNECTIONS, serve  # pylint: disable=import-outside-toplevel
+        app.load_plugins()
+        max_connections = arguments.max_connections or int(
+            app.get_environment_variable('server_max_connections') or DEFAULT_MAX_CONNECTIONS)
+        serve(app, arguments.serve, max_connections)
+        return
+    if arguments.script:
+        with open(arguments.script, encoding='utf-8') as script:
+            errors = app.start_script(script, arguments.on_error, arguments.save_every)
+    elif not sys.stdin.isatty():
+        errors = app.start_script(sys.stdin, arguments.on_error, arguments.save_every)
+    else:
+        app.start()
+        return
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Parallel execution of large command batches.
+
+``ParallelRunner`` splits a stream of command lines into chunks of basic
+operations (add, subtract, multiply, divide) and evaluates them in a
+``ProcessPoolExecutor``. Each worker process has its own ``Calculator``
+with an in-memory history. The results are written in input order and each
+chunk's history records are merged back into the main ``HistoryFacade`` in
+that same order.
+
+Any other command (history commands, plugins) acts as a barrier: the
+chunks before it are finished and merged, then it runs in the main process,
+so it sees every calculation that came before it. Only a bounded number of
+chunks is in flight at a time, so memory stays constant for any input size.
+"""
+import collections
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from calculator.calculator import OPERATORS, Calculator
+from calculator.history import HistoryFacade
+
+_worker_calculator = None  # pylint: disable=invalid-name
+
+
+def _init_worker():
+    """Create the worker's calculator and keep per-operation logging out of the workers."""
+    global _worker_calculator  # pylint: disable=global-statement
+    logging.getLogger().setLevel(logging.WARNING)
+    _worker_calculator = Calculator(HistoryFacade(backend="memory"))
+
+
+def evaluate_chunk(lines):
+    """Evaluate basic-operation lines and return ([(ok, text), ...], history records).
+
+    ``text`` is the result line for a successful line and the error message
+    otherwise. There is one history record per successful line."""
+    calculator = _worker_calculator
+    calculator.clear_history()
+    results = []
+    for line in lines:
+        cmd_parts = line.split()
+        try:
+            results.append((True, f"Result: {calculator.calculate(cmd_parts[0], cmd_parts[1:])}"))
+        except ValueError as e:
+            results.append((False, str(e)))
+    return results, calculator.history_facade.records.copy()
+
+
+class ParallelRunner:
+    """Runs numbered command lines, evaluating basic operations in a process pool."""
+    def __init__(self, workers, chunk_size):
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    def run(self, numbered_lines, run_inline, history_facade):
+        """Yield (line_number, output, error) for each line, in input order.
+
+        Basic operations are evaluated in the pool and their records merged
+        into ``history_facade``; any other line is passed to
+        ``run_inline(cmd_input)``, which runs it and returns an error message
+        or None. An ``exit`` line ends the run."""
+        with ProcessPoolExecutor(self.workers, initializer=_init_worker) as pool:
+            pending = collections.deque()  # (first line number, future) for each submitted chunk
+            chunk, chunk_start = [], 0
+            try:
+                for line_number, line in numbered_lines:
+                    cmd_input = line.strip()
+                    if cmd_input.split()[:1] and cmd_input.split()[0] in OPERATORS:
+                        if not chunk:
+                            chunk_start = line_number
+                        chunk.append(cmd_input)
+                        if len(chunk) >= self.chunk_size:
+                            pending.append((chunk_start, pool.submit(evaluate_chunk, chunk)))
+                            chunk = []
+                        while len(pending) > 2 * self.workers:
+                            yield from self._merge(*pending.popleft(), history_facade)
+                        continue
+                    if chunk:
+                        pending.append((chunk_start, pool.submit(evaluate_chunk, chunk)))
+                        chunk = []
+                    while pending:
+                        yield from self._merge(*pending.popleft(), history_facade)
+                    if cmd_input.lower() == 'exit':
+                        return
+                    yield line_number, None, run_inline(cmd_input)
+                if chunk:
+                    pending.append((chunk_start, pool.submit(evaluate_chunk, chunk)))
+                while pending:
+                    yield from self._merge(*pending.popleft(), history_facade)
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+    @staticmethod
+    def _merge(chunk_start, future, history_facade):
+        """Yield a finished chunk's lines and merge the records of the lines consumed."""
+        results, records = future.result()
+        merged = 0
+        try:
+            for line_number, (ok, text) in enumerate(results, chunk_start):
+                if ok:
+                    merged += 1
+                    yield line_number, text, None
+                else:
+                    yield line_number, None, text
+        finally:
+            history_facade.append_records(records[:merged])
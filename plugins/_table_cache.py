@@ -0,0 +1,134 @@
+"""
+An in-memory cache of parsed CSV tables for the data plugin.
+
+A cached table keeps the file's columns as lists of strings, plus hash
+indexes (value -> row numbers) on its key columns, so ``data ISBN=...``
+finds its rows without scanning the file. Each entry is checked against the
+file's mtime and size on every use and re-read when either changed.
+
+The cache holds at most ``max_bytes`` of (estimated) table memory; the least
+recently used tables are evicted to stay under it, and files too large to
+fit are not cached at all (the data plugin streams those instead). The
+estimate is kept up to date as blocks of rows are parsed, and parsing stops
+as soon as it passes the cap, so the cap also bounds the memory used while a
+file is read.
+"""
+import collections
+import csv
+import itertools
+import logging
+import os
+import threading
+from commands.executor import check_cancelled
+
+CELL_OVERHEAD = 57  # Approximate bytes per cell beyond its characters: str header and list slot
+DEFAULT_MAX_BYTES = 256 << 20
+DEFAULT_INDEX_COLUMNS = "ISBN"
+BLOCK_ROWS = 1024  # Rows parsed between checks against the cap and for cancellation
+
+
+class Table:
+    """A parsed CSV file held column by column, with hash indexes on key columns."""
+    def __init__(self, headers, columns, index_columns=()):
+        self.headers = headers
+        self.columns = columns
+        self.row_count = len(columns[0]) if columns else 0
+        self.nbytes = sum(len(cell) + CELL_OVERHEAD for column in columns for cell in column)
+        self.indexes = {}
+        for column in index_columns:
+            if column in headers:
+                index = collections.defaultdict(list)
+                for row, value in enumerate(columns[headers.index(column)]):
+                    index[value].append(row)
+                self.indexes[column] = dict(index)
+                self.nbytes += len(index) * CELL_OVERHEAD
+
+    @classmethod
+    def read(cls, filename, index_columns=(), buffer_size=1 << 20, max_bytes=None):
+        """Parse a CSV file into a table, or return None once it passes ``max_bytes`` of table memory."""
+        with open(filename, mode='r', newline='', encoding='utf-8', buffering=buffer_size) as csvfile:
+            reader = csv.reader(csvfile)
+            headers = next(reader)
+            columns = [[] for _ in headers]
+            nbytes = 0
+            for block in iter(lambda: list(itertools.islice(reader, BLOCK_ROWS)), []):
+                check_cancelled()  # Parsing a large file can take a while; let a job be cancelled
+                cells = list(itertools.zip_longest(*block, fillvalue=""))[:len(headers)]
+                cells += [("",) * len(block)] * (len(headers) - len(cells))
+                for column, block_cells in zip(columns, cells):
+                    column.extend(block_cells)
+                    nbytes += sum(map(len, block_cells)) + len(block_cells) * CELL_OVERHEAD
+                if max_bytes is not None and nbytes > max_bytes:
+                    return None
+        return cls(headers, columns, index_columns)
+
+    def rows(self, row_numbers=None):
+        """Iterate over all rows, or over the given row numbers, as tuples."""
+        if row_numbers is None:
+            return zip(*self.columns)
+        return (tuple(column[row] for column in self.columns) for row in row_numbers)
+
+    def lookup(self, column, value):
+        """Return the row numbers holding ``value`` in an indexed column, or None if not indexed."""
+        index = self.indexes.get(column)
+        return None if index is None else index.get(value, [])
+
+
+class TableCache:
+    """Least-recently-used cache of tables, invalidated by file mtime and size."""
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, index_columns=(DEFAULT_INDEX_COLUMNS,)):
+        self.max_bytes = max_bytes
+        self.index_columns = tuple(index_columns)
+        self.nbytes = 0
+        self._tables = collections.OrderedDict()  # path -> (mtime_ns, size, Table)
+        self._lock = threading.Lock()  # Guards _tables and nbytes; jobs and server sessions share the cache
+
+    @classmethod
+    def from_environment(cls):
+        """Create a cache configured by ``data_cache_max_bytes`` and ``data_index_columns``."""
+        max_bytes = int(os.getenv("data_cache_max_bytes") or DEFAULT_MAX_BYTES)
+        index_columns = (os.getenv("data_index_columns") or DEFAULT_INDEX_COLUMNS).split(",")
+        return cls(max_bytes, [column for column in index_columns if column])
+
+    def get(self, filename):
+        """Return the cached table for a file, reading it if needed, or None if it is too large to cache.
+
+        The file is parsed outside the lock, so other files are served meanwhile."""
+        path = os.path.realpath(filename)
+        stat = os.stat(path)
+        with self._lock:
+            cached = self._tables.get(path)
+            if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+                self._tables.move_to_end(path)
+                return cached[2]
+            self._discard(path)
+        if stat.st_size > self.max_bytes:
+            return None
+        table = Table.read(path, self.index_columns, max_bytes=self.max_bytes)
+        if table is None or table.nbytes > self.max_bytes:
+            logging.info("Not caching %s: it is over the %d byte cap.", path, self.max_bytes)
+            return None
+        with self._lock:
+            self._discard(path)  # Another thread may have cached the file while this one parsed it
+            self._tables[path] = (stat.st_mtime_ns, stat.st_size, table)
+            self.nbytes += table.nbytes
+            while self.nbytes > self.max_bytes:
+                evicted, (_, _, evicted_table) = self._tables.popitem(last=False)
+                self.nbytes -= evicted_table.nbytes
+                logging.info("Evicted %s from the data cache.", evicted)
+        return table
+
+    def _discard(self, path):
+        """Drop a file's cached table, if any; the caller holds the lock."""
+        cached = self._tables.pop(path, None)
+        if cached:
+            self.nbytes -= cached[2].nbytes
+
+    def __contains__(self, filename):
+        return os.path.realpath(filename) in self._tables
+
+    def clear(self):
+        """Drop every cached table."""
+        with self._lock:
+            self._tables.clear()
+            self.nbytes = 0
@@ -1,39 +1,209 @@
 """
 DataPlugin module.
 
-This module defines the DataPlugin class, which is a plugin for the 
-Command framework. It provides functionality to read and display 
+This module defines the DataPlugin class, which is a plugin for the
+Command framework. It provides functionality to read and display
 data from a specified CSV file.
+
+The command accepts optional arguments:
+
+- ``columns=ISBN,Title`` shows only these columns,
+- ``<column>=<value>``, ``<column>^=<prefix>`` and ``<column>>=<value>``
+  (also ``>``, ``<=``, ``<``) keep only the matching rows; range filters
+  compare numerically when the value is a number,
+- ``limit=<n>`` and ``offset=<n>`` page through the matching rows,
+- ``out=<file>`` writes the matching rows to a CSV file instead,
+- ``file=<csv>`` reads another file instead of ``books_file_path``.
+
+Files up to ``data_cache_max_bytes`` are parsed once and kept in memory
+(see ``plugins._table_cache``) until they change on disk; equality filters on
+the ``data_index_columns`` (``ISBN`` by default) are answered from a hash
+index. Larger files are streamed through a large read buffer. Output is
+written in blocks, so files of any size are read in constant memory; a
+cancelled or timed-out job stops between blocks of rows read, whether or
+not they match (see ``commands.executor``).
 """
 import logging
 import csv
 import os
+import sys
+from itertools import islice
 from commands import Command
+from commands.executor import JobCancelled, check_cancelled
+from plugins._table_cache import TableCache
+
+BUFFER_SIZE = 1 << 20
+WRITE_BATCH = 4096  # Rows per write to the output
+SCAN_BATCH = 4096  # Rows scanned between checks for cancellation
+FILTER_OPERATORS = ("^=", ">=", "<=", "=", ">", "<")
+OPTIONS = ("columns", "limit", "offset", "out", "file")
+
+_table_cache = None  # pylint: disable=invalid-name
+
+
+def table_cache():
+    """Return the shared table cache, creating it from the environment on first use."""
+    global _table_cache  # pylint: disable=global-statement
+    if _table_cache is None:
+        _table_cache = TableCache.from_environment()
+    return _table_cache
+
+
+class RowFilter:
+    """A filter on one column: equality, prefix or a numeric/text range."""
+    def __init__(self, column, operator, value):
+        self.column = column
+        self.operator = operator
+        self.value = value
+        try:
+            self.number = float(value)
+        except ValueError:
+            self.number = None
+
+    def predicate(self, index):
+        """Return a function telling whether a row matches, given the column's index."""
+        value, operator = self.value, self.operator
+        if operator == "=":
+            return lambda row: row[index] == value
+        if operator == "^=":
+            return lambda row: row[index].startswith(value)
+        compare = {">=": lambda a, b: a >= b, "<=": lambda a, b: a <= b,
+                   ">": lambda a, b: a > b, "<": lambda a, b: a < b}[operator]
+        if self.number is None:
+            return lambda row: compare(row[index], value)
+        number = self.number
+
+        def numeric(row):
+            try:
+                return compare(float(row[index]), number)
+            except ValueError:
+                return False
+        return numeric
+
+
+def parse_arguments(args):
+    """Parse the command arguments into options and row filters; raise ValueError if malformed."""
+    options, filters = {}, []
+    for argument in args:
+        operator = next((symbol for symbol in FILTER_OPERATORS if symbol in argument), None)
+        column, _, value = argument.partition(operator) if operator else (argument, "", "")
+        if operator is None or not column:
+            raise ValueError(f"Invalid argument '{argument}'. Use <option>=<value> or <column><op><value>.")
+        if operator == "=" and column in OPTIONS:
+            options[column] = value
+        else:
+            filters.append(RowFilter(column, operator, value))
+    for option in ("limit", "offset"):
+        if option in options:
+            if not options[option].isdigit():
+                raise ValueError(f"{option} must be a non-negative integer.")
+            options[option] = int(options[option])
+    return options, filters
+
+
+def column_index(headers, column):
+    """Return the index of a column, raising ValueError for an unknown column."""
+    try:
+        return headers.index(column)
+    except ValueError:
+        raise ValueError(f"Unknown column '{column}'. Columns are {', '.join(headers)}.") from None
+
+
+def table_rows(table, filters):
+    """Return the rows of a cached table that may match, using an index when a filter allows it."""
+    for row_filter in filters:
+        if row_filter.operator == "=":
+            row_numbers = table.lookup(row_filter.column, row_filter.value)
+            if row_numbers is not None:
+                return table.rows(row_numbers)
+    return table.rows()
+
+
+def cancellable(rows):
+    """Yield the rows, checking once per ``SCAN_BATCH`` of them whether the job was cancelled."""
+    while True:
+        block = list(islice(rows, SCAN_BATCH))
+        if not block:
+            return
+        check_cancelled()
+        yield from block
+
+
+def select_rows(rows, headers, options, filters):
+    """Return the projected headers and an iterator over the matching, projected rows.
+
+    The rows are scanned in blocks with a cancellation check per block, so a
+    filter that matches nothing can still be cancelled."""
+    rows = cancellable(iter(rows))
+    predicates = [row_filter.predicate(column_index(headers, row_filter.column)) for row_filter in filters]
+    selected = rows
+    if predicates:
+        selected = (row for row in rows if all(predicate(row) for predicate in predicates))
+    offset = options.get("offset", 0)
+    limit = options.get("limit")
+    selected = islice(selected, offset, None if limit is None else offset + limit)
+    if "columns" in options:
+        indexes = [column_index(headers, column) for column in options["columns"].split(",")]
+        headers = [headers[index] for index in indexes]
+        selected = ([row[index] for index in indexes] for row in selected)
+    return headers, selected
+
+
+def write_rows(headers, rows, out=None):
+    """Write the headers and rows, to a CSV file when ``out`` is given; return the row count."""
+    count = 0
+    if out:
+        with open(out, mode='w', newline='', encoding='utf-8', buffering=BUFFER_SIZE) as out_file:
+            writer = csv.writer(out_file)
+            writer.writerow(headers)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        return count
+    lines = [' | '.join(headers)]
+    for row in rows:
+        lines.append(' | '.join(row))
+        count += 1
+        if len(lines) >= WRITE_BATCH:
+            sys.stdout.write('\n'.join(lines) + '\n')
+            lines = []
+    if lines:
+        sys.stdout.write('\n'.join(lines) + '\n')
+    return count
+
 
 class DataPlugin(Command):
     """A plugin that displays data from a CSV file."""
     command_name = "data"
 
     @staticmethod
-    def execute():
-        """Execute the data command to display contents of a CSV file."""
-        # filename = "data/books.csv"  # Specify the filename here
-        filename = os.getenv("books_file_path")
+    def execute(*args):
+        """Execute the data command to display contents of a CSV file.
+
+        Raises ValueError for malformed arguments or unknown columns."""
+        options, filters = parse_arguments(args)
+        filename = options.get("file") or os.getenv("books_file_path")
         try:
-            with open(filename, mode='r', newline='', encoding='utf-8') as csvfile:
-                reader = csv.reader(csvfile)
-                headers = next(reader)  # Get the headers
-                print(f"{' | '.join(headers)}")  # Print headers
-
-                # Print the rows
-                for row in reader:
-                    print(f"{' | '.join(row)}")                
-                logging.info("Displayed data from CSV file: %s", filename)
+            table = table_cache().get(filename)
+            if table is not None:
+                headers, rows = select_rows(table_rows(table, filters), table.headers, options, filters)
+                count = write_rows(headers, rows, options.get("out"))
+            else:
+                with open(filename, mode='r', newline='', encoding='utf-8', buffering=BUFFER_SIZE) as csvfile:
+                    reader = csv.reader(csvfile)
+                    headers = next(reader)  # Get the headers
+                    headers, rows = select_rows(reader, headers, options, filters)
+                    count = write_rows(headers, rows, options.get("out"))
+            if options.get("out"):
+                print(f"Wrote {count} rows to {options['out']}.")
+            logging.info("Displayed data from CSV file: %s", filename)
         except FileNotFoundError:
             print(f"Error: The file '{filename}' was not found.")
             logging.error("File not found: %s", filename)
+        except (ValueError, JobCancelled):
+            raise
         except Exception as e:
             print("Error reading the CSV file:", e)
             logging.error("Error reading CSV file %s: %s", filename, e)
 # pylint: disable=too-few-public-methods
-# pylint: disable=arguments-differ
\ No newline at end of file
+# pylint: disable=arguments-differ
@@ -0,0 +1,180 @@
+"""Asyncio server sharing one calculator process between many clients.
+
+``CalculatorServer`` listens on a local TCP or Unix socket. Every connection
+gets its own session (see ``App.new_session``): the same commands as the
+REPL, run against the session's own in-memory history. Clients may send
+requests without waiting for replies; replies come back in request order.
+
+Each command runs on a worker thread, so a slow command does not hold up
+the other connections. What it prints goes to a buffer of that thread's own
+(see ``commands.executor.capture_thread_output``), never to the real stdout.
+
+Two protocols are spoken, chosen per request line:
+
+- a plain command line gets the same text the REPL would print, with
+  errors as ``Error: <message>``, then an empty line ending the reply (so
+  a command with no output still gets one; blank lines in the output are
+  dropped);
+- a JSON object ``{"id": ..., "command": "add 1 2"}`` gets one JSON line
+  ``{"id": ..., "output": "Result: 3.0\\n", "error": null}``.
+
+Any client that can connect may run every command, including the ones that
+write files, so the server listens on the loopback address by default and
+warns when told to listen anywhere else.
+
+``exit`` closes the connection. Requests are read one line at a time and a
+connection is not read again while more than ``write_buffer_limit`` bytes
+of its replies are waiting to be written, so a client that does not read
+its replies is slowed down instead of filling the server's memory. Connections beyond ``max_connections`` are
+refused with an error line.
+"""
+import asyncio
+import contextlib
+import io
+import ipaddress
+import json
+import logging
+from commands.executor import capture_thread_output
+
+DEFAULT_MAX_CONNECTIONS = 100
+WRITE_BUFFER_LIMIT = 1 << 16
+MAX_LINE_LENGTH = 1 << 20
+LOOPBACK = "127.0.0.1"
+
+
+def is_loopback(host):
+    """Return True if ``host`` is a loopback address or ``localhost``."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def run_captured(session, command):
+    """Run one command line in this thread and return ``(output, error)``, capturing what it prints."""
+    output = io.StringIO()
+    capture_thread_output(output)
+    try:
+        error = session.run_line(command)
+    finally:
+        capture_thread_output(None)
+    return output.getvalue(), error
+
+
+class CalculatorServer:
+    """Serves calculator sessions over a local socket."""
+    def __init__(self, app, max_connections=DEFAULT_MAX_CONNECTIONS, write_buffer_limit=WRITE_BUFFER_LIMIT):
+        self.app = app
+        self.max_connections = max_connections
+        self.write_buffer_limit = write_buffer_limit
+        self.connections = 0
+        self.server = None
+        self._handlers = {}  # Task -> writer for every open connection
+
+    async def start(self, host=LOOPBACK, port=0, path=None):
+        """Start listening on a TCP port, or on a Unix socket when ``path`` is given."""
+        if path:
+            self.server = await asyncio.start_unix_server(self.handle, path, limit=MAX_LINE_LENGTH)
+        else:
+            if not is_loopback(host):
+                logging.warning("Serving on %s, which is not a loopback address: any client that can reach it "
+                                "can run every command, including those that write files.", host)
+            self.server = await asyncio.start_server(self.handle, host, port, limit=MAX_LINE_LENGTH)
+        logging.info("Calculator server listening on %s.",
+                     ", ".join(str(sock.getsockname()) for sock in self.server.sockets))
+        return self.server
+
+    @property
+    def address(self):
+        """Return the address of the first listening socket."""
+        return self.server.sockets[0].getsockname()
+
+    async def serve_forever(self):
+        """Serve until cancelled."""
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        """Stop accepting connections, close the open ones and wait for their sessions to end."""
+        self.server.close()
+        await self.server.wait_closed()
+        for writer in self._handlers.values():
+            writer.close()
+        if self._handlers:
+            await asyncio.wait(list(self._handlers), timeout=5)
+
+    async def handle(self, reader, writer):
+        """Run one connection's session until the client disconnects or sends ``exit``."""
+        writer.transport.set_write_buffer_limits(high=self.write_buffer_limit)
+        if self.connections >= self.max_connections:
+            logging.warning("Refusing connection: %d connections open.", self.connections)
+            writer.write(b"Error: Too many connections.\n")
+            await self._close(writer)
+            return
+        self.connections += 1
+        self._handlers[asyncio.current_task()] = writer
+        session = self.app.new_session()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:  # Line longer than the reader's limit
+                    writer.write(b"Error: Request too long.\n")
+                    break
+                if not line:
+                    break
+                reply = await self.respond(session, line.decode("utf-8", errors="replace").strip())
+                if reply is None:
+                    break
+                writer.write(reply.encode("utf-8"))
+                await writer.drain()  # Only waits while the client is behind on reading
+        except ConnectionError as e:
+            logging.info("Connection lost: %s", e)
+        finally:
+            self.connections -= 1
+            self._handlers.pop(asyncio.current_task(), None)
+            await self._close(writer)
+
+    @staticmethod
+    async def respond(session, line):
+        """Return the reply to one request line, or None to close the connection.
+
+        The command runs on the event loop's default executor."""
+        request_id, as_json = None, line.startswith("{")
+        command = line
+        if as_json:
+            try:
+                request = json.loads(line)
+                request_id, command = request.get("id"), str(request["command"]).strip()
+            except (ValueError, KeyError, AttributeError) as e:
+                return json.dumps({"id": request_id, "output": "", "error": f"Invalid request: {e}"}) + "\n"
+        if command.lower() == "exit":
+            return None
+        output, error = await asyncio.get_running_loop().run_in_executor(None, run_captured, session, command)
+        if as_json:
+            return json.dumps({"id": request_id, "output": output, "error": error}) + "\n"
+        lines = [text for text in output.splitlines() if text] + ([f"Error: {error}"] if error else [])
+        return "".join(text + "\n" for text in lines) + "\n"
+
+    @staticmethod
+    async def _close(writer):
+        """Close a connection, ignoring a client that already went away."""
+        writer.close()
+        with contextlib.suppress(ConnectionError):
+            await writer.wait_closed()
+
+
+def serve(app, address, max_connections=DEFAULT_MAX_CONNECTIONS):
+    """Serve on ``host:port`` or ``unix:<path>`` until interrupted; ``:port`` serves on loopback."""
+    async def run():
+        server = CalculatorServer(app, max_connections)
+        if address.startswith("unix:"):
+            await server.start(path=address[len("unix:"):])
+        else:
+            host, _, port = address.rpartition(":")
+            await server.start(host.strip("[]") or LOOPBACK, int(port))
+        await server.serve_forever()
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(run())
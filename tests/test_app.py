@@ -1,5 +1,9 @@
+import inspect
 import pytest
 from app import App
+from calculator.calculator import Calculator
+from calculator.history import HistoryFacade
+from commands import Command, CommandError, UnknownCommandError
 
 @pytest.fixture
 def app():
@@ -135,4 +139,171 @@ def test_divide_by_zero(app, monkeypatch, capsys):
     # Capture the printed output
     captured = capsys.readouterr()
     # Check for the expected error message
-    assert "Cannot divide by zero." in captured.out  
\ No newline at end of file
+    assert "Cannot divide by zero." in captured.out  
+
+def test_export_and_import_history(app, monkeypatch, capsys, tmp_path):
+    """Test the export_history and import_history commands."""
+    app.calculator.add(1, 2)
+    export_file = tmp_path / "export.csv"
+    inputs = iter([f'export_history {export_file}', f'import_history {export_file}', 'exit'])
+    monkeypatch.setattr('builtins.input', lambda _: next(inputs))
+    with pytest.raises(SystemExit):
+        app.start()
+    captured = capsys.readouterr()
+    assert f"History exported to {export_file}." in captured.out
+    assert "Imported" in captured.out
+
+
+def test_history_pages(app, monkeypatch, capsys):
+    """Test the history, history <offset> <limit> and history tail commands."""
+    app.calculator.clear_history()
+    for i in range(5):
+        app.calculator.add(i, 1)
+    inputs = iter(['history 1 2', 'history tail 1', 'history', 'history x', 'exit'])
+    monkeypatch.setattr('builtins.input', lambda _: next(inputs))
+    with pytest.raises(SystemExit):
+        app.start()
+    out = capsys.readouterr().out
+    assert "     1  Added 1 + 1 = 2\n     2  Added 2 + 1 = 3\n     4  Added 4 + 1 = 5\n     0  Added 0 + 1 = 1" in out
+    assert "Error: Usage is 'history'" in out
+
+
+def test_history_query(app, monkeypatch, capsys):
+    """Test the history_query command."""
+    app.calculator.clear_history()
+    app.calculator.divide(1, 4)
+    app.calculator.add(1, 4)
+    inputs = iter(['history_query op=divide result<1', 'history_query size=3', 'exit'])
+    monkeypatch.setattr('builtins.input', lambda _: next(inputs))
+    with pytest.raises(SystemExit):
+        app.start()
+    out = capsys.readouterr().out
+    assert "Count: 1 (divide: 1)" in out
+    assert "Error: Invalid filter 'size=3'." in out
+
+
+def test_run_script_error_policies(app, capsys):
+    """Test that scripted commands stream through the REPL dispatch with each error policy."""
+    script = ['add 1 2', 'bogus', 'divide 1 0', 'multiply 2 3', 'exit', 'add 5 5']
+    assert app.start_script(iter(script), "skip") == 2
+    captured = capsys.readouterr()
+    assert "Result: 3.0\nError on line 2: No such command: bogus\nError on line 3: Cannot divide by zero.\nResult: 6.0\n" in captured.out
+    assert "Result: 10.0" not in captured.out
+    assert "Processed 4 lines" in captured.err
+
+    assert app.run_script(iter(script), "stop") == 1
+    assert "Result: 6.0" not in capsys.readouterr().out
+
+    assert app.run_script(iter(script), "collect") == 2
+    captured = capsys.readouterr()
+    assert "Error on line 2: No such command: bogus\nError on line 3: Cannot divide by zero.\n" in captured.err
+    assert "Error on line" not in captured.out
+
+
+def test_main_script_mode(monkeypatch, capsys, tmp_path):
+    """Test running a script file through main.py."""
+    import main  # pylint: disable=import-outside-toplevel
+    script = tmp_path / "commands.txt"
+    script.write_text("add 2 2\nsubtract 9 3\n", encoding="utf-8")
+    with pytest.raises(SystemExit) as e:
+        main.main(["--script", str(script)])
+    assert e.value.code == 0
+    assert "Result: 4.0\nResult: 6.0\n" in capsys.readouterr().out
+
+
+def test_run_script_in_parallel(app, monkeypatch, capsys):
+    """Test that scripts use the process pool when parallel_workers is set."""
+    monkeypatch.setitem(app.settings, 'parallel_workers', '2')
+    monkeypatch.setitem(app.settings, 'parallel_chunk_size', '2')
+    app.calculator.clear_history()
+    assert app.run_script(iter(['add 1 2', 'multiply 2 3', 'history tail 2', 'divide 1 0']), "skip") == 1
+    assert "Result: 3.0\nResult: 6.0\n     0  Added 1.0 + 2.0 = 3.0\n     1  Multiplied 2.0 * 3.0 = 6.0\n" \
+        "Error on line 4: Cannot divide by zero.\n" in capsys.readouterr().out
+
+
+def test_expr_command(app, monkeypatch, capsys):
+    """Test the expr command with scalar and list bindings."""
+    app.calculator.clear_history()
+    inputs = iter(['expr (3 + 4) * 2 / x where x=4', 'expr x * 2 where x=1,2.5', 'expr 1 / 0', 'exit'])
+    monkeypatch.setattr('builtins.input', lambda _: next(inputs))
+    with pytest.raises(SystemExit):
+        app.start()
+    out = capsys.readouterr().out
+    assert "Result: 3.5\nResult: 2.0, 5.0\nError: Cannot divide by zero.\n" in out
+
+
+def test_dispatch_table(app, monkeypatch, capsys):
+    """Test dispatch through the table with argument checks and many plugins."""
+    monkeypatch.setattr(app.command_handler, 'specs', dict(app.command_handler.specs))
+    monkeypatch.setattr(app.command_handler, 'commands', dict(app.command_handler.commands))
+    for index in range(300):
+        plugin = type(f"Plugin{index}", (Command,), {
+            "command_name": f"plugin{index}", "execute": staticmethod(lambda count: print(f"count={count}"))})
+        app.command_handler.register_plugin(
+            plugin.command_name, plugin(), list(inspect.signature(plugin.execute).parameters.values()))
+    app.build_dispatch_table()
+    app.execute("plugin299 7")
+    assert capsys.readouterr().out == "count=7\n"
+    for cmd_input, message in (("plugin1", "plugin1 requires exactly 1 argument."),
+                               ("add 1 x", "Invalid arguments. Arguments must be numbers."),
+                               ("delete_history_record first", "Arguments must be integers."),
+                               ("history_query size=3", "Invalid filter")):
+        with pytest.raises(CommandError, match=message):
+            app.execute(cmd_input)
+    with pytest.raises(UnknownCommandError):
+        app.execute("plugin300 1")
+    assert "plugin299" in app.menu and "add <a> <b>" in app.menu
+
+
+def test_data_agg_and_calc_commands(app, capsys, tmp_path):
+    """Test the data_agg and data_calc commands."""
+    sales = tmp_path / "sales.csv"
+    sales.write_text("Author,Price,Qty\nA,10,2\nB,5,1\nA,4,3\n", encoding="utf-8")
+    app.execute(f"data_agg {sales} sum Price group_by Author")
+    app.execute(f"data_calc {sales} multiply Price Qty out={tmp_path / 'out.txt'}")
+    assert capsys.readouterr().out == f"A | 14.0\nB | 5.0\nCalculated 3 rows into {tmp_path / 'out.txt'}.\n"
+    assert (tmp_path / "out.txt").read_text(encoding="utf-8") == "Price multiply Qty\n20.0\n5.0\n12.0\n"
+    with pytest.raises(CommandError, match="was not found"):
+        app.execute("data_agg missing.csv sum Price")
+    with pytest.raises(CommandError, match="Usage: data_agg"):
+        app.execute(f"data_agg {sales} sum Price by Author")
+
+
+def test_stats_and_profile_commands(app, capsys, tmp_path):
+    """Test that commands are timed for stats and that profile covers only the next commands."""
+    app.execute("stats reset")
+    app.execute("add 1 2")
+    with pytest.raises(CommandError):
+        app.execute("divide 1 0")
+    capsys.readouterr()
+    app.execute("stats")
+    lines = {line.split()[0]: line.split()[1:3] for line in capsys.readouterr().out.splitlines()[1:]}
+    assert lines["command.add"] == ["1", "0"]
+    assert lines["command.divide"] == ["1", "1"]
+    assert lines["history.add_record"] == ["1", "0"]
+    app.execute(f"profile 1 {tmp_path / 'profile.prof'}")
+    app.execute("multiply 2 3")
+    out = capsys.readouterr().out
+    assert out.startswith("Profiling the next 1 command.\nResult: 6.0\nProfile written to")
+    assert "calculate" in out and (tmp_path / "profile.prof").exists()
+    assert app.profiler is None
+
+
+def test_delete_history_record_ranges_and_filters(app, capsys):
+    """Test deleting history records by ranges, several indexes and filters."""
+    app.calculator = Calculator(HistoryFacade(backend="memory"))
+    app.build_dispatch_table()
+    for i in range(10):
+        app.execute(f"subtract {i} 5")
+    app.execute("delete_history_record 1-3 7")
+    app.execute("delete_history_record op=subtract result<0")
+    app.execute("delete_history_record 0")
+    out = capsys.readouterr().out.splitlines()[-3:]
+    assert out == ["Deleted 4 records.", "Deleted 2 records.", "Deleted record: Subtracted 5.0 - 5.0 = 0.0"]
+    assert app.calculator.history_facade.rendered_entries() == [
+        "Subtracted 6.0 - 5.0 = 1.0", "Subtracted 8.0 - 5.0 = 3.0", "Subtracted 9.0 - 5.0 = 4.0"]
+    for selectors, message in (("5-2", "must not end before"), ("1 9", "Invalid index 9"),
+                               ("1-99999999999", "Invalid index 99999999999"),
+                               ("op=divide x", "Arguments must be integers")):
+        with pytest.raises(CommandError, match=message):
+            app.execute(f"delete_history_record {selectors}")
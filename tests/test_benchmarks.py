@@ -0,0 +1,37 @@
+"""Tests for the benchmark suite's baseline comparison."""
+from benchmarks import suite
+
+
+def test_compare_flags_slowdowns_beyond_the_threshold():
+    """Test that only benchmarks slower than baseline * (1 + threshold) are regressions."""
+    baseline = {"fast": 1.0, "same": 1.0, "slow": 1.0, "removed": 1.0}
+    results = {"fast": 0.5, "same": 1.2, "slow": 1.3, "added": 1.0}
+    rows = {row[0]: row for row in suite.compare(results, baseline, threshold=0.25)}
+    assert set(rows) == {"fast", "same", "slow"}
+    assert [name for name, *_, regressed in rows.values() if regressed] == ["slow"]
+    assert rows["slow"][3] == 1.3
+
+
+def test_main_exits_with_failure_on_regression(tmp_path, monkeypatch, capsys):
+    """Test that main writes JSON results and returns 1 only when a benchmark regressed."""
+    baseline = tmp_path / "baseline.json"
+    monkeypatch.setattr(suite, "run_suite", lambda sizes, repeat: {"calculator.add": 1e-6})
+    assert suite.main(["--baseline", str(baseline), "--update-baseline"]) == 0
+    assert suite.read_results(str(baseline)) == {"calculator.add": 1e-6}
+
+    monkeypatch.setattr(suite, "run_suite", lambda sizes, repeat: {"calculator.add": 2e-6})
+    output = tmp_path / "results.json"
+    assert suite.main(["--baseline", str(baseline), "--output", str(output)]) == 1
+    assert suite.read_results(str(output)) == {"calculator.add": 2e-6}
+    assert "REGRESSION" in capsys.readouterr().out
+    assert suite.main(["--baseline", str(baseline), "--threshold", "1.5"]) == 0
+
+
+def test_plugin_benchmark_leaves_the_registry_as_it_was(monkeypatch):
+    """Test that the plugin-loading benchmark unregisters its temporary plugin directory."""
+    from commands import CommandHandlerFactory  # pylint: disable=import-outside-toplevel
+    monkeypatch.setattr(suite, "PLUGINS", 3)
+    factory = CommandHandlerFactory()
+    directories, names = set(factory.plugin_files), set(factory.specs)
+    suite.bench_load_plugins(1)
+    assert set(factory.plugin_files) == directories and set(factory.specs) == names
@@ -7,9 +7,11 @@ and HistoryFacade classes, ensuring operations like addition, subtraction,
 history management, and persistence are working as expected.
 """
 import os  # Standard library imports
+import numpy as np  # Third-party imports
 import pytest  # Third-party imports
 from calculator.calculator import Calculator  # Local application imports
 from calculator.history import HistoryFacade  # Local application imports
+from calculator.query import Range  # Local application imports
 
 
 # Helper function to reset the history file for test isolation
@@ -136,3 +138,216 @@ def test_delete_entry(history_facade_fixture ):
 def test_delete_invalid_entry(history_facade_fixture):
     """Test attempting to delete a non-existent entry in the history."""
     assert history_facade_fixture.delete_entry(5) == "Invalid index. No record deleted."
+
+def test_add_entry_is_buffered(history_facade_fixture):
+    """Test that buffered entries keep their order across reads and deletions."""
+    for i in range(1000):
+        history_facade_fixture.add_entry(f"Entry {i}")
+    assert len(history_facade_fixture) == 1000
+    assert history_facade_fixture.delete_entry(0) == "Deleted record: Entry 0"
+    history_facade_fixture.add_entry("Entry 1000")
+    assert history_facade_fixture.rendered_entries(-2) == ["Entry 999", "Entry 1000"]
+    assert len(history_facade_fixture) == 1000
+
+def test_journal_save_appends_only_new_entries(tmp_path):
+    """Test that journal mode appends new entries and compacts after a deletion."""
+    history_file = tmp_path / "history.csv"
+    facade = HistoryFacade(str(history_file), save_mode="journal", fsync="always")
+    facade.add_record("add", 1, 2, 3)
+    facade.save_history()
+    facade.add_entry("Note, with a comma")
+    facade.save_history()
+    facade.save_history()
+    lines = history_file.read_text(encoding="utf-8").splitlines()
+    assert lines[0] == "operation,a,b,result,timestamp,note"
+    assert lines[1].startswith("add,1,2,3,")
+    assert lines[2].startswith("note,,,,") and lines[2].endswith(',"Note, with a comma"')
+    assert len(lines) == 3
+    facade.delete_entry(0)
+    facade.add_record("divide", 1.0, 4.0, 0.25)
+    facade.save_history()
+    assert HistoryFacade(str(history_file)).rendered_entries() == [
+        "Note, with a comma", "Divided 1.0 / 4.0 = 0.25"]
+
+def test_invalid_save_mode(tmp_path):
+    """Test that an unknown save mode is rejected."""
+    with pytest.raises(ValueError, match="Unknown history save mode"):
+        HistoryFacade(str(tmp_path / "history.csv"), save_mode="sometimes")
+
+def test_history_records_are_typed(calc_fixture):
+    """Test that calculations are stored as typed columns and rendered on display."""
+    calc_fixture.add(1, 2)
+    calc_fixture.divide(7.0, 2.0)
+    calc_fixture.divide(1, 4)
+    history_df = calc_fixture.history_facade.history_df
+    assert list(history_df["operation"]) == ["add", "divide", "divide"]
+    assert history_df["a"].dtype == "float64" and history_df["timestamp"].dtype == "int64"
+    assert history_df.groupby("operation", observed=True)["result"].sum()["divide"] == 3.75
+    assert calc_fixture.history_facade.rendered_entries() == [
+        "Added 1 + 2 = 3", "Divided 7.0 / 2.0 = 3.5", "Divided 1 / 4 = 0.25"]
+
+def test_load_legacy_history_file(tmp_path):
+    """Test that files holding formatted calculation strings are still readable."""
+    history_file = tmp_path / "history.csv"
+    history_file.write_text("Calculation\nAdded 1.0 + 2.0 = 3.0\nSomething else\n", encoding="utf-8")
+    facade = HistoryFacade(str(history_file))
+    assert list(facade.history_df["operation"]) == ["add", "note"]
+    assert facade.rendered_entries() == ["Added 1.0 + 2.0 = 3.0", "Something else"]
+
+
+@pytest.mark.parametrize("load_first", [True, False])
+def test_journal_save_rewrites_legacy_history_file(tmp_path, load_first):
+    """Test that a journal save over a legacy file rewrites it in the current layout instead of appending."""
+    history_file = tmp_path / "history.csv"
+    history_file.write_text("Calculation\nAdded 1.0 + 2.0 = 3.0\nSomething else\n", encoding="utf-8")
+    facade = HistoryFacade(str(history_file), save_mode="journal")
+    if load_first:
+        facade.load_history()
+    facade.add_record("add", 2.0, 3.0, 5.0)
+    facade.save_history()
+    assert history_file.read_text(encoding="utf-8").startswith("operation,a,b,result,timestamp,note\n")
+    assert HistoryFacade(str(history_file)).rendered_entries() == [
+        "Added 1.0 + 2.0 = 3.0", "Something else", "Added 2.0 + 3.0 = 5.0"]
+    facade.add_record("add", 1, 1, 2)
+    facade.save_history()  # Now journaled
+    assert HistoryFacade(str(history_file)).rendered_entries()[-1] == "Added 1 + 1 = 2"
+
+
+@pytest.mark.parametrize("history_name", ["history.csv", "history"])
+def test_journal_save_after_reopening_appends_only_new_rows(tmp_path, history_name):
+    """Test that the first journal save of a new session appends to the stored history instead of repeating it."""
+    history_file = str(tmp_path / history_name)
+    facade = HistoryFacade(history_file, save_mode="journal")
+    for value in range(3):
+        facade.add_record("add", value, 1, value + 1)
+    facade.save_history()
+    reopened = HistoryFacade(history_file, save_mode="journal")
+    reopened.add_record("add", 3, 1, 4)
+    reopened.save_history()
+    assert [entry.split()[1] for entry in HistoryFacade(history_file).rendered_entries()] == ["0", "1", "2", "3"]
+
+
+def test_unknown_operation_in_csv_history_is_rejected(tmp_path):
+    """Test that a row with an unknown operation raises instead of loading as an empty note."""
+    history_file = tmp_path / "history.csv"
+    history_file.write_text("operation,a,b,result,timestamp,note\nadd,1,2,3,0,\npower,1,2,1,0,\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="Unknown operation 'power' in history row 1."):
+        HistoryFacade(str(history_file)).rendered_entries()
+
+
+def test_binary_backend_is_memory_mapped(tmp_path):
+    """Test that the binary backend journals records and reopens them memory-mapped."""
+    history_dir = str(tmp_path / "history")
+    facade = HistoryFacade(history_dir, save_mode="journal")
+    facade.add_record("add", 1, 2, 3)
+    facade.add_entry("A note")
+    facade.save_history()
+    facade.add_record("multiply", 2.5, 2.0, 5.0)
+    facade.save_history()
+
+    reopened = HistoryFacade(history_dir)
+    assert not reopened._loaded  # pylint: disable=protected-access
+    assert reopened.rendered_entries(1) == ["A note", "Multiplied 2.5 * 2.0 = 5.0"]
+    assert isinstance(reopened._base, np.memmap)  # pylint: disable=protected-access
+    assert reopened.delete_entry(0) == "Deleted record: Added 1 + 2 = 3"
+    reopened.save_history()
+    assert HistoryFacade(history_dir).rendered_entries() == ["A note", "Multiplied 2.5 * 2.0 = 5.0"]
+
+def test_csv_import_and_export(tmp_path):
+    """Test exporting a binary history to CSV and importing it into another history."""
+    source = HistoryFacade(str(tmp_path / "history"))
+    source.add_record("subtract", 5, 3, 2)
+    source.add_entry("Exported note")
+    source.export_csv(str(tmp_path / "export.csv"))
+
+    target = HistoryFacade(str(tmp_path / "target.csv"))
+    target.add_entry("Existing note")
+    assert target.import_csv(str(tmp_path / "export.csv")) == 2
+    assert target.rendered_entries() == ["Existing note", "Subtracted 5 - 3 = 2", "Exported note"]
+
+def test_history_pages(history_facade_fixture):
+    """Test that the history is rendered one page at a time."""
+    for i in range(5):
+        history_facade_fixture.add_record("multiply", i, 2, i * 2)
+    pages = list(history_facade_fixture.history_pages(1, 4, page_size=2))
+    assert pages == ["     1  Multiplied 1 * 2 = 2\n     2  Multiplied 2 * 2 = 4", "     3  Multiplied 3 * 2 = 6"]
+
+def test_load_history_pages_streams_csv(tmp_path):
+    """Test that loading a CSV history streams it in chunks and keeps the loaded rows."""
+    history_file = str(tmp_path / "history.csv")
+    facade = HistoryFacade(history_file)
+    for i in range(5):
+        facade.add_record("add", i, i, i + i)
+    facade.add_entry("Last note")
+    facade.save_history()
+
+    reloaded = HistoryFacade(history_file)
+    pages = list(reloaded.load_history_pages(page_size=4))
+    assert len(pages) == 2
+    assert pages[1] == "     4  Added 4 + 4 = 8\n     5  Last note"
+    assert len(reloaded) == 6
+    reloaded.add_entry("Last note")
+    assert reloaded.rendered_entries(-2) == ["Last note", "Last note"]
+
+def test_batch_operations(calc_fixture):
+    """Test the vectorized batch operations and their bulk history insert."""
+    assert list(calc_fixture.add_many([1, 2], [3, 4])) == [4, 6]
+    assert list(calc_fixture.subtract_many([1.5, 2.0], 1.0)) == [0.5, 1.0]
+    assert list(calc_fixture.multiply_many([2, 3], [4, 5])) == [8, 15]
+    assert list(calc_fixture.divide_many([1, 6], [4, 3])) == [0.25, 2.0]
+    assert calc_fixture.history_facade.rendered_entries(0, 3) == [
+        "Added 1 + 3 = 4", "Added 2 + 4 = 6", "Subtracted 1.5 - 1.0 = 0.5"]
+    assert calc_fixture.history_facade.rendered_entries(-1) == ["Divided 6 / 3 = 2.0"]
+
+def test_batch_divide_by_zero_policies(calc_fixture):
+    """Test the raise, nan and skip policies for division by zero."""
+    with pytest.raises(ValueError, match="Cannot divide by zero."):
+        calc_fixture.divide_many([1, 2], [0, 1])
+    assert len(calc_fixture.history_facade) == 0
+    result = calc_fixture.divide_many([1, 2, 3], [0, 1, 2], zero_division="nan")
+    assert np.isnan(result[0]) and list(result[1:]) == [2.0, 1.5]
+    assert list(calc_fixture.divide_many([1, 2], [0, 4], zero_division="skip")) == [0.5]
+    assert len(calc_fixture.history_facade) == 3
+    with pytest.raises(ValueError, match="Unknown zero division policy"):
+        calc_fixture.divide_many([1], [1], zero_division="ignore")
+
+def test_bulk_deletes_use_tombstones(tmp_path):
+    """Test range, multi-row and predicate deletes over stored and added rows, before and after a save."""
+    history_dir = str(tmp_path / "history")
+    facade = HistoryFacade(history_dir, save_mode="journal")
+    facade.add_records("add", np.arange(1000.0), np.ones(1000), np.arange(1000.0) + 1)
+    facade.save_history()
+    facade = HistoryFacade(history_dir, save_mode="journal")  # Rows 0-999 memory-mapped
+    facade.add_records("divide", np.array([1.0, -1.0, -2.0]), np.ones(3), np.array([1.0, -1.0, -2.0]))
+    assert facade.delete_entries(np.arange(10, 501)) == 491
+    assert facade.delete_entries([0, 2, 2]) == 2
+    assert len(facade) == 510 and facade.rendered_entries(0, 2) == ["Added 1.0 + 1.0 = 2.0", "Added 3.0 + 1.0 = 4.0"]
+    assert facade.rendered_entries(8, 9) == ["Added 501.0 + 1.0 = 502.0"]
+    assert facade.delete_where(operation="divide", result=Range(high=0, high_inclusive=False)) == 2
+    assert facade.rendered_entries(-1) == ["Divided 1.0 / 1.0 = 1.0"]
+    assert facade.query(operation="add")["count"] == 507
+    with pytest.raises(ValueError, match="Invalid index 509"):
+        facade.delete_entries([0, 509])
+    facade.save_history()
+    reloaded = HistoryFacade(history_dir).records
+    assert len(reloaded) == 508
+    assert reloaded["a"][:9].tolist() == [1, 3, 4, 5, 6, 7, 8, 9, 501]
+
+def test_tombstones_compact_lazily(tmp_path):
+    """Test that tombstoned rows are dropped once they are the majority, and that unsaved ones stay journaled."""
+    history_file = tmp_path / "history.csv"
+    facade = HistoryFacade(str(history_file), save_mode="journal")
+    for i in range(10):
+        facade.add_record("add", i, 0, i)
+    facade.save_history()
+    for i in range(10, 20):
+        facade.add_record("add", i, 0, i)
+    facade.delete_entries([12, 15])
+    assert facade._deleted_count == 2  # pylint: disable=protected-access
+    facade.save_history()  # Only unsaved rows were deleted: journaled, no rewrite needed
+    assert facade._deleted_count == 0 and not facade._needs_compaction  # pylint: disable=protected-access
+    assert [record["a"] for record in HistoryFacade(str(history_file)).records] == [
+        i for i in range(20) if i not in (12, 15)]
+    facade.delete_entries(range(10))
+    assert facade._deleted_count == 0 and len(facade._records) == 8  # pylint: disable=protected-access
+    assert facade.rendered_entries(0, 1) == ["Added 10 + 0 = 10"]
@@ -0,0 +1,132 @@
+"""Tests for running plugin commands as jobs with timeouts and cancellation."""
+import inspect
+import threading
+import time
+import pytest
+from app import App
+from commands import Command, CommandError, CommandSpec
+from commands.executor import CANCELLED, DONE, FAILED, TIMED_OUT, PluginExecutor, check_cancelled
+
+SLOW_PLUGIN = '''import time
+from commands import Command
+
+
+class SlowPlugin(Command):
+    command_name = "slow"
+
+    @staticmethod
+    def execute(seconds: float):
+        time.sleep(seconds)
+        print("slept")
+'''
+
+
+def plugin_spec(name, execute):
+    """Return the dispatch table entry of a plugin whose execute method is ``execute``."""
+    plugin = type(f"{name.title()}Plugin", (Command,), {"command_name": name, "execute": staticmethod(execute)})
+    return CommandSpec(name, plugin.execute, inspect.signature(plugin.execute).parameters.values(), plugin=True)
+
+
+def spin(seconds: float):
+    """Busy plugin that stops when its job is cancelled."""
+    print("spinning")
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        check_cancelled()
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def jobs_app(monkeypatch):
+    """An app running plugins in threads, with a blocking ``block`` and a cooperative ``spin`` plugin."""
+    monkeypatch.setenv("plugin_executor", "thread")
+    monkeypatch.setenv("plugin_timeout_spin", "0.2")
+    app = App()
+    release = threading.Event()
+    monkeypatch.setattr(app.command_handler, "specs", {
+        "block": plugin_spec("block", lambda word: print(word) if release.wait(5) else None),
+        "spin": plugin_spec("spin", spin)})
+    app.build_dispatch_table()
+    app.release = release
+    return app
+
+
+def test_background_jobs_run_alongside_calculations(jobs_app, capsys):
+    """Test bg, jobs and wait while an ordinary calculation runs in the foreground."""
+    jobs_app.execute("bg block hello")
+    jobs_app.execute("add 1 2")
+    jobs_app.execute("jobs")
+    jobs_app.execute("wait 1 0.05")
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[:2] == ["[1] block hello", "Result: 3.0"]
+    assert lines[2].startswith("[1] running") and lines[3].startswith("[1] running")
+    jobs_app.release.set()
+    jobs_app.execute("wait 1")
+    assert capsys.readouterr().out == "hello\n"
+    assert not jobs_app.jobs
+    with pytest.raises(CommandError, match="No such job: 1."):
+        jobs_app.execute("wait 1")
+    with pytest.raises(CommandError, match="Only plugin commands"):
+        jobs_app.execute("bg add 1 2")
+
+
+def test_timeouts_and_cancellation(jobs_app, capsys):
+    """Test that a plugin over its timeout is stopped and that a background job can be cancelled."""
+    with pytest.raises(CommandError, match=r"Failed to execute 'spin'. Timed out after 0.2 seconds."):
+        jobs_app.execute("spin 5")
+    jobs_app.execute("bg block bye")
+    jobs_app.execute("cancel 1")
+    assert "cancelled" in capsys.readouterr().out
+    with pytest.raises(CommandError, match="Cancelled."):
+        jobs_app.execute("wait 1")
+    jobs_app.release.set()
+
+
+def test_timeouts_apply_to_inline_plugins(jobs_app, monkeypatch, capsys):
+    """Test that an inline plugin with a timeout runs as a job, and one without runs in the calling thread."""
+    monkeypatch.setattr(jobs_app, "plugins_inline", True)
+    with pytest.raises(CommandError, match=r"Timed out after 0.2 seconds."):
+        jobs_app.execute("spin 5")
+    jobs_app.release.set()
+    jobs_app.execute("block inline")
+    assert capsys.readouterr().out.endswith("inline\n")
+
+
+def test_executor_limits_running_jobs():
+    """Test that jobs beyond the worker count wait in the queue and that failures are reported."""
+    executor = PluginExecutor("thread", workers=1)
+    release = threading.Event()
+    first = executor.submit(plugin_spec("block", lambda: release.wait(5)), [])
+    second = executor.submit(plugin_spec("fail", lambda: 1 / 0), [])
+    assert not second.wait(0.1) and second.state == "queued"
+    release.set()
+    assert first.wait(5) and second.wait(5)
+    assert (first.state, second.state, second.error) == (DONE, FAILED, "division by zero")
+    queued = executor.submit(plugin_spec("spin", spin), [5.0], timeout=0.1)
+    assert queued.wait(5) and queued.state == TIMED_OUT
+
+
+def test_abandoned_threads_free_their_slot():
+    """Test that a timed-out job whose thread is still running does not hold up the next job."""
+    executor = PluginExecutor("thread", workers=1)
+    release = threading.Event()
+    hung = executor.submit(plugin_spec("block", lambda: release.wait(5)), [], timeout=0.1)
+    after = executor.submit(plugin_spec("quick", lambda: print("ran")), [], timeout=0.1)
+    assert after.wait(2) and (hung.state, after.state, after.output) == (TIMED_OUT, DONE, "ran\n")
+    release.set()
+
+
+def test_process_jobs_are_terminated(monkeypatch, tmp_path):
+    """Test that process mode runs plugins in a child process and kills a cancelled one."""
+    (tmp_path / "slow_plugins").mkdir()
+    (tmp_path / "slow_plugins" / "slow.py").write_text(SLOW_PLUGIN, encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    executor = PluginExecutor("process", workers=2)
+    spec = CommandSpec("slow", None, [], plugin=True, source=("slow_plugins.slow", "SlowPlugin"))
+    quick = executor.submit(spec, [0.0])
+    slow = executor.submit(spec, [30.0])
+    assert quick.wait(30) and (quick.state, quick.output) == (DONE, "slept\n")
+    start = time.perf_counter()
+    assert slow.cancel() and slow.state == CANCELLED
+    assert executor.submit(spec, [30.0], timeout=0.2).wait(30)
+    assert time.perf_counter() - start < 10
@@ -0,0 +1,49 @@
+"""Tests for compiled expressions."""
+import numpy as np
+import pytest
+from calculator.calculator import Calculator
+from calculator.expression import compile_expression
+from calculator.history import HistoryFacade
+
+
+@pytest.fixture
+def calculator():
+    """Provide a calculator with an in-memory history."""
+    return Calculator(HistoryFacade(backend="memory"))
+
+
+def test_compile_is_cached():
+    """Test that an expression is parsed once and reused by its text."""
+    compiled = compile_expression("(3 + 4) * 2 / x")
+    assert compile_expression("(3 + 4) * 2 / x") is compiled
+    assert compiled.variables == ["x"]
+    assert compiled.evaluate({"x": 4}) == 3.5
+
+
+@pytest.mark.parametrize("text", ["__import__('os')", "x ** 2", "1 +", "a.b", "'1' + 2"])
+def test_rejects_unsupported_expressions(text):
+    """Test that only arithmetic on numbers and names compiles."""
+    with pytest.raises(ValueError):
+        compile_expression(text)
+
+
+def test_evaluate_records_each_operation(calculator):
+    """Test scalar evaluation and its history records."""
+    assert calculator.evaluate("-(3 + 4) * 2 / x", {"x": 7}) == -2.0
+    assert calculator.history_facade.rendered_entries() == [
+        "Added 3 + 4 = 7", "Multiplied -7 * 2 = -14", "Divided -14 / 7 = -2.0"]
+    with pytest.raises(ValueError, match="No value given for y."):
+        calculator.evaluate("x + y", {"x": 1})
+    with pytest.raises(ValueError, match="Cannot divide by zero."):
+        calculator.evaluate("1 + 1 / x", {"x": 0})
+    assert len(calculator.history_facade) == 3
+
+
+def test_evaluate_over_arrays(calculator):
+    """Test one vectorized pass over arrays of bindings."""
+    result = calculator.evaluate("(x + 1) * y", {"x": [1, 2, 3], "y": 2})
+    assert list(result) == [4, 6, 8]
+    assert len(calculator.history_facade) == 6
+    assert calculator.history_facade.rendered_entries(-1) == ["Multiplied 4 * 2 = 8"]
+    with pytest.raises(ValueError, match="Cannot divide by zero."):
+        calculator.evaluate("1 / x", {"x": np.array([1.0, 0.0])})
@@ -0,0 +1,64 @@
+"""Tests for queue-based logging."""
+import logging
+import pytest
+from logging_pipeline import BatchingFileHandler, SamplingFilter, start_queue_logging, stop_queue_logging
+
+
+def make_record(level=logging.INFO, lineno=1, created=0.0):
+    """Create a log record from a given call site and time."""
+    record = logging.LogRecord("root", level, "calculator.py", lineno, "Added %s", (1,), None)
+    record.created = created
+    return record
+
+
+def test_sampling_filter():
+    """Test sampling per call site, rate limiting and that warnings always pass."""
+    sampling = SamplingFilter(sample_rate=3)
+    assert [sampling.filter(make_record()) for _ in range(7)] == [True, False, False, True, False, False, True]
+    assert sampling.filter(make_record(lineno=2))
+    assert all(sampling.filter(make_record(logging.WARNING)) for _ in range(5))
+    limited = SamplingFilter(rate_limit=2)
+    assert [limited.filter(make_record(created=10.5)) for _ in range(3)] == [True, True, False]
+    assert limited.filter(make_record(created=11.0))
+    assert sampling.dropped == 4 and limited.dropped == 1
+
+
+def test_batching_file_handler(tmp_path):
+    """Test that records are written in batches and on flush."""
+    path = tmp_path / "batch.log"
+    handler = BatchingFileHandler(str(path), batch_size=3, flush_interval=60)
+    for lineno in range(4):
+        handler.emit(make_record(lineno=lineno))
+    assert path.read_text(encoding="utf-8") == "Added 1\n" * 3
+    handler.emit(make_record(logging.ERROR))
+    assert path.read_text(encoding="utf-8").count("\n") == 5
+    handler.emit(make_record())
+    handler.close()
+    assert path.read_text(encoding="utf-8").count("\n") == 6
+
+
+def test_queue_logging_round_trip(tmp_path, monkeypatch):
+    """Test that queued records reach a batched log file by the time logging stops."""
+    root = logging.getLogger()
+    path = tmp_path / "queued.log"
+    monkeypatch.setattr(root, "handlers", [logging.FileHandler(str(path))])
+    monkeypatch.setattr(root, "level", logging.INFO)
+    start_queue_logging(sample_rate=2, batch_size=100)
+    try:
+        assert isinstance(root.handlers[0], logging.handlers.QueueHandler)
+        for value in range(10):
+            logging.info("Added %s", value)
+    finally:
+        stop_queue_logging()
+    text = path.read_text(encoding="utf-8")
+    assert "Added 0\nAdded 2\nAdded 4\nAdded 6\nAdded 8\n" in text
+    assert "Dropped 5 INFO log records" in text
+    assert isinstance(root.handlers[0], BatchingFileHandler)
+    root.handlers[0].close()
+
+
+@pytest.fixture(autouse=True)
+def no_listener_left():
+    """Make sure no test leaves the listener running."""
+    yield
+    stop_queue_logging()
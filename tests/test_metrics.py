@@ -0,0 +1,67 @@
+"""Tests for the latency metrics registry and its exports."""
+import json
+from calculator import metrics
+
+
+def test_histogram_percentiles():
+    """Test that percentiles come from the bucket holding them and that errors are counted."""
+    histogram = metrics.LatencyHistogram()
+    for _ in range(90):
+        histogram.record(10e-6)
+    for _ in range(10):
+        histogram.record(0.5, error=True)
+    summary = histogram.summary()
+    assert (summary["count"], summary["errors"]) == (100, 10)
+    assert abs(summary["mean"] - (90 * 10e-6 + 5) / 100) < 1e-12
+    assert 10e-6 <= summary["p50"] < 10e-6 * 1.19
+    assert 0.5 <= summary["p95"] < 0.5 * 1.19
+    assert summary["p99"] == summary["p95"]
+
+
+def test_histogram_folds_many_samples():
+    """Test that samples beyond the fold size are all counted."""
+    histogram = metrics.LatencyHistogram()
+    for index in range(metrics.FOLD_SIZE * 3 + 5):
+        histogram.record(index * 1e-6)
+    assert len(histogram._samples) < metrics.FOLD_SIZE  # pylint: disable=protected-access
+    assert histogram.summary()["count"] == metrics.FOLD_SIZE * 3 + 5
+    assert histogram.counts.sum() == metrics.FOLD_SIZE * 3 + 5
+
+
+def test_timed_records_calls_and_failures(monkeypatch):
+    """Test the timed decorator and turning metrics off."""
+    registry = metrics.MetricsRegistry()
+    monkeypatch.setattr(metrics, "registry", registry)
+
+    @metrics.timed("test.divide")
+    def divide(a, b):
+        return a / b
+
+    assert divide(6, 3) == 2
+    try:
+        divide(1, 0)
+    except ZeroDivisionError:
+        pass
+    registry.enabled = False
+    divide(1, 1)
+    assert {key: registry.snapshot()["test.divide"][key] for key in ("count", "errors")} == {"count": 2, "errors": 1}
+
+
+def test_export_formats(monkeypatch, tmp_path):
+    """Test the JSON and Prometheus exports and the periodic exporter."""
+    registry = metrics.MetricsRegistry()
+    monkeypatch.setattr(metrics, "registry", registry)
+    registry.record("command.add", 3e-6)
+    registry.record("command.add", 2.0, error=True)
+    text = registry.to_prometheus()
+    assert "# TYPE calculator_latency_seconds histogram" in text
+    assert 'calculator_latency_seconds_bucket{operation="command.add",le="4e-06"} 1' in text
+    assert 'calculator_latency_seconds_bucket{operation="command.add",le="+Inf"} 2' in text
+    assert 'calculator_latency_seconds_count{operation="command.add"} 2' in text
+    assert 'calculator_errors_total{operation="command.add"} 1' in text
+    metrics.start_exporter(str(tmp_path / "metrics.json"), interval=3600)
+    metrics.stop_exporter()  # Writes once more on stop
+    document = json.loads((tmp_path / "metrics.json").read_text(encoding="utf-8"))
+    assert document["operations"]["command.add"]["count"] == 2
+    registry.write(str(tmp_path / "metrics.prom"))
+    assert (tmp_path / "metrics.prom").read_text(encoding="utf-8") == text
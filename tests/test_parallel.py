@@ -0,0 +1,39 @@
+"""Tests for running command batches in a process pool."""
+from calculator.history import HistoryFacade
+from parallel import ParallelRunner
+
+
+def test_parallel_runner_keeps_input_order():
+    """Test that results and history records come back in input order around barrier lines."""
+    history = HistoryFacade(backend="memory")
+    inline = []
+
+    def run_inline(cmd_input):
+        inline.append((cmd_input, len(history)))
+        return "failed" if cmd_input == "bad" else None
+
+    lines = ["add 1 1", "multiply 2 3", "divide 1 0", "subtract 9 4", "bad", "add 2 2", "exit", "add 3 3"]
+    results = list(ParallelRunner(workers=2, chunk_size=2).run(enumerate(lines, 1), run_inline, history))
+    assert results == [
+        (1, "Result: 2.0", None),
+        (2, "Result: 6.0", None),
+        (3, None, "Cannot divide by zero."),
+        (4, "Result: 5.0", None),
+        (5, None, "failed"),
+        (6, "Result: 4.0", None),
+    ]
+    assert inline == [("bad", 3)]  # Barrier lines see every earlier calculation
+    assert history.rendered_entries() == [
+        "Added 1.0 + 1.0 = 2.0", "Multiplied 2.0 * 3.0 = 6.0", "Subtracted 9.0 - 4.0 = 5.0", "Added 2.0 + 2.0 = 4.0"]
+
+
+def test_parallel_runner_stops_early():
+    """Test that only the records of consumed lines are merged when the caller stops."""
+    history = HistoryFacade(backend="memory")
+    results = ParallelRunner(workers=2, chunk_size=3).run(
+        enumerate(["add 1 1", "add x 1", "add 2 2", "add 3 3"], 1), lambda cmd_input: None, history)
+    for _, _, error in results:
+        if error:
+            break
+    results.close()
+    assert history.rendered_entries() == ["Added 1.0 + 1.0 = 2.0"]
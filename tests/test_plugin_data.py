@@ -1,6 +1,11 @@
 """Test cases for the DataPlugin execute method."""
+import itertools
 import logging
-from plugins.data import DataPlugin
+import threading
+import pytest
+from commands import CommandSpec
+from commands.executor import TIMED_OUT, PluginExecutor
+from plugins.data import DataPlugin, parse_arguments, select_rows
 
 # Test case for successfully reading the CSV file
 def test_data_plugin_execute_success(monkeypatch, capfd, caplog, tmpdir):
@@ -65,3 +70,38 @@ def test_data_plugin_execute_exception(monkeypatch, capfd, caplog):
 
         # Verify the log output
         assert "Error reading CSV file /" in caplog.text
+
+
+def test_data_plugin_projection_filters_and_paging(monkeypatch, capfd, tmpdir):
+    """Test column projection, equality/prefix/range filters, limit and offset."""
+    test_csv = tmpdir.join("books.csv")
+    test_csv.write("Title,Author,Year\nThe Great Gatsby,Fitzgerald,1925\n1984,Orwell,1949\n"
+                   "The Hobbit,Tolkien,1937\nThe Road,McCarthy,2006\n")
+    monkeypatch.setenv("books_file_path", str(test_csv))
+    DataPlugin.execute("Title^=The", "Year<2000", "columns=Year,Title")
+    assert capfd.readouterr().out == "Year | Title\n1925 | The Great Gatsby\n1937 | The Hobbit\n"
+    DataPlugin.execute("Year>=1930", "offset=1", "limit=1")
+    assert capfd.readouterr().out == "Title | Author | Year\nThe Hobbit | Tolkien | 1937\n"
+    DataPlugin.execute("Author=Orwell", f"out={tmpdir.join('out.csv')}")
+    assert capfd.readouterr().out == f"Wrote 1 rows to {tmpdir.join('out.csv')}.\n"
+    assert tmpdir.join("out.csv").read() == "Title,Author,Year\n1984,Orwell,1949\n"
+    for args in (["Pages>100"], ["limit=-1"], ["columns=Title,Pages"], ["nonsense"]):
+        with pytest.raises(ValueError):
+            DataPlugin.execute(*args)
+
+
+def test_data_scan_stops_when_its_job_times_out():
+    """Test that a filter matching nothing is still checked for cancellation as rows are scanned."""
+    stopped = threading.Event()
+
+    def scan():
+        _, filters = parse_arguments(("Title=nomatch",))
+        _, rows = select_rows(itertools.repeat(["The Hobbit"]), ["Title"], {}, filters)
+        try:
+            for _ in rows:
+                pass
+        finally:
+            stopped.set()
+    job = PluginExecutor("thread", workers=1).submit(CommandSpec("scan", scan, [], plugin=True), [], timeout=0.05)
+    assert job.wait(5) and job.state == TIMED_OUT
+    assert stopped.wait(5)
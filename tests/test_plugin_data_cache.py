@@ -0,0 +1,81 @@
+"""Test cases for the data plugin's table cache."""
+import os
+import tracemalloc
+from plugins import data
+from plugins._table_cache import Table, TableCache
+
+BOOKS = "ISBN,Title,Author\n978-1,The Hobbit,Tolkien\n978-2,1984,Orwell\n978-3,Emma\n"
+
+
+def test_table_cache_indexes_and_invalidation(tmpdir):
+    """Test index lookups, short rows and invalidation when the file changes."""
+    books = tmpdir.join("books.csv")
+    books.write(BOOKS)
+    cache = TableCache(index_columns=["ISBN"])
+    table = cache.get(str(books))
+    assert cache.get(str(books)) is table
+    assert list(table.rows(table.lookup("ISBN", "978-2"))) == [("978-2", "1984", "Orwell")]
+    assert table.lookup("ISBN", "978-9") == [] and table.lookup("Title", "Emma") is None
+    assert list(table.rows())[2] == ("978-3", "Emma", "")
+    books.write(BOOKS + "978-4,Dune,Herbert\n")
+    assert cache.get(str(books)).lookup("ISBN", "978-4") == [3]
+
+
+def test_table_cache_memory_cap(tmpdir):
+    """Test that least recently used tables are evicted and large files are not cached."""
+    paths = []
+    for name in ("a", "b", "c"):
+        paths.append(str(tmpdir.join(f"{name}.csv")))
+        tmpdir.join(f"{name}.csv").write(BOOKS)
+    one_table = TableCache().get(paths[0]).nbytes
+    cache = TableCache(max_bytes=2 * one_table)
+    cache.get(paths[0])
+    cache.get(paths[1])
+    cache.get(paths[0])
+    cache.get(paths[2])
+    assert paths[0] in cache and paths[1] not in cache and paths[2] in cache
+    assert cache.nbytes == 2 * one_table
+    assert TableCache(max_bytes=os.path.getsize(paths[0]) - 1).get(paths[0]) is None
+
+
+def test_table_cache_counts_a_file_cached_twice_once(monkeypatch, tmpdir):
+    """Test that two misses on the same file, as from two threads, leave one table's bytes counted."""
+    books = tmpdir.join("books.csv")
+    books.write(BOOKS)
+    cache = TableCache()
+    read = Table.read
+    racing = []
+
+    def read_while_another_misses(*args, **kwargs):
+        if not racing:
+            racing.append(None)
+            racing.append(cache.get(str(books)))  # The other thread's miss, finishing first
+        return read(*args, **kwargs)
+    monkeypatch.setattr(Table, "read", read_while_another_misses)
+    table = cache.get(str(books))
+    assert cache.nbytes == table.nbytes == racing[1].nbytes
+
+
+def test_table_cache_stops_parsing_over_the_cap(tmpdir):
+    """Test that a small file that parses into a large table is given up on before it is read in full."""
+    numbers = tmpdir.join("numbers.csv")
+    numbers.write("a,b,c\n" + "".join(f"{row},{row},{row}\n" for row in range(100000, 120000)))
+    cache = TableCache(max_bytes=200000)
+    tracemalloc.start()
+    try:
+        assert cache.get(str(numbers)) is None
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < 2000000 and str(numbers) not in cache
+
+
+def test_data_plugin_uses_index(monkeypatch, capfd, tmpdir):
+    """Test that data answers key lookups from the cached table."""
+    books = tmpdir.join("books.csv")
+    books.write(BOOKS)
+    monkeypatch.setattr(data, "_table_cache", TableCache(index_columns=["ISBN"]))
+    monkeypatch.setenv("books_file_path", str(books))
+    data.DataPlugin.execute("ISBN=978-1", "columns=Title")
+    assert capfd.readouterr().out == "Title\nThe Hobbit\n"
+    assert str(books) in data.table_cache()
@@ -0,0 +1,108 @@
+"""Tests for lazy plugin loading through the cached plugin manifest."""
+import os
+import sys
+import time
+import pytest
+from app import App
+from commands import CommandHandlerFactory
+from commands import manifest
+
+PLUGIN_SOURCE = '''
+from commands import Command
+
+class EchoPlugin(Command):
+    command_name = "{name}"
+
+    @staticmethod
+    def execute(text, times: int = 1):
+        print(text * times)
+'''
+
+
+@pytest.fixture
+def plugins_directory(tmp_path, monkeypatch):
+    """Provide an importable plugins package and a factory with no commands registered."""
+    directory = tmp_path / "lazy_plugins"
+    directory.mkdir()
+    (directory / "__init__.py").write_text("", encoding="utf-8")
+    (directory / "echo.py").write_text(PLUGIN_SOURCE.format(name="echo"), encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    factory = CommandHandlerFactory()
+    monkeypatch.setattr(factory, "commands", {})
+    monkeypatch.setattr(factory, "specs", {})
+    monkeypatch.setattr(factory, "plugin_files", {})
+    monkeypatch.setattr(factory, "poll_interval", 0)
+    monkeypatch.setattr(factory, "next_poll", 0.0)
+    yield directory
+    for module in ("lazy_plugins", "lazy_plugins.echo", "lazy_plugins.loud"):
+        sys.modules.pop(module, None)
+
+
+def test_plugins_import_on_first_use(plugins_directory, capsys):
+    """Test that loading lists the commands without importing them."""
+    factory = CommandHandlerFactory()
+    factory.load_plugins(str(plugins_directory))
+    assert factory.list_plugins() == ["echo"]
+    assert "lazy_plugins.echo" not in sys.modules
+    assert os.path.exists(manifest.manifest_path(str(plugins_directory)))
+    spec = factory.specs["echo"]
+    assert (spec.min_args, spec.max_args) == (1, 2)
+    spec.handler(*spec.bind(["ab", "2"]))
+    assert "lazy_plugins.echo" in sys.modules and "echo" in factory.commands
+    spec.handler(*spec.bind(["c"]))
+    assert capsys.readouterr().out == "abab\nc\n"
+
+
+def test_manifest_is_cached_and_invalidated(plugins_directory, monkeypatch):
+    """Test that unchanged files are not parsed again and changed ones are."""
+    manifest.load_manifest(str(plugins_directory))
+    scanned = []
+    original_scan = manifest.scan_plugin
+    monkeypatch.setattr(manifest, "scan_plugin", lambda *args: scanned.append(args) or original_scan(*args))
+    assert [entry["command_name"] for entry in manifest.load_manifest(str(plugins_directory))] == ["echo"]
+    assert not scanned
+    (plugins_directory / "echo.py").write_text(PLUGIN_SOURCE.format(name="shout"), encoding="utf-8")
+    assert [entry["command_name"] for entry in manifest.load_manifest(str(plugins_directory))] == ["shout"]
+    assert len(scanned) == 1
+
+
+def test_reload_replaces_only_changed_plugins(plugins_directory, capsys):
+    """Test that a reload re-imports changed files, registers new ones and drops removed ones."""
+    factory = CommandHandlerFactory()
+    factory.load_plugins(str(plugins_directory))
+    factory.specs["echo"].handler("a")
+    old_specs, generation = factory.specs, factory.generation
+    assert factory.reload_plugins() == ([], [], [])
+    assert factory.specs is old_specs and factory.generation == generation
+    (plugins_directory / "echo.py").write_text(
+        PLUGIN_SOURCE.format(name="echo").replace("text * times", "text.upper() * times"), encoding="utf-8")
+    (plugins_directory / "loud.py").write_text(PLUGIN_SOURCE.format(name="loud"), encoding="utf-8")
+    assert factory.reload_plugins() == (["loud"], ["echo"], [])
+    assert factory.specs is not old_specs and old_specs["echo"] is not factory.specs["echo"]
+    factory.specs["echo"].handler("b")
+    loud = factory.specs["loud"]
+    loud.handler("c")
+    (plugins_directory / "loud.py").unlink()
+    assert factory.reload_plugins(str(plugins_directory)) == ([], [], ["loud"])
+    assert factory.list_plugins() == ["echo"]
+    loud.handler("d")  # A dispatch table from before the reload still works
+    assert capsys.readouterr().out == "a\nB\nc\nd\n"
+
+
+def test_app_picks_up_plugin_changes(plugins_directory, monkeypatch, capsys):
+    """Test that commands see plugin changes after the poll interval and after reload_plugins."""
+    monkeypatch.setenv("plugin_file_path", str(plugins_directory))
+    monkeypatch.setenv("plugin_reload_interval", "0.01")
+    app = App()
+    app.load_plugins()
+    (plugins_directory / "loud.py").write_text(PLUGIN_SOURCE.format(name="loud"), encoding="utf-8")
+    time.sleep(0.02)
+    app.execute("loud hi 2")
+    assert capsys.readouterr().out.endswith("hihi\n")
+    assert "loud" in app.menu
+    (plugins_directory / "echo.py").unlink()
+    time.sleep(0.02)  # A poll is due, but reload_plugins reports the change itself
+    app.execute("reload_plugins")
+    app.execute("reload_plugins")
+    assert capsys.readouterr().out.endswith("Removed: echo\nPlugins are up to date.\n")
+    assert "echo" not in app.dispatch_table
@@ -0,0 +1,55 @@
+"""Tests for indexed history queries."""
+import pytest
+from calculator.history import HistoryFacade
+from calculator.query import Range, parse_query
+
+
+@pytest.fixture
+def facade(tmp_path):
+    """Provide a history with a mix of operations."""
+    history = HistoryFacade(str(tmp_path / "history.csv"))
+    history.add_record("add", 1, 2, 3)
+    history.add_record("divide", -6, 3, -2.0)
+    history.add_entry("A note")
+    history.add_record("divide", 6, 3, 2.0)
+    history.add_record("multiply", 4, 5, 20)
+    return history
+
+
+def test_query_by_operation_and_result(facade):
+    """Test filtering by operation and by result range."""
+    assert facade.query(operation="divide")["count"] == 2
+    summary = facade.query(operation="divide", result=Range().restrict("<", 0))
+    assert summary["count"] == 1 and summary["sum"] == -2.0
+    summary = facade.query(result=Range(2, 20, high_inclusive=False))
+    assert summary["by_operation"] == {"add": 1, "divide": 1}
+    assert summary["min"] == 2.0 and summary["max"] == 3.0
+
+
+def test_query_sees_new_and_deleted_rows(facade):
+    """Test that the index follows appends and deletions."""
+    assert facade.query(a=Range().restrict(">=", 4))["count"] == 2
+    facade.add_record("add", 10, 10, 20)
+    assert facade.query(result=Range().restrict("=", 20))["count"] == 2
+    facade.delete_entry(4)
+    summary = facade.query(result=Range().restrict("=", 20))
+    assert summary["by_operation"] == {"add": 1}
+
+
+def test_query_time_window(facade):
+    """Test filtering by timestamp."""
+    assert facade.query(timestamp=Range().restrict(">=", 0))["count"] == 4
+    assert facade.query(timestamp=Range().restrict("<", 0))["count"] == 0
+
+
+def test_parse_query():
+    """Test parsing of history_query filters."""
+    filters = parse_query(["op=divide", "result>=1", "result<5", "since=1970-01-02"])
+    assert filters["operation"] == "divide"
+    assert (filters["result"].low, filters["result"].high) == (1.0, 5.0)
+    assert not filters["result"].high_inclusive
+    assert filters["timestamp"].low > 0
+    with pytest.raises(ValueError, match="Invalid filter"):
+        parse_query(["colour=red"])
+    with pytest.raises(ValueError, match="Invalid operation"):
+        parse_query(["op=modulo"])
@@ -0,0 +1,148 @@
+"""Tests for the asyncio calculator server, using local clients only."""
+import asyncio
+import inspect
+import json
+import logging
+import threading
+import time
+import pytest
+from app import App
+from commands import Command, CommandSpec
+from server import CalculatorServer
+
+
+@pytest.fixture
+def app():
+    """Provide an App with per-command logging turned down."""
+    application = App()
+    logging.getLogger().setLevel(logging.WARNING)
+    yield application
+    logging.getLogger().setLevel(logging.INFO)
+
+
+def run(coroutine):
+    """Run a coroutine to completion."""
+    return asyncio.run(coroutine)
+
+
+async def start_server(app, **options):
+    """Start a server on a free local port and return it."""
+    server = CalculatorServer(app, **options)
+    await server.start("127.0.0.1", 0)
+    return server
+
+
+async def read_reply(reader):
+    """Read one reply: a JSON line, or plain-text lines up to the empty line ending them."""
+    reply = ""
+    while True:
+        line = (await reader.readline()).decode()
+        if line in ("", "\n"):
+            return reply
+        reply += line
+        if reply.startswith("{"):
+            return reply
+
+
+async def exchange(address, lines, replies):
+    """Send pipelined request lines and read the given number of replies."""
+    reader, writer = await asyncio.open_connection(*address[:2])
+    writer.write("".join(line + "\n" for line in lines).encode())
+    await writer.drain()
+    received = [await read_reply(reader) for _ in range(replies)]
+    writer.close()
+    await writer.wait_closed()
+    return received
+
+
+def test_pipelined_sessions(app):
+    """Test pipelined plain and JSON requests with separate histories per connection."""
+    async def scenario():
+        server = await start_server(app)
+        first, second = await asyncio.gather(
+            exchange(server.address, ["add 1 2", "divide 1 0", "history"], 3),
+            exchange(server.address, ['{"id": 7, "command": "multiply 2 3"}', '{"id": 8, "command": "history"}',
+                                      '{"id": 9, "command": "bogus"}', "not json {"], 4))
+        await server.close()
+        return first, second
+    first, second = run(scenario())
+    assert first == ["Result: 3.0\n", "Error: Cannot divide by zero.\n", "     0  Added 1.0 + 2.0 = 3.0\n"]
+    replies = [json.loads(line) for line in second[:3]]
+    assert replies[0] == {"id": 7, "output": "Result: 6.0\n", "error": None}
+    assert replies[1]["output"] == "     0  Multiplied 2.0 * 3.0 = 6.0\n"
+    assert replies[2] == {"id": 9, "output": "", "error": "No such command: bogus"}
+    assert second[3] == "Error: No such command: not\n"
+
+
+def test_connection_cap_and_exit(app):
+    """Test that connections over the cap are refused and exit closes the session."""
+    async def scenario():
+        server = await start_server(app, max_connections=1)
+        reader, writer = await asyncio.open_connection(*server.address[:2])
+        writer.write(b"add 2 2\n")
+        assert await reader.readline() == b"Result: 4.0\n" and await reader.readline() == b"\n"
+        refused = await exchange(server.address, [], 1)
+        writer.write(b"exit\n")
+        assert await reader.read() == b""
+        writer.close()
+        await asyncio.sleep(0.01)
+        accepted = await exchange(server.address, ["subtract 5 1"], 1)
+        await server.close()
+        return refused, accepted
+    assert run(scenario()) == (["Error: Too many connections.\n"], ["Result: 4.0\n"])
+
+
+
+def test_slow_commands_run_off_the_event_loop(app, monkeypatch, capsys):
+    """Test that a blocked command holds up only its own connection, and that every reply is terminated."""
+    release = threading.Event()
+    execute = staticmethod(lambda: print("released") if release.wait(5) else None)
+    block = type("BlockPlugin", (Command,), {"command_name": "block", "execute": execute})
+    parameters = inspect.signature(block.execute).parameters.values()
+    spec = CommandSpec("block", block.execute, parameters, plugin=True)
+    monkeypatch.setattr(app.command_handler, "specs", {"block": spec})
+
+    async def scenario():
+        server = await start_server(app)
+        blocked = asyncio.ensure_future(exchange(server.address, ["block"], 1))
+        other = await exchange(server.address, ["add 1 1", ""], 2)
+        assert not blocked.done()
+        release.set()
+        replies = other + await blocked
+        await server.close()
+        return replies
+    assert run(scenario()) == ["Result: 2.0\n", "", "released\n"]
+    assert "Result" not in capsys.readouterr().out  # Replies never reach the real stdout
+
+
+def test_warns_when_not_on_loopback(app, caplog):
+    """Test that listening on a non-loopback address is warned about."""
+    async def scenario():
+        server = CalculatorServer(app)
+        await server.start("0.0.0.0", 0)
+        await server.close()
+    with caplog.at_level(logging.WARNING):
+        run(scenario())
+    assert "not a loopback address" in caplog.text
+
+
+@pytest.mark.skipif(not hasattr(asyncio, "start_unix_server"), reason="Unix sockets not available")
+def test_unix_socket_throughput(app, tmp_path):
+    """Test serving over a Unix socket at thousands of small requests per second."""
+    path = str(tmp_path / "calc.sock")
+    count = 5000
+
+    async def scenario():
+        server = CalculatorServer(app)
+        await server.start(path=path)
+        reader, writer = await asyncio.open_unix_connection(path)
+        start = time.perf_counter()
+        writer.write(b"add 1 1\n" * count)
+        for _ in range(count):
+            assert await read_reply(reader) == "Result: 2.0\n"
+        elapsed = time.perf_counter() - start
+        writer.close()
+        await server.close()
+        return elapsed
+    elapsed = run(scenario())
+    assert count / elapsed > 1000
@@ -0,0 +1,72 @@
+"""Tests for the bounded in-memory history that spills to disk."""
+import os
+import tracemalloc
+import numpy as np
+from calculator.history import HistoryFacade
+from calculator.query import Range
+from calculator.records import RECORD_DTYPE
+from calculator.spill import SpillingRecordBuffer
+
+
+def test_spilling_buffer_keeps_one_logical_index(tmp_path):
+    """Test that records keep their order and index across segments and memory."""
+    buffer = SpillingRecordBuffer(10, str(tmp_path))
+    for i in range(25):
+        buffer.append(1, i, 0.0, i, i)
+    records = np.zeros(30, dtype=buffer.slice(0, 1).dtype)
+    records["a"] = np.arange(25, 55)
+    buffer.extend(records)
+    assert len(buffer) == 55 and len(buffer._memory) <= 10  # pylint: disable=protected-access
+    assert buffer.spilled == 50
+    assert buffer.view()["a"].tolist() == list(range(55))
+    assert buffer.slice(3, 27)["a"].tolist() == list(range(3, 27))
+    assert buffer.take(np.array([0, 9, 10, 31, 54]))["a"].tolist() == [0, 9, 10, 31, 54]
+    spill_path = buffer._directory.path  # pylint: disable=protected-access
+    buffer.clear()
+    assert len(buffer) == 0 and not os.path.exists(spill_path)
+
+
+def test_history_memory_limit(tmp_path):
+    """Test that a capped history shows, deletes, saves and loads spilled entries."""
+    history_file = str(tmp_path / "history.csv")
+    history = HistoryFacade(history_file, memory_limit=100, spill_dir=str(tmp_path / "spill"))
+    for i in range(1000):
+        history.add_record("add", i, 1, i + 1)
+    assert len(history._records._memory) <= 100  # pylint: disable=protected-access
+    assert len(history) == 1000
+    assert history.rendered_entries(0, 2) == ["Added 0 + 1 = 1", "Added 1 + 1 = 2"]
+    assert history.delete_entry(5) == "Deleted record: Added 5 + 1 = 6"
+    assert history.query()["count"] == 999
+    history.save_history()
+    reloaded = HistoryFacade(history_file, memory_limit=100, spill_dir=str(tmp_path / "spill"))
+    assert len(reloaded) == 999
+    assert reloaded._records.spilled and len(reloaded._records._memory) <= 100  # pylint: disable=protected-access
+    assert reloaded.rendered_entries(-1) == ["Added 999 + 1 = 1000"]
+    assert reloaded.records["a"].tolist() == [i for i in range(1000) if i != 5]
+
+
+def test_spilled_history_streams_saves_and_queries(tmp_path):
+    """Test that saving, querying, deleting and exporting a spilled history only hold a few chunks at a time."""
+    history = HistoryFacade(str(tmp_path / "history"), backend="binary", memory_limit=1000,
+                            spill_dir=str(tmp_path / "spill"))
+    for start in range(0, 60000, 1000):
+        values = np.arange(start, start + 1000, dtype=np.float64)
+        history.add_records("add", values, 1.0, values + 1)
+    size = 60000 * RECORD_DTYPE.itemsize
+    operations = (history.save_history,
+                  lambda: history.query(result=Range(10001)),
+                  lambda: history.delete_where(result=Range(high=1000)),
+                  history.save_history,
+                  lambda: history.export_csv(str(tmp_path / "history.csv")))
+    tracemalloc.start()
+    try:
+        for operation in operations:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            operation()
+            after, peak = tracemalloc.get_traced_memory()
+            assert peak - max(before, after) < size / 8  # A delete keeps its tombstones until the next save
+    finally:
+        tracemalloc.stop()
+    assert len(history) == 59000 and history.rendered_entries(0, 1) == ["Added 1000.0 + 1.0 = 1001.0"]
+    assert (tmp_path / "history.csv").read_text(encoding="utf-8").count("\n") == 59001
@@ -0,0 +1,30 @@
+"""Startup time regression tests.
+
+The budget for a cold start up to the first prompt defaults to 1500 ms and
+can be changed with the ``startup_budget_ms`` environment variable."""
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+STARTUP_BUDGET_MS = float(os.getenv("startup_budget_ms", "1500"))
+
+
+def test_cold_start_within_budget():
+    """Test that starting up to the first prompt stays within the budget."""
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "main.py", "--profile-startup"], cwd=ROOT,
+                               capture_output=True, text=True, check=True)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    assert "plugin discovery" in completed.stdout
+    assert elapsed_ms < STARTUP_BUDGET_MS, completed.stdout
+
+
+def test_startup_defers_heavy_imports():
+    """Test that pandas and the process pool are not imported before they are needed."""
+    code = ("import sys; from app import App; App().load_plugins(); "
+            "print(sorted({'pandas', 'concurrent.futures'} & set(sys.modules)))")
+    completed = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert completed.stdout.strip().splitlines()[-1] == "[]"
@@ -0,0 +1,37 @@
+"""Tests for chunked aggregations and operations over CSV columns."""
+import numpy as np
+import pytest
+from calculator import tabular
+from calculator.calculator import Calculator
+from calculator.history import HistoryFacade
+
+
+@pytest.fixture
+def sales(tmp_path):
+    """Provide a small CSV file with a non-numeric cell."""
+    path = tmp_path / "sales.csv"
+    path.write_text("Author,Price,Qty\nA,10,2\nB,5,0\nA,x,1\nB,7.5,3\nC,1,1\n", encoding="utf-8")
+    return str(path)
+
+
+def test_aggregate_across_chunks(sales):
+    """Test that partial results from chunks combine into the right totals."""
+    assert tabular.aggregate(sales, "sum", "Price", chunk_size=2) == 23.5
+    assert tabular.aggregate(sales, "count", "Price", chunk_size=2) == 4
+    assert tabular.aggregate(sales, "max", "Qty", chunk_size=2) == 3
+    by_author = tabular.aggregate(sales, "mean", "Price", group_by="Author", chunk_size=2)
+    assert by_author.to_dict() == {"A": 10.0, "B": 6.25, "C": 1.0}
+    with pytest.raises(ValueError, match="Unknown column 'Cost'"):
+        tabular.aggregate(sales, "sum", "Cost")
+    with pytest.raises(ValueError, match="Unknown aggregation"):
+        tabular.aggregate(sales, "median", "Price")
+
+
+def test_calculate_file_records_one_entry(sales):
+    """Test column operations chunk by chunk and the single history entry."""
+    calculator = Calculator(HistoryFacade(backend="memory"))
+    results = np.concatenate(list(calculator.calculate_file(sales, "divide", "Price", "Qty")))
+    assert np.array_equal(results, [5.0, np.nan, np.nan, 2.5, 1.0], equal_nan=True)
+    assert calculator.history_facade.rendered_entries() == ["divide Price and Qty in sales.csv: 5 rows, sum 8.5"]
+    assert calculator.aggregate_file(sales, "min", "Price") == 1.0
+    assert len(calculator.history_facade) == 2
@@ -0,0 +1,89 @@
+"""Stress tests for sharing the calculator between threads."""
+import threading
+from calculator.calculator import Calculator
+from calculator.history import ThreadSafeHistoryFacade
+from commands import CommandHandlerFactory
+
+THREADS = 16
+CALCULATIONS = 2000
+
+
+def run_threads(target, count=THREADS):
+    """Start ``count`` threads running ``target(number)`` at the same moment and wait for them."""
+    barrier = threading.Barrier(count)
+
+    def run(number):
+        barrier.wait()
+        target(number)
+    threads = [threading.Thread(target=run, args=(number,)) for number in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_calculations_lose_no_entries():
+    """Test that every calculation and note from many threads ends up in the history, even while it is read."""
+    history = ThreadSafeHistoryFacade(backend="memory")
+    calculator = Calculator(history)
+    stop = threading.Event()
+    seen = []
+
+    def read():
+        while not stop.is_set():
+            seen.append(len(history))
+            history.query(operation="add")
+
+    reader = threading.Thread(target=read)
+    reader.start()
+
+    def calculate(number):
+        for i in range(CALCULATIONS):
+            calculator.add(number, i)
+            if i % 100 == 0:
+                calculator.multiply_many([number, number], [i, i])
+                history.add_entry(f"thread {number} note {i}")
+
+    try:
+        run_threads(calculate)
+    finally:
+        stop.set()
+        reader.join()
+    notes = CALCULATIONS // 100
+    assert len(history) == THREADS * (CALCULATIONS + 3 * notes)
+    summary = history.query(operation="add")
+    assert summary["count"] == THREADS * CALCULATIONS
+    assert summary["sum"] == sum(number * CALCULATIONS + sum(range(CALCULATIONS)) for number in range(THREADS))
+    assert history.query(operation="multiply")["count"] == THREADS * 2 * notes
+    entries = set(history.rendered_entries())
+    assert all(f"thread {number} note {i}" in entries
+               for number in range(THREADS) for i in range(0, CALCULATIONS, 100))
+    assert seen == sorted(seen)  # Readers never see the history shrink
+
+
+def test_thread_safe_history_clear_drops_pending_records():
+    """Test that clearing the history also drops records other threads have not had merged yet."""
+    history = ThreadSafeHistoryFacade(backend="memory")
+    run_threads(lambda number: history.add_record("add", number, 1, number + 1), 4)
+    history.clear_history()
+    assert len(history) == 0
+    history.add_record("add", 1, 2, 3)
+    assert history.rendered_entries() == ["Added 1 + 2 = 3"]
+
+
+def test_calculator_uses_thread_safe_history_when_configured(monkeypatch, tmp_path):
+    """Test that history_thread_safe selects the thread-safe facade."""
+    monkeypatch.setenv("history_file_path", str(tmp_path / "history.csv"))
+    monkeypatch.setenv("history_thread_safe", "on")
+    assert isinstance(Calculator().history_facade, ThreadSafeHistoryFacade)
+    monkeypatch.setenv("history_thread_safe", "off")
+    assert not isinstance(Calculator().history_facade, ThreadSafeHistoryFacade)
+
+
+def test_factory_singleton_is_created_once(monkeypatch):
+    """Test that threads racing to create the command factory all get one instance."""
+    monkeypatch.setattr(CommandHandlerFactory, "_instance", None)
+    instances = []
+    run_threads(lambda number: instances.append(CommandHandlerFactory()), 32)
+    assert len({id(instance) for instance in instances}) == 1
+    assert instances[0].commands == {} and instances[0].specs == {}